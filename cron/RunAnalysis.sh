@@ -40,7 +40,7 @@ echo
 
 # Push the processed and analysed data back to GitHub
 date=$(date +"%Y-%m-%d")
-git add data/analyses/ data/processed data/raw
+git add data/analyses/ data/processed data/raw data/history
 git commit -m "Adding carpentry and workshop data for ${date}."
 git push
 
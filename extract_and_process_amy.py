@@ -2,11 +2,18 @@ import traceback
 import os
 import sys
 import re
+import json
 import datetime
+from ast import literal_eval
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import requests
 import yaml
 import pandas
 import lib.helper as helper
+from lib.http_client import HttpClient
+from lib.checkpoint import CheckpointStore
+from lib.http_cache import HttpCache
 
 
 sys.path.append('/lib')
@@ -21,6 +28,10 @@ DATA_DIR = CURRENT_DIR + '/data'
 RAW_DATA_DIR = DATA_DIR + '/raw'
 PROCESSED_DATA_DIR = DATA_DIR + '/processed'
 AMY_CREDENTIALS_FILE = CURRENT_DIR + '/amy_login.yml'
+AMY_SYNC_STATE_FILE = DATA_DIR + '/amy_sync_state.json'  # when and where the last extraction saved its raw data
+AMY_CHECKPOINT_FILE = DATA_DIR + '/amy_checkpoint.sqlite'  # responses fetched so far by an unfinished extraction
+HTTP_CACHE_DIR = DATA_DIR + '/http_cache'
+EXTRACT_DIR = DATA_DIR + '/amy_extract'  # paged results streamed to disk as JSON lines while they are extracted
 
 if not os.path.exists(RAW_DATA_DIR):
     os.makedirs(RAW_DATA_DIR)
@@ -28,13 +39,32 @@ if not os.path.exists(RAW_DATA_DIR):
 if not os.path.exists(PROCESSED_DATA_DIR):
     os.makedirs(PROCESSED_DATA_DIR)
 
+if not os.path.exists(EXTRACT_DIR):
+    os.makedirs(EXTRACT_DIR)
+
 AMY_API_ROOT = "https://amy.carpentries.org/api/v1"
 AMY_EVENTS_API_URL = AMY_API_ROOT + "/events/"
 AMY_PERSONS_API_URL = AMY_API_ROOT + "/persons/"
 AMY_AIRPORTS_API_URL = AMY_API_ROOT + "/airports/"
+AMY_TASKS_API_URL = AMY_API_ROOT + "/tasks/"
+# Filter on records' last modification time, used to get only records changed since the last run. Endpoints that
+# do not support it return all records, which are then merged into the previous data just the same.
+AMY_UPDATED_AFTER_PARAMETER = "updated_after"
+
+# Columns of raw data that hold lists, which are saved into CSV files as their Python representation
+RAW_WORKSHOPS_LIST_COLUMNS = ["tags"]
+RAW_INSTRUCTORS_LIST_COLUMNS = ["badges", "domains", "lessons"]
+# Columns of raw instructors data got from instructors' awards and tasks rather than from the paged persons results
+INSTRUCTOR_AWARDS_AND_TASKS_COLUMNS = ["swc-instructor", "dc-instructor", "lc-instructor", "trainer",
+                                       "year_earliest_instructor_badge_awarded", "taught_workshops",
+                                       "taught_workshop_dates"]
 
 AIRPORTS_FILE = DATA_DIR + "/airports.csv"
 
+# Shared HTTP clients (one per set of credentials) so that all calls to AMY reuse pooled connections
+AMY_CLIENTS = {}
+AMY_CLIENTS_LOCK = threading.Lock()
+
 
 def main():
     """
@@ -77,92 +107,150 @@ def main():
             "country": "GB"
         }
 
+        # Keep every response fetched from AMY until the extraction is complete, so that a failed run can be
+        # resumed (with --resume) from where it stopped
+        checkpoint = CheckpointStore(AMY_CHECKPOINT_FILE, resume=args.resume)
+        amy_client = get_amy_client(args.username, args.password)
+        amy_client.checkpoint = checkpoint
+        if not args.no_cache:
+            amy_client.cache = HttpCache(HTTP_CACHE_DIR, ttl=args.cache_ttl * 60,
+                                         max_size=args.cache_max_size * 1024 * 1024)
+
+        # In incremental mode, only get records changed since the last run and merge them into the raw data saved
+        # by that run. Otherwise start from scratch, but still record this run so the next one can be incremental.
+        sync_state = load_sync_state(AMY_SYNC_STATE_FILE)
+
         # Get and process workshop data
-        workshops_df = get_workshops_amy(url_parameters, args.username, args.password)
+        sync_started = get_sync_timestamp()
+        previous_workshops_df, last_synced = get_previous_snapshot(sync_state, "events", url_parameters,
+                                                                   RAW_WORKSHOPS_LIST_COLUMNS) \
+            if args.incremental else (None, None)
+        if previous_workshops_df is not None:
+            print("\nGetting only workshops changed since " + last_synced)
+            workshops_df = get_workshops_amy(dict(url_parameters, **{AMY_UPDATED_AFTER_PARAMETER: last_synced}),
+                                             args.username, args.password, args.workers, args.workshop_instructors)
+            workshops_df = helper.merge_changed_rows(previous_workshops_df, workshops_df, "slug")
+        else:
+            workshops_df = get_workshops_amy(dict(url_parameters), args.username, args.password, args.workers,
+                                             args.workshop_instructors)
 
         # Save raw workshop data
         workshops_df.to_csv(raw_workshops_file, encoding="utf-8", index=False)
         print("Saved a total of " + str(workshops_df.index.size) + " workshops to " + raw_workshops_file + "\n\n")
+        helper.add_to_history(raw_workshops_file, remove_file=args.history_only)
+        sync_state["events"] = {"last_synced": sync_started, "raw_file": raw_workshops_file,
+                                "country": url_parameters["country"]}
+        save_sync_state(AMY_SYNC_STATE_FILE, sync_state)
 
         workshops_df = helper.process_workshops(workshops_df)
 
         # Save processed workshop data
-        workshops_df.to_csv(processed_workshops_file, encoding="utf-8", index=False)
+        helper.save_processed_data(workshops_df, processed_workshops_file)
         print("Saved processed workshops to " + processed_workshops_file + "\n\n")
+        helper.add_to_history(processed_workshops_file, remove_file=args.history_only)
 
         # Get and process instructor data
-        instructors_df = get_instructors_amy(url_parameters, args.username, args.password)
+        sync_started = get_sync_timestamp()
+        previous_instructors_df, last_synced = get_previous_snapshot(sync_state, "persons", url_parameters,
+                                                                     RAW_INSTRUCTORS_LIST_COLUMNS) \
+            if args.incremental else (None, None)
+        if previous_instructors_df is not None:
+            print("\nGetting only instructors changed since " + last_synced)
+            instructors_df = update_instructors_amy(previous_instructors_df,
+                                                    dict(url_parameters, **{AMY_UPDATED_AFTER_PARAMETER: last_synced}),
+                                                    args.username, args.password, args.workers)
+        else:
+            instructors_df = get_instructors_amy(dict(url_parameters), args.username, args.password, args.workers)
         # Get rid of personal data - comment out if you do want it but beware not to upload to a public GitHub repo
         instructors_df = instructors_df.drop(labels=['first_name', 'last_name'], axis=1)
 
         # Save raw instructor data
         instructors_df.to_csv(raw_instructors_file, encoding="utf-8", index=False)
         print("Saved a total of " + str(instructors_df.index.size) + " instructors to " + raw_instructors_file)
+        helper.add_to_history(raw_instructors_file, remove_file=args.history_only)
+        sync_state["persons"] = {"last_synced": sync_started, "raw_file": raw_instructors_file,
+                                 "country": url_parameters["country"]}
+        save_sync_state(AMY_SYNC_STATE_FILE, sync_state)
 
         instructors_df = helper.process_instructors(instructors_df)
         # Save processed instructors data
-        instructors_df.to_csv(processed_instructors_file, encoding="utf-8", index=False)
+        helper.save_processed_data(instructors_df, processed_instructors_file)
         print("Saved processed instructors to " + processed_instructors_file + "\n\n")
+        helper.add_to_history(processed_instructors_file, remove_file=args.history_only)
 
+        checkpoint.remove()  # extraction complete - the next run starts from scratch
 
-def get_workshops_amy(url_parameters=None, username=None, password=None):
+
+def get_workshops_amy(url_parameters=None, username=None, password=None, workers=1, with_instructors=False):
     """
     Get Carpentry workshop events from AMY.
     :param url_parameters: URL parameters to filter results, e.g. by country.
     :param username: AMY username used to authenticate the user accessing AMY's API
     :param password: AMY password to authenticate the user accessing AMY's API
+    :param workers: maximum number of concurrent requests used to get workshops' instructors (1 means one request
+    after another)
+    :param with_instructors: if True, add column 'instructors' with names of instructors who taught at each workshop
     :return: workshops as Pandas DataFrame
     """
     print("\nExtracting workshops from AMY for country: " + (url_parameters["country"] if url_parameters["country"] is not None else "ALL"))
     try:
-        # Response is a JSON list of objects containing all published workshops
-        response = requests.get(AMY_EVENTS_API_URL, headers=HEADERS, auth=(username, password),
-                                params=url_parameters)
-        response.raise_for_status()  # check if a request was successful
-        workshops_df = []
-        print("Total workshops expected: " + str(response.json()["count"]))
-        next_url = response.json()["next"]
-        print("Getting paged workshop data from " + AMY_EVENTS_API_URL)
-        workshops_df = response.json()["results"]  # a list extracted from JSON response
-        while next_url is not None:
-            response = requests.get(next_url, headers=HEADERS, auth=(username, password))
-            response.raise_for_status()  # check if a request was successful
-            print("Getting paged workshop data from " + str(next_url))
-            next_url = response.json()["next"]
-            workshops_df.extend(response.json()["results"])
-
-        # Translate a list of JSON objects/dictionaries directly into a DataFrame
-        workshops_df = pandas.DataFrame(workshops_df,
-                                        columns=["slug", "start", "end", "attendance", "country", "host", "venue",
-                                                 "address", "latitude", "longitude", "tags", "website_url"
-                                                 # "contact",
-                                                 # "tasks"
-                                                 ])
+        # Response is a JSON list of objects containing all published workshops, written to disk page by page
+        workshops_file = EXTRACT_DIR + "/events.jsonl"
+        columns = ["slug", "start", "end", "attendance", "country", "host", "venue",
+                   "address", "latitude", "longitude", "tags", "website_url",
+                   # "contact",
+                   "tasks"
+                   ]
+        save_paged_results(AMY_EVENTS_API_URL, url_parameters, username, password, workshops_file, columns,
+                           "workshop")
+
+        # Translate the JSON objects saved on disk into a DataFrame
+        workshops_df = read_paged_results(workshops_file, columns)
 
         workshops_df.rename(columns={"country": "country_code", "host": "organiser_uri"}, inplace=True)
         print(workshops_df.columns)
-        # print("\n####### Extracted " + str(
-        #     workshops_df.index.size) + " workshops; extracting additional workshop instructors info ... #######\n")
-        # # Get instructors for workshops
-        # workshops_df["instructors"] = workshops_df["tasks"].map(
-        #     lambda tasks_url: extract_workshop_instructors(tasks_url, username, password), na_action="ignore")
-        # print(workshops_df)
+        if with_instructors:
+            print("\n####### Extracted " + str(
+                workshops_df.index.size) + " workshops; extracting additional workshop instructors info ... #######\n")
+            # Get names of all instructors in one go, then instructor tasks of all workshops in one paged pass and
+            # join them to the workshops by slug
+            person_index = PersonIndex(username, password)
+            person_index.add_instructors()
+            instructors_by_workshop = get_workshops_instructor_uris(username, password)
+            if instructors_by_workshop is not None:
+                workshops_df["instructors"] = fetch_all(
+                    workshops_df["slug"],
+                    lambda slug: [re.sub(" +", " ", person_index.get_name(instructor_uri))
+                                  for instructor_uri in instructors_by_workshop.get(slug, [])],
+                    workers)
+            else:
+                # No bulk tasks endpoint - fall back to one request per workshop
+                workshops_df["instructors"] = fetch_all(
+                    workshops_df["tasks"],
+                    lambda tasks_url: extract_workshop_instructors(tasks_url, username, password, person_index)
+                    if isinstance(tasks_url, str) else None,
+                    workers)
+        workshops_df.drop(["tasks"], axis=1, inplace=True)  # We do not need this column any more
 
         return workshops_df
     except (requests.exceptions.RequestException, requests.exceptions.HTTPError) as ex:
         # Catastrophic error occurred or HTTP request was not successful for some
         # reason (e.g. status code 4XX or 5XX was returned)
         print("Ops - something went wrong when getting workshops data from AMY...")
-        print(ex.format_exc())
+        print(traceback.format_exc())
         sys.exit(1)
 
 
-def get_instructors_amy(url_parameters=None, username=None, password=None):
+def get_instructors_amy(url_parameters=None, username=None, password=None, workers=1, with_awards_and_tasks=True):
     """
     Get Carpentry instructors registered in AMY.
     :param url_parameters: URL parameters to filter results, e.g. by country.
     :param username: AMY username used to authenticate the user accessing AMY's API
     :param password: AMY password to authenticate the user accessing AMY's API
+    :param workers: maximum number of concurrent requests used to get instructors' badges and tasks (1 means
+    one request after another)
+    :param with_awards_and_tasks: whether to add instructors' badges and taught workshops - see
+    add_instructors_awards_and_tasks()
     :return: instructors as Pandas DataFrame
     """
     print("\nExtracting instructors from AMY for country: " + (url_parameters["country"] if url_parameters["country"] is not None else "ALL"))
@@ -172,33 +260,23 @@ def get_instructors_amy(url_parameters=None, username=None, password=None):
     # number of all results and pointers to previous and next page of results,
     # as well as a list of results for the current page
     try:
-        response = requests.get(AMY_PERSONS_API_URL, headers=HEADERS, auth=(username, password),
-                                params=url_parameters)
-        response.raise_for_status()  # check if a request was successful
-        persons = []
-        print("Total instructors expected: " + str(response.json()["count"]))
-        next_url = response.json()["next"]
-        print("Getting paged instructor data from " + AMY_PERSONS_API_URL)
-        persons = response.json()["results"]  # a list of persons (instructors) extracted from JSON response
-        while next_url is not None:
-            response = requests.get(next_url, headers=HEADERS, auth=(username, password))
-            response.raise_for_status()  # check if a request was successful
-            print("Getting paged instructor data from " + str(next_url))
-            next_url = response.json()["next"]
-            persons.extend(response.json()["results"])
-
-        # Translate a list of JSON objects/dictionaries directly into a DataFrame
-        instructors_df = pandas.DataFrame(persons,
-                                          columns=["personal",  # "middle",
-                                                   "family",  # "email", "gender",
-                                                   "affiliation",
-                                                   "country",
-                                                   "awards", "badges", "domains", "tasks",
-                                                   # "github", "orcid", "twitter",
-                                                   # "url", "username", "publish_profile", "tasks",
-                                                   "lessons",
-                                                   # "may_contact", "notes",
-                                                   "airport"])
+        # Persons (instructors) are written to disk page by page
+        instructors_file = EXTRACT_DIR + "/persons.jsonl"
+        columns = ["personal",  # "middle",
+                   "family",  # "email", "gender",
+                   "affiliation",
+                   "country",
+                   "awards", "badges", "domains", "tasks",
+                   # "github", "orcid", "twitter",
+                   # "url", "username", "publish_profile", "tasks",
+                   "lessons",
+                   # "may_contact", "notes",
+                   "airport"]
+        save_paged_results(AMY_PERSONS_API_URL, url_parameters, username, password, instructors_file, columns,
+                           "instructor")
+
+        # Translate the JSON objects saved on disk into a DataFrame
+        instructors_df = read_paged_results(instructors_file, columns)
 
         print("\n####### Extracted " + str(
             instructors_df.index.size) + " instructors; extracting additional instructors info ... #######\n")
@@ -221,70 +299,9 @@ def get_instructors_amy(url_parameters=None, username=None, password=None):
         instructors_df["airport_longitude"] = instructors_df["airport_code"].map(
             lambda airport_code: airports_dict[airport_code][3], na_action="ignore")
 
-        # Extract year when instructor badges were awarded and add them as new columns
-        swc_instructor_badge_awarded = []
-        dc_instructor_badge_awarded = []
-        lc_instructor_badge_awarded = []
-        trainer_badge_awarded = []
-        year_earliest_instructor_badge_awarded = []
-        for awards_uri in instructors_df["awards"]:
-            print("Getting instructor's badges from " + awards_uri)
-            response = requests.get(awards_uri, headers=HEADERS, auth=(username, password))
-            response.raise_for_status()  # check if the request was successful
-            awards = response.json()
-
-            swc_instructor_badge_awarded_date = next(
-                (award["awarded"] for award in awards if award["badge"] == "swc-instructor"), None)
-            dc_instructor_badge_awarded_date = next(
-                (award["awarded"] for award in awards if award["badge"] == "dc-instructor"), None)
-            lc_instructor_badge_awarded_date = next(
-                (award["awarded"] for award in awards if award["badge"] == "lc-instructor"), None)
-            trainer_badge_awarded_date = next((award["awarded"] for award in awards if award["badge"] == "trainer"), None)
-
-            swc_instructor_badge_awarded.append(swc_instructor_badge_awarded_date)
-            dc_instructor_badge_awarded.append(dc_instructor_badge_awarded_date)
-            lc_instructor_badge_awarded.append(lc_instructor_badge_awarded_date)
-            trainer_badge_awarded.append(trainer_badge_awarded_date)
-
-            dates = [swc_instructor_badge_awarded_date, dc_instructor_badge_awarded_date,
-                     lc_instructor_badge_awarded_date, trainer_badge_awarded_date]
-            dates = filter(None, dates)
-            dates = map(lambda date: datetime.datetime.strptime(date, "%Y-%m-%d"), dates)
-
-            year_earliest_instructor_badge_awarded.append(sorted(dates)[0].year if dates != [] else None)
-
-        idx = instructors_df.columns.get_loc("badges")
-        instructors_df.insert(loc=idx + 1, column='swc-instructor', value=swc_instructor_badge_awarded)
-        instructors_df.insert(loc=idx + 2, column='dc-instructor', value=dc_instructor_badge_awarded)
-        instructors_df.insert(loc=idx + 3, column='lc-instructor', value=lc_instructor_badge_awarded)
-        instructors_df.insert(loc=idx + 4, column='trainer', value=trainer_badge_awarded)
-        instructors_df.insert(loc=idx + 5, column='year_earliest_instructor_badge_awarded', value=year_earliest_instructor_badge_awarded)
-        instructors_df.drop(["awards"], axis=1, inplace=True) # We do not need this column any more
-
-        # Extract workshops taught
-        taught_workshops = []
-        taught_workshops_dates = []
-        for tasks_uri in instructors_df["tasks"]:
-            print("Getting instructor's tasks from " + tasks_uri)
-            response = requests.get(tasks_uri, headers=HEADERS, auth=(username, password))
-            response.raise_for_status()  # check if the request was successful
-            tasks = response.json()
-            taught_workshops_ids = [task["event"].split("/")[-2] for task in tasks if task["role"] == "instructor"] # get event slug
-            # print(taught_workshops_ids)
-            taught_workshops.append(','.join(taught_workshops_ids))  # create a string from list joined by ',' to store in a dataframe
-            dates = [slug[0:10] for slug in taught_workshops_ids] # extract date from slug
-            # Dates in some slugs are in the US date format - fix that to the expected YYYY-MM-DD format
-            for i in range(len(dates)):
-                try:
-                    d = datetime.datetime.strptime(dates[i], '%Y-%d-%m') # US date format
-                    dates[i] = d.strftime('%Y-%m-%d') # Replace list item in place with the date in the right format
-                except ValueError:
-                    continue
-            taught_workshops_dates.append(','.join(dates))  # create a string from list joined by ',' to store in a dataframe
-
-        idx = instructors_df.columns.get_loc("tasks")
-        instructors_df.insert(loc=idx + 1, column='taught_workshops', value=taught_workshops)
-        instructors_df.insert(loc=idx + 2, column='taught_workshop_dates', value=taught_workshops_dates)
+        instructors_df.drop(["awards"], axis=1, inplace=True)  # awards are got from the person's URI
+        if with_awards_and_tasks:
+            instructors_df = add_instructors_awards_and_tasks(instructors_df, username, password, workers)
 
         return instructors_df
 
@@ -292,10 +309,207 @@ def get_instructors_amy(url_parameters=None, username=None, password=None):
         # Catastrophic error occurred or HTTP request was not successful for
         # some reason (e.g. status code 4XX or 5XX was returned)
         print("Ooops - something went wrong when getting instructors data from AMY...")
-        print(ex.format_exc())
+        print(traceback.format_exc())
         sys.exit(1)
 
 
+def update_instructors_amy(previous_instructors_df, url_parameters, username, password, workers=1):
+    """
+    Update instructors extracted by a previous run with the instructors added or changed in AMY since. Badges and
+    taught workshops are got again for all instructors, as an instructor is not marked as changed when they are awarded
+    a badge or assigned a task.
+    :param previous_instructors_df: raw instructors data saved by the previous run
+    :param url_parameters: URL parameters to filter results, e.g. by country and time of the last update
+    :param username: AMY username used to authenticate the user accessing AMY's API
+    :param password: AMY password to authenticate the user accessing AMY's API
+    :param workers: maximum number of concurrent requests used to get instructors' badges and tasks (1 means
+    one request after another)
+    :return: instructors as Pandas DataFrame
+    """
+    changed_instructors_df = get_instructors_amy(url_parameters, username, password, workers,
+                                                 with_awards_and_tasks=False)
+    # Person's tasks URI (e.g. 'https://amy.carpentries.org/api/v1/persons/1234/tasks/') identifies them
+    previous_instructors_df = previous_instructors_df.drop(columns=INSTRUCTOR_AWARDS_AND_TASKS_COLUMNS,
+                                                           errors="ignore")
+    instructors_df = helper.merge_changed_rows(previous_instructors_df, changed_instructors_df, "tasks")
+    try:
+        return add_instructors_awards_and_tasks(instructors_df, username, password, workers)
+    except (requests.exceptions.RequestException, requests.exceptions.HTTPError) as ex:
+        # Catastrophic error occurred or HTTP request was not successful for
+        # some reason (e.g. status code 4XX or 5XX was returned)
+        print("Ooops - something went wrong when getting instructors' badges and taught workshops from AMY...")
+        print(traceback.format_exc())
+        sys.exit(1)
+
+
+def add_instructors_awards_and_tasks(instructors_df, username, password, workers=1):
+    """
+    Add columns with the dates instructor badges were awarded and the workshops instructors taught, got from each
+    instructor's awards and tasks (see update_instructors_amy() for incremental extractions).
+    :param instructors_df: instructors as Pandas DataFrame with their 'tasks' URIs (e.g.
+    'https://amy.carpentries.org/api/v1/persons/1234/tasks/' - their awards are at '.../persons/1234/awards/')
+    :param username: username used to access AMY's API
+    :param password: password used to access AMY's API
+    :param workers: maximum number of concurrent requests (1 means one request after another)
+    :return: instructors as Pandas DataFrame with the added columns
+    """
+    # Extract year when instructor badges were awarded and add them as new columns
+    # (one request per instructor, run concurrently if more than one worker is allowed)
+    badges_awarded = fetch_all(instructors_df["tasks"].str.replace("tasks/$", "awards/", regex=True),
+                               lambda awards_uri: get_instructor_badges(awards_uri, username, password),
+                               workers)
+    if badges_awarded:
+        swc_instructor_badge_awarded, dc_instructor_badge_awarded, lc_instructor_badge_awarded, \
+            trainer_badge_awarded, year_earliest_instructor_badge_awarded = map(list, zip(*badges_awarded))
+    else:
+        swc_instructor_badge_awarded = dc_instructor_badge_awarded = lc_instructor_badge_awarded = \
+            trainer_badge_awarded = year_earliest_instructor_badge_awarded = []
+
+    idx = instructors_df.columns.get_loc("badges")
+    instructors_df.insert(loc=idx + 1, column='swc-instructor', value=swc_instructor_badge_awarded)
+    instructors_df.insert(loc=idx + 2, column='dc-instructor', value=dc_instructor_badge_awarded)
+    instructors_df.insert(loc=idx + 3, column='lc-instructor', value=lc_instructor_badge_awarded)
+    instructors_df.insert(loc=idx + 4, column='trainer', value=trainer_badge_awarded)
+    instructors_df.insert(loc=idx + 5, column='year_earliest_instructor_badge_awarded', value=year_earliest_instructor_badge_awarded)
+
+    # Extract workshops taught (again one request per instructor)
+    workshops_taught = fetch_all(instructors_df["tasks"],
+                                 lambda tasks_uri: get_instructor_taught_workshops(tasks_uri, username, password),
+                                 workers)
+    taught_workshops = [workshops for (workshops, dates) in workshops_taught]
+    taught_workshops_dates = [dates for (workshops, dates) in workshops_taught]
+
+    idx = instructors_df.columns.get_loc("tasks")
+    instructors_df.insert(loc=idx + 1, column='taught_workshops', value=taught_workshops)
+    instructors_df.insert(loc=idx + 2, column='taught_workshop_dates', value=taught_workshops_dates)
+
+    return instructors_df
+
+
+def iterate_paged_results(url, url_parameters, username, password, description=None):
+    """
+    Iterate over paged results from AMY's API, one page at a time. Each page is only parsed once and can be
+    discarded once processed.
+    :param url: API URL of the first page
+    :param url_parameters: URL parameters to filter results, e.g. by country
+    :param username: username used to access AMY's API
+    :param password: password used to access AMY's API
+    :param description: what the results are (e.g. 'workshop') to report progress, or None not to report it
+    :return: generator of lists of results, one list per page
+    """
+    amy_client = get_amy_client(username, password)
+    page = amy_client.get_json(url, params=url_parameters)
+    if description is not None:
+        print("Total " + description + "s expected: " + str(page["count"]))
+        print("Getting paged " + description + " data from " + url)
+    yield page["results"]
+    while page["next"] is not None:
+        if description is not None:
+            print("Getting paged " + description + " data from " + str(page["next"]))
+        page = amy_client.get_json(page["next"])
+        yield page["results"]
+
+
+def save_paged_results(url, url_parameters, username, password, file_path, columns, description=None):
+    """
+    Stream paged results from AMY's API into a JSON lines file, as they arrive, so that they do not need to be
+    kept in memory.
+    :param url: API URL of the first page
+    :param url_parameters: URL parameters to filter results, e.g. by country
+    :param username: username used to access AMY's API
+    :param password: password used to access AMY's API
+    :param file_path: JSON lines file to write results to (overwritten if it exists)
+    :param columns: fields of results to keep
+    :param description: what the results are (e.g. 'workshop') to report progress, or None not to report it
+    :return: number of results saved
+    """
+    count = 0
+    with open(file_path, "w", encoding="utf-8") as stream:
+        for results in iterate_paged_results(url, url_parameters, username, password, description):
+            for result in results:
+                stream.write(json.dumps({column: result.get(column) for column in columns}) + "\n")
+            count += len(results)
+    return count
+
+
+def read_paged_results(file_path, columns):
+    """
+    Build a DataFrame from results streamed into a JSON lines file.
+    :param file_path: JSON lines file with results
+    :param columns: columns of the DataFrame
+    :return: results as Pandas DataFrame
+    """
+    if os.path.getsize(file_path) == 0:
+        return pandas.DataFrame(columns=columns)
+    return pandas.read_json(file_path, lines=True, dtype=False, convert_dates=False, encoding="utf-8")[columns]
+
+
+def get_instructor_badges(awards_uri, username, password):
+    """
+    Get dates when an instructor was awarded each of the instructor badges.
+    :param awards_uri: URI of the instructor's awards, e.g. 'https://amy.carpentries.org/api/v1/persons/1234/awards/'
+    :param username: username used to access AMY's API
+    :param password: password used to access AMY's API
+    :return: tuple of dates the 'swc-instructor', 'dc-instructor', 'lc-instructor' and 'trainer' badges were awarded
+    (None if not awarded), followed by the year the earliest of them was awarded
+    """
+    print("Getting instructor's badges from " + awards_uri)
+    awards = get_amy_client(username, password).get_json(awards_uri)
+
+    swc_instructor_badge_awarded_date = next(
+        (award["awarded"] for award in awards if award["badge"] == "swc-instructor"), None)
+    dc_instructor_badge_awarded_date = next(
+        (award["awarded"] for award in awards if award["badge"] == "dc-instructor"), None)
+    lc_instructor_badge_awarded_date = next(
+        (award["awarded"] for award in awards if award["badge"] == "lc-instructor"), None)
+    trainer_badge_awarded_date = next((award["awarded"] for award in awards if award["badge"] == "trainer"), None)
+
+    dates = [swc_instructor_badge_awarded_date, dc_instructor_badge_awarded_date,
+             lc_instructor_badge_awarded_date, trainer_badge_awarded_date]
+    dates = filter(None, dates)
+    dates = sorted(map(lambda date: datetime.datetime.strptime(date, "%Y-%m-%d"), dates))
+
+    return (swc_instructor_badge_awarded_date, dc_instructor_badge_awarded_date, lc_instructor_badge_awarded_date,
+            trainer_badge_awarded_date, dates[0].year if dates != [] else None)
+
+
+def get_instructor_taught_workshops(tasks_uri, username, password):
+    """
+    Get workshops an instructor taught at.
+    :param tasks_uri: URI of the instructor's tasks, e.g. 'https://amy.carpentries.org/api/v1/persons/1234/tasks/'
+    :param username: username used to access AMY's API
+    :param password: password used to access AMY's API
+    :return: tuple of strings with comma-separated slugs of the taught workshops and their dates
+    """
+    print("Getting instructor's tasks from " + tasks_uri)
+    tasks = get_amy_client(username, password).get_json(tasks_uri)
+    taught_workshops_ids = [task["event"].split("/")[-2] for task in tasks if task["role"] == "instructor"] # get event slug
+    dates = [slug[0:10] for slug in taught_workshops_ids] # extract date from slug
+    # Dates in some slugs are in the US date format - fix that to the expected YYYY-MM-DD format
+    for i in range(len(dates)):
+        try:
+            d = datetime.datetime.strptime(dates[i], '%Y-%d-%m') # US date format
+            dates[i] = d.strftime('%Y-%m-%d') # Replace list item in place with the date in the right format
+        except ValueError:
+            continue
+    # create strings from lists joined by ',' to store in a dataframe
+    return ','.join(taught_workshops_ids), ','.join(dates)
+
+
+def fetch_all(uris, fetch, workers=1):
+    """
+    Call fetch for each of the URIs, with at most `workers` calls running concurrently.
+    :param uris: iterable of URIs
+    :param fetch: function taking a URI and returning the data extracted from it
+    :param workers: maximum number of concurrent calls (1 means one call after another)
+    :return: list of results in the same order as the URIs
+    """
+    if workers is None or workers <= 1:
+        return [fetch(uri) for uri in uris]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(fetch, uris))
+
+
 def get_airports(url_parameters=None, username=None, password=None):
     """
     Gets airport info (for a country) from AMY
@@ -306,17 +520,9 @@ def get_airports(url_parameters=None, username=None, password=None):
     """
 
     try:
-        response = requests.get(AMY_AIRPORTS_API_URL, headers=HEADERS, auth=(username, password),
-                                params=url_parameters)
-        response.raise_for_status()  # check if a request was successful
         airports = []
-        next_url = response.json()["next"]
-        airports = response.json()["results"]  # a list extracted from JSON response
-        while next_url is not None:
-            response = requests.get(next_url, headers=HEADERS, auth=(username, password))
-            response.raise_for_status()  # check if a request was successful
-            next_url = response.json()["next"]
-            airports.extend(response.json()["results"])
+        for results in iterate_paged_results(AMY_AIRPORTS_API_URL, url_parameters, username, password):
+            airports.extend(results)  # a list extracted from JSON response
 
         # We can translate a list of JSON objects/dictionaries directly into a DataFrame
         airports_df = pandas.DataFrame(airports)
@@ -329,7 +535,7 @@ def get_airports(url_parameters=None, username=None, password=None):
         # Catastrophic error occured or HTTP request was not successful for
         # some reason (e.g. status code 4XX or 5XX was returned)
         print("Ooops - something went wrong when getting airport data from AMY...")
-        print(ex.format_exc())
+        print(traceback.format_exc())
         print("Loading airports data from a local file " + AIRPORTS_FILE + "...")
         # Load data from the saved airports file
         airports_df = pandas.read_csv(AIRPORTS_FILE, encoding="utf-8")
@@ -363,6 +569,84 @@ def get_airports_dict(airports_df):
     return airports_df.set_index('iata').transpose().to_dict('list')
 
 
+def get_sync_timestamp():
+    """
+    :return: current UTC time in the format AMY's API accepts for filtering by modification time
+    """
+    return datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def load_sync_state(file_path):
+    """
+    Load the state of the previous extractions - per AMY resource ('events', 'persons'): when the extraction started,
+    for which country and where its raw data was saved.
+    :param file_path: JSON file with the sync state
+    :return: dictionary with the sync state (empty if no extraction was recorded yet)
+    """
+    sync_state = {}
+    if os.path.isfile(file_path):
+        with open(file_path, 'r') as stream:
+            try:
+                sync_state = json.load(stream)
+            except ValueError:
+                print("An error occurred while reading AMY sync state JSON file " + file_path)
+                print(traceback.format_exc())
+    return sync_state
+
+
+def save_sync_state(file_path, sync_state):
+    """
+    Save the state of extractions so that the next run can only get records changed since.
+    :param file_path: JSON file with the sync state
+    :param sync_state: dictionary with the sync state
+    """
+    with open(file_path, 'w') as stream:
+        json.dump(sync_state, stream, indent=2)
+
+
+def get_previous_snapshot(sync_state, resource, url_parameters, list_columns):
+    """
+    Load raw data saved by the previous extraction of a resource, so that only records changed since can be merged
+    into it.
+    :param sync_state: dictionary with the sync state
+    :param resource: AMY resource, e.g. 'events' or 'persons'
+    :param url_parameters: URL parameters of the current extraction - the previous one must have been for the
+    same country
+    :param list_columns: columns holding lists, saved in the CSV file as their Python representation
+    :return: tuple of previous raw data as Pandas DataFrame and the time the previous extraction started, or
+    (None, None) if there is no usable previous data
+    """
+    previous = sync_state.get(resource)
+    if previous is None or previous.get("country") != url_parameters.get("country"):
+        print("No previous extraction of " + resource + " to update - getting all of them from AMY")
+        return None, None
+    try:
+        # Rebuilt from its history if the file was removed once added to it
+        previous_df = helper.read_data_file(previous["raw_file"])
+    except FileNotFoundError:
+        print("Raw data from the previous extraction of " + resource + " does not exist " + previous["raw_file"] +
+              " - getting all of them from AMY")
+        return None, None
+    for column in list_columns:
+        if column in previous_df.columns:
+            previous_df[column] = previous_df[column].map(literal_eval, na_action="ignore")
+    return previous_df, previous["last_synced"]
+
+
+def get_amy_client(username, password):
+    """
+    Get the HTTP client shared by all calls to AMY's API made with the given credentials. The client reuses
+    keep-alive connections, retries requests that failed with 429/5XX and limits concurrent requests to AMY.
+    :param username: username used to access AMY's API
+    :param password: password used to access AMY's API
+    :return: HttpClient
+    """
+    with AMY_CLIENTS_LOCK:
+        if (username, password) not in AMY_CLIENTS:
+            AMY_CLIENTS[(username, password)] = HttpClient(auth=(username, password), headers=HEADERS)
+        return AMY_CLIENTS[(username, password)]
+
+
 def get_credentials(file_path):
     """
     Extract username and password from a YML file used for authentication with AMY
@@ -387,30 +671,116 @@ def get_credentials(file_path):
     return username, password
 
 
-def extract_workshop_instructors(workshop_tasks_url, username, password):
+class PersonIndex(object):
+    """
+    Names of AMY persons by their API URI (e.g. 'https://amy.carpentries.org/api/v1/persons/1234/'). Names of all
+    instructors are added in bulk from the paged persons results; any other person is fetched the first time they are
+    looked up and memoised, so each person is requested at most once.
+    """
+
+    def __init__(self, username, password):
+        self.username = username
+        self.password = password
+        self.names = {}
+        self._lock = threading.Lock()
+
+    def add_instructors(self):
+        """
+        Add names of all instructors (from all countries, as they do not only teach locally) to the index.
+        """
+        print("Getting names of all instructors from " + AMY_PERSONS_API_URL)
+        for results in iterate_paged_results(AMY_PERSONS_API_URL, {"is_instructor": "true"}, self.username,
+                                             self.password):
+            self.add_persons(results)
+        print("Indexed names of " + str(len(self.names)) + " instructors")
+
+    def add_persons(self, persons):
+        """
+        :param persons: list of persons as returned by AMY's API
+        """
+        with self._lock:
+            for person in persons:
+                # Person's tasks URI is their URI followed by 'tasks/'
+                self.names[re.sub("tasks/$", "", person["tasks"])] = get_person_name(person)
+
+    def get_name(self, person_uri):
+        """
+        :param person_uri: person's AMY API URI
+        :return: person's full name
+        """
+        with self._lock:
+            name = self.names.get(person_uri)
+        if name is None:
+            name = get_person_name(get_amy_client(self.username, self.password).get_json(person_uri))
+            with self._lock:
+                self.names[person_uri] = name
+        return name
+
+
+def get_person_name(person):
+    """
+    :param person: person as returned by AMY's API
+    :return: person's full name (personal, middle and family name)
+    """
+    return " ".join(filter(None, [person.get("personal"), person.get("middle"), person.get("family")]))
+
+
+def get_workshops_instructor_uris(username, password):
+    """
+    Get instructors of all workshops by paging through instructor tasks once, rather than requesting the tasks of each
+    workshop.
+    :param username: username used to access AMY's API
+    :param password: password used to access AMY's API
+    :return: dictionary of lists of instructors' URIs by workshop slug, or None if AMY's API does not list tasks
+    """
+    instructors_by_workshop = {}
+    try:
+        for tasks in iterate_paged_results(AMY_TASKS_API_URL, {"role": "instructor"}, username, password,
+                                           "instructor task"):
+            # Filtered here too, in case the role filter is not supported
+            for task in tasks:
+                if task["role"] == "instructor":
+                    # Task's event URI ends with the workshop slug, e.g. '.../events/2019-01-01-ucl/'
+                    instructors_by_workshop.setdefault(task["event"].split("/")[-2], []).append(task["person"])
+    except requests.exceptions.HTTPError as ex:
+        if ex.response is None or ex.response.status_code != 404:
+            raise
+        print("AMY's API does not list tasks at " + AMY_TASKS_API_URL + " - getting instructors workshop by workshop")
+        return None
+    return instructors_by_workshop
+
+
+def extract_workshop_instructors(workshop_tasks_url, username, password, person_index=None):
+    """
+    Get names of instructors who taught at a workshop.
+    :param workshop_tasks_url: URI of the workshop's tasks
+    :param username: username used to access AMY's API
+    :param password: password used to access AMY's API
+    :param person_index: PersonIndex to look instructors' names up in (a new one is used if omitted)
+    :return: list of instructors' names
+    """
+    if person_index is None:
+        person_index = PersonIndex(username, password)
     instructors_urls = []
     instructors = []
     try:
+        amy_client = get_amy_client(username, password)
         # Get the tasks, then extract all person URLs who were "instructors"
-        response = requests.get(workshop_tasks_url, auth=(username, password))
-        response.raise_for_status()  # check if a request was successful
         print("Getting workshop instructors from " + workshop_tasks_url)
-        tasks = response.json()["results"]
+        tasks = amy_client.get_json(workshop_tasks_url)
+        if isinstance(tasks, dict):  # paged response
+            tasks = tasks["results"]
         instructors_urls = [task['person'] for task in tasks if task['role'] == 'instructor']
 
-        # Follow each of the instructors' URLs and extract their names
+        # Look up instructors' names by their URLs
         for instructors_url in instructors_urls:
-            response = requests.get(instructors_url, auth=(username, password))
-            response.raise_for_status()  # check if a request was successful
-            instructor = response.json()
-            instructor_name = instructor["personal"] + " " + instructor["middle"] + " " + instructor["family"]
-            instructors.append(re.sub(" +", " ", instructor_name))
+            instructors.append(re.sub(" +", " ", person_index.get_name(instructors_url)))
     except (requests.exceptions.RequestException, requests.exceptions.HTTPError) as ex:
         # Catastrophic error occurred or HTTP request was not successful
         # for some reason (e.g. status code 4XX or 5XX was returned)
         print("Ooops - something went wrong when getting instructors that taught at a workshop from AMY...")
         # Ignore - we still have workshop data to look at, just log this error
-        print(ex.format_exc())
+        print(traceback.format_exc())
     return instructors
 
 
@@ -2,11 +2,13 @@ import traceback
 import os
 import sys
 import datetime
-import io
 import requests
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import yaml
 import lib.helper as helper
+from lib.http_client import HttpClient
+from lib.http_cache import HttpCache
 
 
 sys.path.append('/lib')
@@ -18,6 +20,7 @@ PROCESSED_DATA_DIR = DATA_DIR + '/processed'
 LIB_DATA_DIR = CURRENT_DIR + '/lib'
 
 REDASH_CREDENTIALS_FILE = CURRENT_DIR + '/redash_login.yml'
+HTTP_CACHE_DIR = DATA_DIR + '/http_cache'
 
 if not os.path.exists(RAW_DATA_DIR):
     os.makedirs(RAW_DATA_DIR)
@@ -29,6 +32,17 @@ if not os.path.exists(PROCESSED_DATA_DIR):
 REDASH_API_WORKSHOPS_QUERY_URL = "http://redash.carpentries.org/api/queries/345/results.csv"
 REDASH_API_INSTRUCTORS_QUERY_URL = "http://redash.carpentries.org/api/queries/243/results.csv"
 
+# Column types of the query results - given explicitly so pandas does not have to infer them (and e.g. does not turn
+# columns that happen to be empty into floats)
+REDASH_WORKSHOPS_DTYPES = {"slug": str, "start": str, "end": str, "attendance": "Int64", "country_code": str,
+                           "organiser": str, "organiser_web_domain": str, "organiser_country_code": str, "venue": str,
+                           "address": str, "longitude": float, "latitude": float, "tags": str, "website_url": str,
+                           "workshop_domains": str}
+REDASH_INSTRUCTORS_DTYPES = {"institution": str, "country_code": str, "taught_workshops": str,
+                             "taught_workshop_dates": str, "domains": str, "badges": str, "badges_dates": str,
+                             "airport": str, "airport_code": str, "airport_latitude": float,
+                             "airport_longitude": float}
+
 
 def get_credentials(file_path):
     """
@@ -54,6 +68,9 @@ def get_credentials(file_path):
 
 REDASH_API_KEY = get_credentials(REDASH_CREDENTIALS_FILE)
 
+# HTTP client shared by all calls to Redash
+REDASH_CLIENT = HttpClient()
+
 
 def main():
     """
@@ -62,6 +79,10 @@ def main():
 
     args = helper.parse_command_line_parameters_redash()
 
+    if not args.no_cache:
+        REDASH_CLIENT.cache = HttpCache(HTTP_CACHE_DIR, ttl=args.cache_ttl * 60,
+                                        max_size=args.cache_max_size * 1024 * 1024)
+
     if args.raw_workshops_file:
         raw_workshops_file = args.raw_workshops_file
     else:
@@ -83,17 +104,26 @@ def main():
         processed_instructors_file = PROCESSED_DATA_DIR + "/processed_carpentry_instructors_UK" + "_" + datetime.datetime.today().strftime(
             '%Y-%m-%d') + "_redash.csv"
 
-    ############################ Extract workshop data from Carpentries Redash ########################
+    ############################ Extract workshop and instructor data from Carpentries Redash ########################
 
+    # Get workshop and instructor data as returned by predefined queries within Carpentries Redash system (cached
+    # results are returned from the last time Redash ran the queries, currently set to run every day for workshops and
+    # every 2 weeks for instructors). Both queries are downloaded at the same time.
     print("\nExtracting workshops from: " + REDASH_API_WORKSHOPS_QUERY_URL)
-    # Get workshop data as returned by a predefined query within Carpentries Redash system (cached results are returned
-    # from the last time Redash ran the query, currently set to run every day)
-    workshops_df = get_csv_data_redash(REDASH_API_WORKSHOPS_QUERY_URL, REDASH_API_KEY)
+    print("\nExtracting instructors from: " + REDASH_API_INSTRUCTORS_QUERY_URL)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        workshops_future = executor.submit(get_csv_data_redash, REDASH_API_WORKSHOPS_QUERY_URL, REDASH_API_KEY,
+                                           REDASH_WORKSHOPS_DTYPES)
+        instructors_future = executor.submit(get_csv_data_redash, REDASH_API_INSTRUCTORS_QUERY_URL, REDASH_API_KEY,
+                                             REDASH_INSTRUCTORS_DTYPES)
+        workshops_df = workshops_future.result()
+        instructors_df = instructors_future.result()
     print("\n####### Extracted " + str(workshops_df.index.size) + " workshops. #######\n")
 
     # Save raw workshop data
     workshops_df.to_csv(raw_workshops_file, encoding="utf-8", index=False)
     print("Saved raw Carpentry workshop data to "+ raw_workshops_file + "\n")
+    helper.add_to_history(raw_workshops_file, remove_file=args.history_only)
 
     ############################ Process workshop data ########################
     # Process the workshop data a bit to get it ready for further analyses and mapping
@@ -107,15 +137,10 @@ def main():
     workshops_df = helper.process_workshops(workshops_df)
 
     # Save the processed workshop data
-    workshops_df.to_csv(processed_workshops_file, encoding="utf-8", index=False)
+    helper.save_processed_data(workshops_df, processed_workshops_file)
     print("\nSaved processed Carpentry workshop data to "+ processed_workshops_file +"\n")
+    helper.add_to_history(processed_workshops_file, remove_file=args.history_only)
 
-    ############################ Extract instructor data from Carpentries Redash ########################
-
-    print("\nExtracting instructors from: " + REDASH_API_INSTRUCTORS_QUERY_URL)
-    # Get instructor data as returned by a predefined query within Carpentries Redash system (cached results are returned
-    # from the last time Redash ran the query, currently set to run every 2 weeks)
-    instructors_df = get_csv_data_redash(REDASH_API_INSTRUCTORS_QUERY_URL, REDASH_API_KEY)
     print("\n####### Extracted " + str(instructors_df.index.size) + " instructors. #######\n")
 
     # Save raw instructor data
@@ -123,6 +148,7 @@ def main():
     # Get rid of personal data - comment out if you do want it but beware not to upload to a public GitHub repo
     #instructors_df = instructors_df.drop(labels=['first_name', 'last_name'], axis=1)
     print("Saved raw Carpentry instructor data to " + raw_instructors_file + "\n")
+    helper.add_to_history(raw_instructors_file, remove_file=args.history_only)
 
     ############################ Process instructor data ########################
     # Process the instructor data a bit to get it ready for further analyses and mapping
@@ -139,31 +165,32 @@ def main():
     instructors_df = helper.process_instructors(instructors_df)
 
     # Save the processed instructor data
-    instructors_df.to_csv(processed_instructors_file, encoding="utf-8", index=False)
+    helper.save_processed_data(instructors_df, processed_instructors_file)
     print("\nSaved processed Carpentry instructor data to " + processed_instructors_file + "\n")
+    helper.add_to_history(processed_instructors_file, remove_file=args.history_only)
 
 
-def get_csv_data_redash(query_results_url, api_key):
+def get_csv_data_redash(query_results_url, api_key, dtype=None):
     """
     Get data in csv format from the Carpentries Redash system
     :param query_results_url: Redash query results URL.
     :param api_key: API key to access the query results
+    :param dtype: optional dictionary of column types of the query results
     :return: data in csv format as returned by the SQL query in Redash
     """
     try:
-        # Response is a CSV data
-        response = requests.get(query_results_url, params={"api_key": api_key})
-        response.raise_for_status()  # check if request was successful
-        data = pd.read_csv(io.StringIO(response.content.decode('utf-8')))
+        # Response is a CSV data - parse it as it is read rather than loading the whole response into memory first
+        with REDASH_CLIENT.open_stream(query_results_url, params={"api_key": api_key}) as stream:
+            data = pd.read_csv(stream, dtype=dtype, encoding='utf-8')
         return data
     except (requests.exceptions.RequestException, requests.exceptions.HTTPError) as ex:
         # Catastrophic error occurred or HTTP request was not successful for some
         # reason (e.g. status code 4XX or 5XX was returned)
         print("Ooops - something went wrong when getting data from Redash ...")
-        print(ex.format_exc())
+        print(traceback.format_exc())
     except Exception as ex:
         print("Ooops - something went wrong when turning data into a DataFrame ...")
-        print(ex.format_exc())
+        print(traceback.format_exc())
 
 
 if __name__ == '__main__':
@@ -0,0 +1,191 @@
+import os
+import re
+import pickle
+import hashlib
+import inspect
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+
+def content_hash(value):
+    """
+    Hash of the content of an input to analyses, e.g. a DataFrame of processed data or a cube of workshop counts.
+    :param value: DataFrame, Series or any other picklable value
+    :return: hexadecimal SHA-1 digest, the same for equal values
+    """
+    sha = hashlib.sha1()
+    if isinstance(value, pd.Series):
+        value = value.to_frame()
+    if isinstance(value, pd.DataFrame):
+        sha.update(repr((list(value.columns), [str(dtype) for dtype in value.dtypes])).encode("utf-8"))
+        sha.update(pd.util.hash_pandas_object(value.index.to_frame(index=False), index=False).values.tobytes())
+        for column in range(len(value.columns)):
+            values = value.iloc[:, column]
+            if values.dtype == object:
+                # Cells may hold lists or dictionaries, which cannot be hashed as they are
+                values = values.map(repr)
+            sha.update(pd.util.hash_pandas_object(values, index=False).values.tobytes())
+    else:
+        sha.update(pickle.dumps(value))
+    return sha.hexdigest()
+
+
+class Analysis(object):
+    """
+    An analysis of workshops or instructors, declaring the inputs it is computed from (e.g. 'df' for the processed
+    data) and its output - a table saved to its own sheet of the analyses spreadsheet (or file or section of other
+    report formats, see lib/report_backends.py), with a column chart.
+    """
+
+    def __init__(self, sheet_name, compute, inputs, chart, index=False, notes=None, version=None, dated=False):
+        """
+        :param sheet_name: name of the sheet the table is saved to, which also names the analysis
+        :param compute: function taking the inputs as keyword arguments and returning the table (DataFrame or Series)
+        :param inputs: names of the inputs compute takes
+        :param chart: dictionary with the chart's 'title', 'x_axis' and 'y_axis' names and its 'position' in the
+        sheet (e.g. 'I2'); if 'stacked' is True, a stacked chart has a series for each column of a pivoted table
+        :param index: whether to save the table's index (always saved for pivoted tables)
+        :param notes: function taking the table and the inputs as keyword arguments and returning a list of
+        (row, column, text) notes to write to the sheet, or None
+        :param version: optional version of the analysis, to change when it depends on code or data its module's source
+        does not show (e.g. a library or a file read)
+        :param dated: whether the table depends on the date the analysis is run on (e.g. instructors active in the last
+        2 years), so that results cached on another day are not served
+        """
+        self.sheet_name = sheet_name
+        self.compute = compute
+        self.inputs = inputs
+        self.chart = chart
+        self.index = index
+        self.notes = notes
+        self.version = version
+        self.dated = dated
+        # Version of the code computing the table and notes - changing it invalidates cached results. The whole source of
+        # the modules defining them is included, as they depend on the constants and helper functions there too.
+        functions = [function for function in [compute, notes] if function is not None]
+        modules = []
+        for module in [inspect.getmodule(function) for function in functions]:
+            if module is not None and module not in modules:
+                modules.append(module)
+        sources = [inspect.getsource(code) for code in functions + modules]
+        if version is not None:
+            sources.append(str(version))
+        self.code_version = hashlib.sha1("\n".join(sources).encode("utf-8")).hexdigest()
+
+    def run(self, inputs):
+        """
+        Compute the table and notes - safe to run concurrently with other analyses as nothing is written.
+        :param inputs: dictionary of all inputs available, by name
+        :return: tuple of the table and the notes
+        """
+        arguments = {name: inputs[name] for name in self.inputs}
+        table = self.compute(**arguments)
+        notes = self.notes(table, **arguments) if self.notes is not None else []
+        return table, notes
+
+    def cache_file(self, cache_dir, input_hashes):
+        """
+        :param cache_dir: directory of cached results
+        :param input_hashes: dictionary of content hashes of the inputs, by name
+        :return: file the result is cached in, named after the sheet and a key made from the hashes of the inputs the
+        analysis is computed from and the version of its code (and today's date for dated analyses)
+        """
+        parts = [self.code_version] + [input_hashes[name] for name in self.inputs]
+        if self.dated:
+            parts.append(datetime.date.today().isoformat())
+        key = hashlib.sha1("\n".join(parts).encode("utf-8"))
+        return os.path.join(cache_dir, self.sheet_name + "_" + key.hexdigest()[:16] + ".pickle")
+
+    def run_cached(self, inputs, cache_dir, input_hashes):
+        """
+        Serve the table and notes from the cache if they were computed from the same inputs by the same code before,
+        otherwise compute and cache them, replacing results cached for older inputs or code.
+        :param inputs: dictionary of all inputs available, by name
+        :param cache_dir: directory of cached results
+        :param input_hashes: dictionary of content hashes of the inputs, by name
+        :return: tuple of the table, the notes and whether they were served from the cache
+        """
+        cache_file = self.cache_file(cache_dir, input_hashes)
+        if os.path.isfile(cache_file):
+            try:
+                table, notes = pd.read_pickle(cache_file)
+                return table, notes, True
+            except Exception:
+                print("Could not read cached results of '" + self.sheet_name + "' from " + cache_file +
+                      " - recomputing them ...")
+
+        table, notes = self.run(inputs)
+        for file in os.listdir(cache_dir):
+            if re.match(re.escape(self.sheet_name) + r"_[0-9a-f]{16}\.pickle$", file):
+                os.remove(os.path.join(cache_dir, file))
+        temp_file = cache_file + ".tmp"
+        pd.to_pickle((table, notes), temp_file, compression=None)
+        os.replace(temp_file, cache_file)
+        return table, notes, False
+
+
+class AnalysisRegistry(object):
+    """
+    Registry of analyses making up an analyses report. Analyses are computed concurrently, while their results are
+    saved to the report by a single writer, in the order the analyses were registered in. New analyses
+    are added by registering them, e.g.
+
+        @ANALYSES.register('workshops_per_year', ['df'], {'title': ..., 'x_axis': ..., 'y_axis': ..., 'position': 'I2'})
+        def workshops_per_year(df):
+            return df.groupby('year').size()
+    """
+
+    def __init__(self):
+        self.analyses = []
+
+    def register(self, sheet_name, inputs, chart, index=False, notes=None, version=None, dated=False):
+        """
+        Decorator registering a function computing an analysis' table - see Analysis for the arguments.
+        """
+        def decorator(compute):
+            self.analyses.append(Analysis(sheet_name, compute, inputs, chart, index, notes, version, dated))
+            return compute
+        return decorator
+
+    def __getitem__(self, sheet_name):
+        return next(analysis for analysis in self.analyses if analysis.sheet_name == sheet_name)
+
+    def run(self, inputs, report, workers=None, cache_dir=None):
+        """
+        Compute all analyses in a thread pool and save their results to the report as they become available.
+        :param inputs: dictionary of inputs to the analyses, by name - analyses must not modify them
+        :param report: report backend from lib/report_backends.py, e.g. an ExcelReport
+        :param workers: maximum number of analyses computed at the same time, or None for the default based on the
+        number of cores
+        :param cache_dir: directory to cache results in, or None not to cache them - results of analyses whose inputs
+        and code have not changed since they were cached are served from the cache instead of being recomputed
+        :return: dictionary of computed tables by sheet name
+        """
+        input_hashes = {}
+        if cache_dir is not None:
+            if not os.path.exists(cache_dir):
+                os.makedirs(cache_dir)
+            input_hashes = {name: content_hash(inputs[name])
+                            for name in set(name for analysis in self.analyses for name in analysis.inputs)}
+
+        def run_analysis(analysis):
+            if cache_dir is None:
+                return analysis.run(inputs) + (False,)
+            return analysis.run_cached(inputs, cache_dir, input_hashes)
+
+        tables = {}
+        cached = []
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [(analysis, executor.submit(run_analysis, analysis)) for analysis in self.analyses]
+            # Report backends are not thread safe - results are saved from this thread only
+            for analysis, future in futures:
+                table, notes, from_cache = future.result()
+                report.write_analysis(analysis, table, notes)
+                tables[analysis.sheet_name] = table
+                if from_cache:
+                    cached.append(analysis.sheet_name)
+        if cache_dir is not None:
+            print(str(len(cached)) + " of " + str(len(self.analyses)) + " analyses served from the cache in " +
+                  cache_dir + (": " + ", ".join(cached) if cached else ""))
+        return tables
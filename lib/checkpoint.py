@@ -0,0 +1,62 @@
+import os
+import json
+import sqlite3
+import threading
+
+
+class CheckpointStore(object):
+    """
+    On-disk key-value store of JSON responses already fetched during an extraction, keyed by request URL. Every
+    response is committed as soon as it is stored, so an extraction that failed part way through can be resumed
+    without fetching those responses again.
+    """
+
+    def __init__(self, file_path, resume=False):
+        """
+        :param file_path: SQLite database file to keep the checkpoint in
+        :param resume: if True, keep responses stored by a previous (failed) run, otherwise start from scratch
+        """
+        self.file_path = file_path
+        if not resume and os.path.isfile(file_path):
+            os.remove(file_path)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(file_path, check_same_thread=False)
+        self._connection.execute("CREATE TABLE IF NOT EXISTS responses (url TEXT PRIMARY KEY, response TEXT)")
+        self._connection.commit()
+        if resume:
+            print("Resuming from checkpoint " + file_path + " with " + str(len(self)) + " responses already fetched")
+
+    def get(self, url):
+        """
+        :param url: request URL (including URL parameters)
+        :return: the stored JSON response as Python objects, or None if the URL has not been fetched yet
+        """
+        with self._lock:
+            row = self._connection.execute("SELECT response FROM responses WHERE url = ?", (url,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def put(self, url, response):
+        """
+        :param url: request URL (including URL parameters)
+        :param response: JSON response as Python objects
+        """
+        with self._lock:
+            self._connection.execute("INSERT OR REPLACE INTO responses (url, response) VALUES (?, ?)",
+                                     (url, json.dumps(response)))
+            self._connection.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def remove(self):
+        """
+        Close and delete the checkpoint once the extraction is complete.
+        """
+        self.close()
+        if os.path.isfile(self.file_path):
+            os.remove(self.file_path)
@@ -5,13 +5,13 @@ import argparse
 import json
 import datetime
 import re
-import folium
-from folium.plugins import MarkerCluster
-from folium.plugins import HeatMap
-from shapely.geometry import shape, Point
+import functools
+from ast import literal_eval
 import traceback
 import getpass
-import tldextract
+
+# Reference data below is loaded (and heavy libraries such as folium, shapely and tldextract are imported) only when
+# first needed, so that scripts not using them start quickly. The data is then cached for the rest of the process.
 
 CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
 
@@ -19,25 +19,51 @@ UK_REGIONS_FILE = CURRENT_DIR + '/UK-regions.json'
 UK_AIRPORTS_REGIONS_FILE = CURRENT_DIR + '/UK-airports_regions.csv'  # Extracted on 2017-10-16 from https://en.wikipedia.org/wiki/List_of_airports_in_the_United_Kingdom_and_the_British_Crown_Dependencies
 
 NORMALISED_INSTITUTIONS_DICT_JSON = CURRENT_DIR + '/venue-normalised_institutions-dictionary.json'
-NORMALISED_INSTITUTIONS_DICT = json.load(open(NORMALISED_INSTITUTIONS_DICT_JSON))
 
 UK_ACADEMIC_INSTITUTIONS_CSV = CURRENT_DIR + '/UK-academic-institutions.csv'  # Extracted on 2017-10-27 from http://learning-provider.data.ac.uk/
 HESA_ACADEMIC_PROVIDERS_CSV = CURRENT_DIR + "/HESA_UK_higher_education_providers.csv"
 
 UK_NON_ACADEMIC_INSTITUTIONS_CSV = CURRENT_DIR + '/UK-non-academic-institutions.csv'
 ALL_UK_INSTITUTIONS_CSV = CURRENT_DIR + '/all-institutions.csv' # merged academic and non-academic institutions
-ALL_UK_INSTITUTIONS_DF = pd.read_csv(ALL_UK_INSTITUTIONS_CSV, encoding="utf-8")
 
 # UK_AIRPORTS_REGIONS_DF = pd.read_csv(UK_AIRPORTS_REGIONS_FILE, encoding="utf-8")
-UK_REGIONS = json.load(open(UK_REGIONS_FILE), encoding="utf-8")
-UK_AIRPORTS = pd.read_csv(UK_AIRPORTS_REGIONS_FILE, encoding="utf-8")
+UK_REGIONS_INDEX = None  # spatial index of UK_REGIONS, built on first lookup
+UK_REGIONS_GRID_CELL_SIZE = 0.05  # degrees (about 5km) - points in cells wholly inside a region are resolved by the grid
+UK_REGIONS_CACHE_FILE = os.path.dirname(CURRENT_DIR) + '/data/uk_regions_cache.json'  # regions of points seen so far
+UK_REGIONS_CACHE = None
 
 WORKSHOP_TYPE = ["SWC", "DC", "LC", "TTT"]
 WORKSHOP_SUBTYPE = ['Pilot', "Circuits"]
 STOPPED_WORKSHOP_STATUS = ['stalled', 'cancelled', 'unresponsive']
 INSTRUCTOR_BADGES = ["swc-instructor", "dc-instructor", "lc-instructor", "trainer"]
 
+# Columns of processed data that CSV files store as strings but snapshots store with their types
+PROCESSED_LIST_COLUMNS = ["tags", "workshop_domains", "taught_workshops", "domains", "badges", "lessons"]
+PROCESSED_DATE_LIST_COLUMNS = ["taught_workshop_dates", "badges_dates"]
+PROCESSED_DICT_COLUMNS = ["taught_workshops_per_year"]
+PROCESSED_DATE_COLUMNS = INSTRUCTOR_BADGES + ["earliest_badge_awarded"]
+SNAPSHOT_EXTENSION = ".parquet"
+
+# History of dated raw and processed data files, kept as deltas between them (see lib/snapshot_store.py)
+HISTORY_DIR = os.path.dirname(CURRENT_DIR) + '/data/history'
+DATED_FILE_NAME_PATTERN = re.compile(r'^(?P<name>.+)_(?P<date>\d{4}-\d{2}-\d{2})(?P<source>_[a-z]+)?\.csv$')
+# Columns identifying rows of histories with names matching a pattern - instructors extracted from Redash have no
+# identifier so they are identified by their content, while a person's tasks URI identifies them in AMY data
+HISTORY_KEYS = [("workshops", ["slug"]), ("instructors.*_amy$", ["tasks"])]
+
+# Spreadsheets are written row by row in xlsxwriter's constant memory mode - data with more rows than a sheet can hold
+# is split across several sheets
+EXCEL_MAX_ROWS = 1048576
+EXCEL_DATE_FORMAT = 'YYYY-MM-DD'
+EXCEL_DATETIME_FORMAT = 'YYYY-MM-DD HH:MM:SS'
+EXCEL_CHUNK_ROWS = 10000  # rows converted to Excel values at a time
+
+# Formats analyses can be saved in (see lib/report_backends.py) - an Excel spreadsheet with charts, directories of CSV or
+# Parquet files with a file per table, or a static HTML page with inline charts
+REPORT_FORMATS = ['xlsx', 'csv', 'parquet', 'html']
+
 COUNTRIES_FILE = CURRENT_DIR + "/countries.json"
+COUNTRY_CODES_FILE = CURRENT_DIR + "/country_codes.csv"
 
 
 def get_countries(countries_file):
@@ -54,7 +80,77 @@ def get_countries(countries_file):
     return countries
 
 
-COUNTRIES = get_countries(COUNTRIES_FILE)
+
+
+@functools.lru_cache(maxsize=None)
+def load_countries():
+    return get_countries(COUNTRIES_FILE)
+
+
+@functools.lru_cache(maxsize=None)
+def load_normalised_institutions_dict():
+    with open(NORMALISED_INSTITUTIONS_DICT_JSON, encoding="utf-8") as stream:
+        return json.load(stream)
+
+
+@functools.lru_cache(maxsize=None)
+def load_all_uk_institutions():
+    return pd.read_csv(ALL_UK_INSTITUTIONS_CSV, encoding="utf-8")
+
+
+@functools.lru_cache(maxsize=None)
+def load_uk_regions():
+    with open(UK_REGIONS_FILE, encoding="utf-8") as stream:
+        return json.load(stream)
+
+
+@functools.lru_cache(maxsize=None)
+def load_uk_airports():
+    return pd.read_csv(UK_AIRPORTS_REGIONS_FILE, encoding="utf-8")
+
+
+# Module attributes that used to be loaded on import, still available (loaded on first access) as e.g.
+# helper.ALL_UK_INSTITUTIONS_DF
+LAZY_REFERENCE_DATA = {
+    "COUNTRIES": load_countries,
+    "NORMALISED_INSTITUTIONS_DICT": load_normalised_institutions_dict,
+    "ALL_UK_INSTITUTIONS_DF": load_all_uk_institutions,
+    "UK_REGIONS": load_uk_regions,
+    "UK_AIRPORTS": load_uk_airports,
+}
+
+
+def __getattr__(name):
+    if name in LAZY_REFERENCE_DATA:
+        return LAZY_REFERENCE_DATA[name]()
+    raise AttributeError("module " + repr(__name__) + " has no attribute " + repr(name))
+
+
+COUNTRY_NAMES = None  # country names by 2-letter ISO country code, built on first lookup
+
+
+def get_country_names():
+    """
+    Get the index of country names by country code, used to look up countries of both workshops and instructors.
+    Common names come from countries.json; codes missing from it are looked up in country_codes.csv.
+    :return: dictionary of country names keyed by 2-letter ISO Alpha 2 country code
+    """
+    global COUNTRY_NAMES
+    if COUNTRY_NAMES is None:
+        countries = pd.read_csv(COUNTRY_CODES_FILE, encoding="utf-8",
+                                keep_default_na=False)  # keep_default_na prevents Namibia "NA" being read as NaN!
+        country_names = dict(countries[['country_code', 'country_name']].values)
+        country_names.update({country["cca2"]: country["name"]["common"] for country in (load_countries() or [])})
+        COUNTRY_NAMES = country_names
+    return COUNTRY_NAMES
+
+
+def map_country_names(country_codes):
+    """
+    :param country_codes: Series of 2-letter ISO Alpha 2 country codes
+    :return: Series of countries' common names (NaN for missing or unknown codes)
+    """
+    return country_codes.map(get_country_names(), na_action="ignore")
 
 
 def get_uk_non_academic_institutions_from_csv():
@@ -78,6 +174,32 @@ def get_uk_academic_institutions():
 # ALL_UK_INSTITUTIONS_DF2 = UK_ACADEMIC_INSTITUTIONS_DF.append(get_uk_non_academic_institutions())
 
 
+def add_http_cache_arguments(parser):
+    """
+    Add command line options to configure the cache of HTTP responses used when extracting data.
+    """
+    parser.add_argument("-ct", "--cache_ttl", type=int, default=360,
+                        help="Minutes a cached response is reused without asking the server if it changed. Older "
+                             "responses are revalidated and only downloaded again if they changed. Defaults to 360; "
+                             "use 0 to always revalidate.")
+    parser.add_argument("-cs", "--cache_max_size", type=int, default=500,
+                        help="Maximum size of the cache of responses in MB, beyond which the least recently used "
+                             "responses are evicted. Defaults to 500.")
+    parser.add_argument("-nc", "--no_cache", action="store_true",
+                        help="Do not cache responses - always download everything.")
+
+
+def add_history_arguments(parser):
+    """
+    Add command line options to configure how extracted data files are kept.
+    """
+    parser.add_argument("-ho", "--history_only", action="store_true",
+                        help="Keep dated raw and processed data files only in their histories in data/history/, "
+                             "removing the CSV files (but not snapshots of processed data) once added to them. The "
+                             "analyser and map scripts, given the name of a removed file, load its snapshot or rebuild "
+                             "it from its history. Otherwise full copies are kept too.")
+
+
 def parse_command_line_parameters_amy():
     parser = argparse.ArgumentParser()
     # parser.add_argument("-c", "--country_code", type=str,
@@ -101,6 +223,27 @@ def parse_command_line_parameters_amy():
     parser.add_argument("-pi", "--processed_instructors_file", type=str, default=None,
                         help="File path where processed instructors data will be saved in CSV format. "
                              "If omitted, data will be saved to data/processed/ directory and named with the current date.")
+
+    parser.add_argument("-inc", "--incremental", action="store_true",
+                        help="Only get workshops and instructors added or changed in AMY since the last run and merge "
+                             "them into the raw data saved by that run. Instructors' badges and taught workshops are "
+                             "still got for all instructors, as getting them does not mark instructors as changed. "
+                             "Records removed from AMY are picked up by the next full run.")
+
+    parser.add_argument("-r", "--resume", action="store_true",
+                        help="Resume an extraction that failed part way through, without getting again the data it had "
+                             "already got from AMY. Otherwise the extraction starts from scratch.")
+
+    parser.add_argument("-wi", "--workshop_instructors", action="store_true",
+                        help="Also get names of instructors who taught at each workshop. Beware that this is personal "
+                             "data that should not be uploaded to a public GitHub repo.")
+
+    parser.add_argument("-w", "--workers", type=int, default=8,
+                        help="Maximum number of concurrent requests used to get instructors' badges, taught workshops "
+                             "and workshops' instructors from AMY. Defaults to 8; use 1 to make requests one after "
+                             "another.")
+    add_http_cache_arguments(parser)
+    add_history_arguments(parser)
     args = parser.parse_args()
     if hasattr(args, "password"):  # if the -p switch was set - ask user for a password but do not echo it
         if args.password is None:
@@ -129,6 +272,8 @@ def parse_command_line_parameters_redash():
     parser.add_argument("-pi", "--processed_instructors_file", type=str, default=None,
                         help="File path where processed instructors data will be saved in CSV format. "
                              "If omitted, data will be saved to data/processed/ directory and named with the current date.")
+    add_http_cache_arguments(parser)
+    add_history_arguments(parser)
 
     args = parser.parse_args()
     return args
@@ -140,9 +285,15 @@ def parse_command_line_parameters_analyses():
     required_args.add_argument("-in", "--input_file", type=str, default=None, required=True,
                                help="The path to the input data CSV file to analyse.")
     parser.add_argument("-out", "--output_file", type=str, default=None,
-                        help="File path where data analyses will be saved in xslx Excel format. "
-                             "If omitted, the Excel file will be saved to "
+                        help="File path where data analyses will be saved in the chosen format (a directory for csv "
+                             "and parquet formats). If omitted, the analyses will be saved to "
                              "data/analyses/ directory and will be named as 'analysed_<INPUT_FILE_NAME>'.")
+    parser.add_argument("-f", "--format", type=str, default="xlsx", choices=REPORT_FORMATS,
+                        help="Format to save data analyses in - an xlsx Excel spreadsheet with charts (the default), "
+                             "a directory of CSV or Parquet files with a file per table, or an HTML page with charts.")
+    parser.add_argument("-nc", "--no_cache", action="store_true",
+                        help="Recompute all analyses rather than serve the ones whose input data has not changed from "
+                             "the cache in data/analyses/cache/.")
     args = parser.parse_args()
     return args
 
@@ -156,22 +307,81 @@ def parse_command_line_parameters_maps():
     return args
 
 
+def parse_command_line_parameters_history():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-im", "--import_files", type=str, nargs="*", default=None,
+                        help="Add dated raw and processed data files (e.g. data/raw/*.csv) to their histories, oldest "
+                             "first. If no files are given, all files in data/raw/ and data/processed/ are added.")
+    parser.add_argument("-n", "--name", type=str, default=None,
+                        help="Name of the history to rebuild a file from, e.g. 'raw_carpentry_workshops_UK_redash'.")
+    parser.add_argument("-a", "--as_of", type=str, default=None,
+                        help="Date (YYYY-MM-DD) to rebuild the file as of - the latest file extracted on or before "
+                             "it is rebuilt.")
+    parser.add_argument("-out", "--output_file", type=str, default=None,
+                        help="File path where the rebuilt file will be saved. If omitted, it will be saved to the "
+                             "current directory, named as the original file.")
+    args = parser.parse_args()
+    return args
+
+
+def parse_workshop_tags(workshop_tags):
+    """
+    :param workshop_tags: tags as a list, a comma-separated string (as in Redash results) or a string representation
+    of a list (as in CSV files saved from a DataFrame)
+    :return: list of tags (empty if there are no tags)
+    """
+    if isinstance(workshop_tags, list):
+        return workshop_tags
+    if not isinstance(workshop_tags, str):
+        return []
+    if workshop_tags.startswith("["):
+        return literal_eval(workshop_tags)
+    return workshop_tags.split(",")
+
+
+def classify_workshop_tags(workshop_tags):
+    """
+    Classify workshops by their tags in one pass. Tags are exploded into a one-hot matrix (one column per tag), from
+    which workshop type, subtype, status and whether a workshop was held online are all read. If a workshop has more
+    than one tag of a kind, the first one in WORKSHOP_TYPE, WORKSHOP_SUBTYPE or STOPPED_WORKSHOP_STATUS wins.
+    :param workshop_tags: Series of tags - see parse_workshop_tags() for the accepted formats
+    :return: DataFrame with the index of workshop_tags and columns 'workshop_type', 'workshop_subtype',
+    'workshop_status' ("" if none of the recognised tags is found, NaN if there are no tags at all) and 'is_online'
+    """
+    tags = workshop_tags.map(parse_workshop_tags).explode().str.strip()
+    one_hot = pd.get_dummies(tags, dtype=bool).groupby(level=0).max()
+
+    classification = pd.DataFrame(index=workshop_tags.index)
+    for column, categories in [("workshop_type", WORKSHOP_TYPE), ("workshop_subtype", WORKSHOP_SUBTYPE),
+                               ("workshop_status", STOPPED_WORKSHOP_STATUS)]:
+        matrix = one_hot.reindex(index=workshop_tags.index, columns=categories, fill_value=False)
+        classification[column] = matrix.idxmax(axis=1).where(matrix.any(axis=1), "").where(workshop_tags.notna())
+    if "online" in one_hot.columns:
+        classification["is_online"] = one_hot["online"].reindex(workshop_tags.index, fill_value=False)
+    else:
+        classification["is_online"] = False
+    return classification
+
+
+def get_first_recognised_tag(workshop_tags, recognised_tags):
+    """
+    Classify a single workshop by its tags, as classify_workshop_tags() does for a Series of workshops but without
+    building a one-hot matrix.
+    :param workshop_tags: tags - see parse_workshop_tags() for the accepted formats
+    :param recognised_tags: tags of a kind, e.g. WORKSHOP_TYPE, in order of precedence
+    :return: the first of recognised_tags found in workshop_tags, or "" if none is found
+    """
+    tags = set(tag.strip() for tag in parse_workshop_tags(workshop_tags))
+    return next((tag for tag in recognised_tags if tag in tags), "")
+
+
 def extract_workshop_type(workshop_tags):
     """
     Extract workshop type from a list of workshop tags. Tags contain a mix of workshop status and workshop types.
     :param workshop_tags: list of tags
     :return: workshop type (e.g. "SWC", "DC", "LC" or "TTT", or "" if none of the recognised tags is found)
     """
-
-    # If we have the list passed as a string instead - convert to a list first
-    if isinstance(workshop_tags, str):
-        workshop_tags = workshop_tags.split(",")
-
-    tags = list(set(workshop_tags) & set(WORKSHOP_TYPE))  # intersection of 2 sets
-    if len(tags) > 0:  # non-empty list?
-        return tags[0]
-    else:
-        return ""
+    return get_first_recognised_tag(workshop_tags, WORKSHOP_TYPE)
 
 
 def extract_workshop_subtype(workshop_tags):
@@ -180,16 +390,7 @@ def extract_workshop_subtype(workshop_tags):
     :param workshop_tags: list of tags
     :return: workshop type (e.g. "Circuits", "Pilot", or "" if none of the recognised tags is found)
     """
-
-    # If we have the list passed as a string instead - convert to a list first
-    if isinstance(workshop_tags, str):
-        workshop_tags = workshop_tags.split(",")
-
-    tags = list(set(workshop_tags) & set(WORKSHOP_SUBTYPE))  # intersection of 2 sets
-    if len(tags) > 0:  # non-empty list?
-        return tags[0]
-    else:
-        return ""
+    return get_first_recognised_tag(workshop_tags, WORKSHOP_SUBTYPE)
 
 
 def extract_workshop_status(workshop_tags):
@@ -199,17 +400,7 @@ def extract_workshop_status(workshop_tags):
     :return: workshop status (e.g. one of 'stalled', 'cancelled', 'unresponsive' or "" if none of the recognised tags
     is found)
     """
-
-    # If we have the list passed as a string instead - convert to a list first
-    if isinstance(workshop_tags, str):
-        workshop_tags = workshop_tags.split(",")
-
-    # Is this a stopped workshop?
-    is_stopped = list(set(workshop_tags) & set(STOPPED_WORKSHOP_STATUS))
-    if len(is_stopped) > 0:  # non-empty list?
-        return is_stopped[0]  # return the first STOPPED_WORKSHOP_STATUS tag found
-    else:
-        return ""
+    return get_first_recognised_tag(workshop_tags, STOPPED_WORKSHOP_STATUS)
 
 
 def is_stopped(workshop_tags):
@@ -231,8 +422,21 @@ def get_country(country_code):
     :param country_code: 2-letter ISO Alpha 2 country code, e.g. 'GB' for United Kingdom
     :return: country's common name
     """
-    # print("country_code: " + country_code)
-    return next((country["name"]["common"] for country in COUNTRIES if country["cca2"] == country_code), None)
+    return get_country_names().get(country_code)
+
+
+def merge_changed_rows(previous_df, changed_df, key):
+    """
+    Merge new and changed rows into previously extracted data.
+    :param previous_df: dataframe with previously extracted data
+    :param changed_df: dataframe with rows added or changed since previous_df was extracted
+    :param key: column that identifies a row, e.g. workshop 'slug'
+    :return: dataframe with the rows of previous_df that did not change, followed by all the rows of changed_df
+    """
+    unchanged_df = previous_df[~previous_df[key].isin(changed_df[key])]
+    print("Merging " + str(changed_df.index.size) + " new or changed rows with " + str(unchanged_df.index.size) +
+          " unchanged rows")
+    return pd.concat([unchanged_df, changed_df], ignore_index=True)[changed_df.columns]
 
 
 def process_workshops(workshops_df):
@@ -248,17 +452,12 @@ def process_workshops(workshops_df):
                                                      na_action="ignore")
 
     # Extract workshop type ('SWC', 'DC', 'LC', 'TTT'), subtype ('Circuits', 'Pilot'),
-    # and status ('cancelled', 'unresponsive', 'stalled') from the list of workshop tags and add as new columns
+    # and status ('cancelled', 'unresponsive', 'stalled') from the list of workshop tags, as well as whether the
+    # workshop was held online, and add as new columns
     idx = workshops_df.columns.get_loc("tags")
-    workshops_df.insert(loc=idx, column='workshop_type',
-                        value=workshops_df["tags"])
-    workshops_df["workshop_type"] = workshops_df["tags"].map(extract_workshop_type, na_action="ignore")
-
-    workshops_df.insert(loc=idx + 1, column='workshop_subtype', value=workshops_df["tags"])
-    workshops_df["workshop_subtype"] = workshops_df["tags"].map(extract_workshop_subtype, na_action="ignore")
-
-    workshops_df.insert(loc=idx + 2, column='workshop_status', value=workshops_df["tags"])
-    workshops_df["workshop_status"] = workshops_df["tags"].map(extract_workshop_status, na_action="ignore")
+    classification = classify_workshop_tags(workshops_df["tags"])
+    for i, column in enumerate(["workshop_type", "workshop_subtype", "workshop_status", "is_online"]):
+        workshops_df.insert(loc=idx + i, column=column, value=classification[column])
 
     # Drop all stopped workshops
     stopped_workshops = workshops_df[(workshops_df['workshop_status'].isin(STOPPED_WORKSHOP_STATUS))]
@@ -266,71 +465,64 @@ def process_workshops(workshops_df):
 
     # Insert countries where workshops were held based on country_code
     idx = workshops_df.columns.get_loc("country_code")
-    workshops_df.insert(loc=idx, column='country', value=workshops_df["country_code"])
-    countries = pd.read_csv("lib/country_codes.csv", encoding="utf-8",
-                            keep_default_na=False)  # keep_default_na prevents Namibia "NA" being read as NaN!
-    countries_mapping = dict(countries[['country_code', 'country_name']].values)
-    workshops_df['country'] = workshops_df['country_code'].map(countries_mapping, na_action="ignore")
+    workshops_df.insert(loc=idx, column='country', value=map_country_names(workshops_df["country_code"]))
 
     # Extract hosts' top level Web domains from host URIs or host web domains, depending which column we have
     if "organiser_web_domain" in workshops_df.columns:
         idx = workshops_df.columns.get_loc("organiser_web_domain") + 1
         workshops_df.insert(loc=idx, column='organiser_top_level_web_domain',
-                            value=workshops_df["organiser_web_domain"])
-        workshops_df["organiser_top_level_web_domain"] = workshops_df["organiser_web_domain"].apply(
-            lambda x: tldextract.extract(x).domain + '.' + tldextract.extract(x).suffix)
+                            value=map_top_level_domains(workshops_df["organiser_web_domain"]))
     elif "organiser_uri" in workshops_df.columns:
         # Extract hosts' web domains from host URIs
         idx = workshops_df.columns.get_loc("organiser_uri") + 1
-        workshops_df.insert(loc=idx, column='organiser_top_level_web_domain', value=workshops_df["organiser_uri"])
-        workshops_df["organiser_top_level_web_domain"] = workshops_df["organiser_uri"].map(
-            lambda uri: extract_top_level_domain_from_uri(uri),
-            na_action="ignore")  # extract host's top-level domain from URIs like 'https://amy.carpentries.org/api/v1/organizations/earlham.ac.uk/'
+        # (extract host's top-level domain from URIs like 'https://amy.carpentries.org/api/v1/organizations/earlham.ac.uk/')
+        workshops_df.insert(loc=idx, column='organiser_top_level_web_domain',
+                            value=map_top_level_domains_from_uris(workshops_df["organiser_uri"]))
 
     # Fix coordinates for workshops with missing geo-coords (use the coords for organiser) and online
     # workshops that have longitude in [0, -1]
-    all_institutions_longitude_dict = dict(ALL_UK_INSTITUTIONS_DF[['top_level_web_domain', 'longitude']].values)
-    all_institutions_latitude_dict = dict(ALL_UK_INSTITUTIONS_DF[['top_level_web_domain', 'latitude']].values)
-    # First lookup latitude as longitude is used to match the dirty rows and it will be overwritten with values
-    workshops_df['latitude'] = workshops_df.apply(
-        lambda x: all_institutions_latitude_dict.get(x['organiser_top_level_web_domain'])
-        if pd.isna(x['longitude']) or x['longitude'] in [0, -1]
-        else x['latitude'], axis=1
-    )
-    workshops_df['longitude'] = workshops_df.apply(
-        lambda x: all_institutions_longitude_dict.get(x['organiser_top_level_web_domain'])
-        if pd.isna(x['longitude']) or x['longitude'] in [0,-1]
-        else x['longitude'], axis=1
-    )
+    institutions_df = load_all_uk_institutions()
+    dirty_coordinates = workshops_df['longitude'].isna() | workshops_df['longitude'].isin([0, -1])
+    # Join the organisers with the institutions table once and fill both coordinates of the dirty rows together
+    # (if an institution is listed more than once, its last entry is used)
+    institutions_coordinates = institutions_df[['top_level_web_domain', 'latitude', 'longitude']].dropna(
+        subset=['top_level_web_domain']).drop_duplicates(subset='top_level_web_domain', keep='last')
+    organisers_coordinates = workshops_df[['organiser_top_level_web_domain']].merge(
+        institutions_coordinates, how='left', left_on='organiser_top_level_web_domain',
+        right_on='top_level_web_domain')  # a left merge keeps the order of workshops
+    organisers_coordinates.index = workshops_df.index
+    workshops_df.loc[dirty_coordinates, ['latitude', 'longitude']] = \
+        organisers_coordinates.loc[dirty_coordinates, ['latitude', 'longitude']].values
     print("\nWorkshops with no geo-coordinates: ")
     print(workshops_df[workshops_df['longitude'].isna()][['slug','organiser']])
     print("\nWorkshops with 'online' workshop coordinates: ")
     print(workshops_df[workshops_df['longitude'].isna()][['slug','organiser']])
 
     # Get data for UK institutions to lookup
-    all_institutions_regions_dict = dict(ALL_UK_INSTITUTIONS_DF[['top_level_web_domain', 'region']].values)  # create a dict for lookup
+    all_institutions_regions_dict = dict(institutions_df[['top_level_web_domain', 'region']].values)  # create a dict for lookup
     # Get regions for workshops
     # First try by workshop (latitude, longitude) as workshop (host) location may not match organiser location
     print("Getting regions for host institutions based on polygon data...")
     idx = workshops_df.columns.get_loc("country") + 1
     workshops_df.insert(loc=idx, column='region', value=np.nan)
-    workshops_df['region'] = workshops_df.apply(
-        lambda x: get_uk_region(latitude=x['latitude'], longitude=x['longitude'], institution=x['organiser'])
-        if (pd.notna(x['longitude']) and x['longitude'] not in [0,-1])
-        else np.nan, axis=1
-    )
+    has_coordinates = workshops_df['longitude'].notna() & ~workshops_df['longitude'].isin([0, -1])
+    workshops_df['region'] = get_uk_regions(workshops_df['latitude'].where(has_coordinates),
+                                            workshops_df['longitude'].where(has_coordinates))
+    not_found = workshops_df[has_coordinates & workshops_df['region'].isna()]
+    print("\nCould not find UK region from polygon data for " + str(not_found.index.size) + " workshops, by organiser: ")
+    print(not_found['organiser'].value_counts(dropna=False))
     # For all rows where region is null, map by organiser_top_level_web_domain to find region
     print("\nGetting regions for host institutions based on organiser_top_level_web_domain...")
     regions_from_institution = workshops_df[workshops_df['region'].isna()]['organiser_top_level_web_domain'].map(all_institutions_regions_dict)
-    workshops_df['region'].update(regions_from_institution) # update regions in place (indexes will match)
+    workshops_df['region'] = workshops_df['region'].fillna(regions_from_institution)  # indexes will match
     print("\nWorkshops with no region: ")
     print(workshops_df[workshops_df['region'].isna()]['organiser'])
 
     # Get normalised (official) and common names for UK academic institutions, if exist
     uk_academic_institutions_normalised_names_dict = dict(
-        ALL_UK_INSTITUTIONS_DF[['top_level_web_domain', 'normalised_name']].values)  # create a dict for lookup
+        institutions_df[['top_level_web_domain', 'normalised_name']].values)  # create a dict for lookup
     uk_academic_institutions_common_names_mapping = dict(
-        ALL_UK_INSTITUTIONS_DF[['top_level_web_domain', 'common_name']].values)  # create a dict for lookup
+        institutions_df[['top_level_web_domain', 'common_name']].values)  # create a dict for lookup
 
     # Insert normalised (official) name for organiser
     idx = workshops_df.columns.get_loc("organiser_top_level_web_domain") + 1
@@ -355,10 +547,7 @@ def process_instructors(instructors_df):
     """
 
     idx = instructors_df.columns.get_loc("country_code")
-    instructors_df.insert(loc=idx, column='country',
-                          value=instructors_df["country_code"])
-    instructors_df["country"] = instructors_df["country"].map(lambda country_code: get_country(country_code),
-                                                              na_action="ignore")
+    instructors_df.insert(loc=idx, column='country', value=map_country_names(instructors_df["country_code"]))
 
     # Insert normalised/official names for UK academic institutions
     print("\nInserting normalised name for instructors' affiliations/institutions...\n")
@@ -383,28 +572,20 @@ def process_instructors(instructors_df):
     print(instructors_df[instructors_df['region'].isna()]['institution'])
     print("Inserting regions for instructors based on the nearest airport...")
     # For all rows where region is null, map by airport_code to find region
-    uk_airports_dict = dict(UK_AIRPORTS[["airport_code", "region"]].values)
+    uk_airports_dict = dict(load_uk_airports()[["airport_code", "region"]].values)
     regions_from_airport = instructors_df[instructors_df['region'].isna()]['airport_code'].map(
         uk_airports_dict)
-    instructors_df['region'].update(regions_from_airport)  # update regions in place (indexes will match)
+    instructors_df['region'] = instructors_df['region'].fillna(regions_from_airport)  # indexes will match
     print("Instructors with no region: ")
     print(instructors_df[instructors_df['region'].isna()]['institution'])
 
     # Extract dates when instructors badges were awarded from list
     if "badges_dates" in instructors_df.columns:
         idx = instructors_df.columns.get_loc("badges_dates")
-        i = 1
-        for badge in INSTRUCTOR_BADGES:
-            instructors_df.insert(loc=idx + i, column=badge, value=instructors_df["badges"])
-            instructors_df[badge] = pd.to_datetime(
-                instructors_df.apply(lambda x: get_badge_date(badge=badge, badges=x['badges'], dates=x['badges_dates']),
-                                     axis=1))
-            i = i + 1
-
-        instructors_df.insert(loc=idx + i, column='earliest_badge_awarded',
-                              value=instructors_df[INSTRUCTOR_BADGES].min(axis=1))
-        instructors_df["earliest_badge_awarded"] = pd.to_datetime(instructors_df["earliest_badge_awarded"])
-        instructors_df.insert(loc=idx + i + 1, column='year_earliest_badge_awarded',
+        badge_dates = get_badge_dates(instructors_df["badges"], instructors_df["badges_dates"])
+        for i, badge in enumerate(INSTRUCTOR_BADGES + ['earliest_badge_awarded']):
+            instructors_df.insert(loc=idx + 1 + i, column=badge, value=badge_dates[badge])
+        instructors_df.insert(loc=idx + 1 + len(INSTRUCTOR_BADGES) + 1, column='year_earliest_badge_awarded',
                               value=instructors_df["earliest_badge_awarded"].dt.year.fillna(0.0).astype(int))
 
     # # Create a dictionary of taught_workshops (a list of workshop slugs where instructor taught) and
@@ -415,9 +596,8 @@ def process_instructors(instructors_df):
 
     # Create a dictionary of {year: number_taught_workshops_per_year} per instructor and save into a new column
     idx = instructors_df.columns.get_loc("taught_workshops")
-    instructors_df.insert(loc=idx + 2, column='taught_workshops_per_year', value=instructors_df["taught_workshops"])
-    instructors_df['taught_workshops_per_year'] = instructors_df['taught_workshop_dates'].apply(
-        lambda x: workshops_per_year_dict(x))
+    instructors_df.insert(loc=idx + 2, column='taught_workshops_per_year',
+                          value=taught_workshops_per_year(instructors_df['taught_workshop_dates']))
 
     # For some reason Redash returns some people who are not instructors that have empty 'earliest_badge_awarded' field!
     # This has been fixed in the query that gets the raw data from Redash!
@@ -426,6 +606,67 @@ def process_instructors(instructors_df):
     return instructors_df
 
 
+def parse_slug_dates(dates):
+    """
+    Parse dates taken from workshop slugs, all at once, followed by a second pass in the US date format for dates
+    that failed to parse.
+    :param dates: Series of date strings (or dates)
+    :return: Series of datetimes of dates that could be parsed, with the index of dates
+    """
+    dates = dates[dates.notna() & (dates != "")]
+    parsed = pd.to_datetime(dates, format='%Y-%m-%d', errors='coerce')
+    # Try the US date format with date before month - some slugs wrongly use this
+    us_format = parsed.isna()
+    parsed[us_format] = pd.to_datetime(dates[us_format], format='%Y-%d-%m', errors='coerce')
+    for date in dates[parsed.isna()]:
+        print("An error occurred while parsing date from slug: " + str(date))
+    return parsed.dropna()
+
+
+def taught_workshop_years(taught_workshop_dates):
+    """
+    Explode the dates of workshops taught by instructors into a long table of (instructor, year). All dates are parsed
+    at once, followed by a second pass in the US date format for dates that failed to parse.
+    :param taught_workshop_dates: Series of comma-separated strings (or lists) of dates of workshops taught
+    :return: Series of years of taught workshops, indexed by instructor (one entry per workshop)
+    """
+    dates = taught_workshop_dates.map(lambda value: value.split(',') if isinstance(value, str) else value)
+    parsed = parse_slug_dates(dates.explode())
+    return parsed.dt.year.rename("year")
+
+
+def taught_workshops_per_year_matrix(taught_workshop_dates):
+    """
+    Count workshops taught by each instructor per year.
+    :param taught_workshop_dates: Series of comma-separated strings (or lists) of dates of workshops taught
+    :return: DataFrame of number of taught workshops with the index of taught_workshop_dates and a column per year
+    (in ascending order) any of the workshops were taught in
+    """
+    years = taught_workshop_years(taught_workshop_dates)
+    matrix = pd.crosstab(years.index, years.values)
+    matrix = matrix.reindex(index=taught_workshop_dates.index, fill_value=0)
+    matrix.index.name = taught_workshop_dates.index.name
+    matrix.columns.name = None
+    return matrix
+
+
+def taught_workshops_per_year(taught_workshop_dates):
+    """
+    Count workshops taught by each instructor per year as dictionaries, the way they are saved in processed data.
+    :param taught_workshop_dates: Series of comma-separated strings (or lists) of dates of workshops taught
+    :return: Series of dictionaries like {year : number_taught_workshops_per_year}, None for instructors who did not
+    teach any workshops
+    """
+    years = taught_workshop_years(taught_workshop_dates)
+    counts = years.groupby([years.index, years.values], sort=False).size()
+    per_year = {}
+    for (instructor, year), count in counts.items():
+        per_year.setdefault(instructor, {})[int(year)] = int(count)
+    return pd.Series([per_year.get(instructor, {}) if isinstance(dates, (str, list)) and len(dates) > 0 else None
+                      for instructor, dates in taught_workshop_dates.items()], index=taught_workshop_dates.index,
+                     dtype=object)
+
+
 def workshops_per_year_dict(taught_workshop_dates):
     """
     Counts number of workshops taught for each year the person was actively teaching.
@@ -489,6 +730,29 @@ def create_dict(list_a, list_b):
     return json.dumps(d)
 
 
+def get_badge_dates(badges, badges_dates):
+    """
+    Get the dates instructors were awarded each of the instructor badges. Pairs of badges and dates are exploded
+    into one long (instructor, badge, date) table and pivoted into a column per badge in one go.
+    :param badges: Series of lists (or comma-separated strings) of badges awarded to each instructor
+    :param badges_dates: Series of lists (or comma-separated strings) of dates the badges were awarded, in the order
+    of badges
+    :return: DataFrame with the index of badges, a column of dates per badge in INSTRUCTOR_BADGES (NaT if the badge
+    was not awarded) and column 'earliest_badge_awarded'
+    """
+    split = lambda value: value.split(',') if isinstance(value, str) else value
+    awards = pd.DataFrame({"badge": badges.map(split), "date": badges_dates.map(split)}).explode(["badge", "date"])
+    awards = awards.dropna().rename_axis("instructor").reset_index()
+    # An instructor listed with the same badge twice keeps the first date, as before
+    awards = awards.drop_duplicates(subset=["instructor", "badge"], keep="first")
+    awards["date"] = pd.to_datetime(awards["date"])
+    badge_dates = awards.pivot(index="instructor", columns="badge", values="date")
+    badge_dates = badge_dates.reindex(index=badges.index, columns=INSTRUCTOR_BADGES).apply(pd.to_datetime)
+    badge_dates.columns.name = None
+    badge_dates['earliest_badge_awarded'] = badge_dates[INSTRUCTOR_BADGES].min(axis=1)
+    return badge_dates
+
+
 def get_badge_date(badge, badges, dates):
     """
     For a given badge name, return the date it was awarded.
@@ -517,15 +781,360 @@ def create_readme_tab(writer, readme_text):
     worksheet.write(0, 0, readme_text)
 
 
-def create_excel_analyses_spreadsheet(file, df, sheet_name):
+def create_excel_analyses_spreadsheet(file, df, sheet_name, constant_memory=True):
     """
     Create an Excel spreadsheet to save the dataframe and various analyses and graphs.
+    :param file: Excel file
+    :param df: DataFrame saved to the first sheet (or sheets, if it has more rows than a sheet can hold)
+    :param sheet_name: name of the (first) sheet the DataFrame is saved to
+    :param constant_memory: whether to write the spreadsheet in xlsxwriter's constant memory mode, in which rows are
+    written to disk as soon as they are complete rather than kept in memory until the spreadsheet is closed - cells
+    must then be written in row order, e.g. with write_data_sheet and write_table
+    :return: pandas ExcelWriter to add analyses to and close
     """
-    writer = pd.ExcelWriter(file, engine='xlsxwriter')
-    df.to_excel(writer, sheet_name=sheet_name, index=False)
+    writer = pd.ExcelWriter(file, engine='xlsxwriter', engine_kwargs={'options': {'constant_memory': constant_memory}})
+    write_data_sheet(writer, df, sheet_name)
     return writer
 
 
+def get_excel_value(value):
+    """
+    Convert a value to a type xlsxwriter writes, as DataFrame.to_excel does (e.g. lists are written as strings).
+    :param value: value of a DataFrame cell
+    :return: tuple of the value, or None for missing values, and the format of dates ('date' or 'datetime') or None
+    """
+    if value is None or value is pd.NaT or (isinstance(value, float) and value != value):
+        return None, None
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value), None
+    if isinstance(value, (int, np.integer)):
+        return int(value), None
+    if isinstance(value, (float, np.floating)):
+        return float(value), None
+    if isinstance(value, str):
+        return value, None
+    if isinstance(value, datetime.datetime):
+        return value, 'datetime'
+    if isinstance(value, datetime.date):
+        return value, 'date'
+    return str(value), None
+
+
+def write_data_sheet(writer, df, sheet_name, max_rows=EXCEL_MAX_ROWS):
+    """
+    Save a DataFrame to the spreadsheet row by row, without its index, keeping the types of values (numbers, dates,
+    booleans) and splitting it across sheets named sheet_name, sheet_name_2, ... if it has more rows than a sheet can
+    hold. Rows are converted in chunks so that, in constant memory mode, memory used does not grow with the data.
+    :param writer: pandas ExcelWriter using the xlsxwriter engine
+    :param df: DataFrame to save
+    :param sheet_name: name of the (first) sheet
+    :param max_rows: maximum number of rows of a sheet, including the header
+    :return: list of names of the sheets the DataFrame was saved to
+    """
+    workbook = writer.book
+    formats = {'date': workbook.add_format({'num_format': EXCEL_DATE_FORMAT}),
+               'datetime': workbook.add_format({'num_format': EXCEL_DATETIME_FORMAT}),
+               None: None}
+    header = [get_excel_value(column)[0] for column in df.columns]
+    rows_per_sheet = max_rows - 1
+
+    sheet_names = []
+    for sheet_start in range(0, max(len(df.index), 1), rows_per_sheet):
+        sheet_names.append(sheet_name if not sheet_names else sheet_name + '_' + str(len(sheet_names) + 1))
+        worksheet = workbook.add_worksheet(sheet_names[-1])
+        worksheet.write_row(0, 0, header)
+
+        sheet_end = min(sheet_start + rows_per_sheet, len(df.index))
+        for chunk_start in range(sheet_start, sheet_end, EXCEL_CHUNK_ROWS):
+            chunk = df.iloc[chunk_start:min(chunk_start + EXCEL_CHUNK_ROWS, sheet_end)]
+            columns = [chunk.iloc[:, column].tolist() for column in range(len(chunk.columns))]
+            for row, values in enumerate(zip(*columns), start=chunk_start - sheet_start + 1):
+                for column, value in enumerate(values):
+                    value, value_format = get_excel_value(value)
+                    if value is not None:
+                        worksheet.write(row, column, value, formats[value_format])
+    return sheet_names
+
+
+def get_label_runs(labels, level):
+    """
+    :param labels: MultiIndex, e.g. columns of a pivoted table
+    :param level: level of the labels
+    :return: list of (first, last) positions of runs of labels that are the same up to and including the level
+    """
+    prefixes = [label[:level + 1] for label in labels]
+    runs = []
+    start = 0
+    for i in range(1, len(prefixes) + 1):
+        if i == len(prefixes) or prefixes[i] != prefixes[start]:
+            runs.append((start, i - 1))
+            start = i
+    return runs
+
+
+def get_table_cells(table, index=True):
+    """
+    Lay out a table as DataFrame.to_excel does with merged cells - a row of headers per level of column labels (with
+    runs of the same label merged and, for several levels, a row for the index names below them), then a row per row
+    of the table with its index labels (runs of the same label merged) followed by its values.
+    :param table: DataFrame
+    :param index: whether to save the table's index
+    :return: list of (row, column, value, last row, last column) of cells - last row and column are None unless the cell
+    is merged with the cells up to them
+    """
+    index_levels = table.index.nlevels if index else 0
+    cells = []
+    if table.columns.nlevels > 1:
+        if not index:
+            raise NotImplementedError("Tables with several levels of column labels can only be saved with their index")
+        for level in range(table.columns.nlevels):
+            cells.append((level, index_levels - 1, table.columns.names[level], None, None))
+            for first, last in get_label_runs(table.columns, level):
+                merged = last > first
+                cells.append((level, index_levels + first, table.columns[first][level], level if merged else None,
+                              index_levels + last if merged else None))
+        index_names_row = table.columns.nlevels
+        header_rows = table.columns.nlevels + 1
+    else:
+        cells.extend((0, index_levels + i, column, None, None) for i, column in enumerate(table.columns))
+        index_names_row = 0
+        header_rows = 1
+
+    if index:
+        cells.extend((index_names_row, level, name, None, None) for level, name in enumerate(table.index.names))
+        if index_levels > 1:
+            for level in range(index_levels):
+                for first, last in get_label_runs(table.index, level):
+                    merged = last > first
+                    cells.append((header_rows + first, level, table.index[first][level],
+                                  header_rows + last if merged else None, level if merged else None))
+        else:
+            cells.extend((header_rows + i, 0, label, None, None) for i, label in enumerate(table.index))
+    for column in range(len(table.columns)):
+        cells.extend((header_rows + i, index_levels + column, value, None, None)
+                     for i, value in enumerate(table.iloc[:, column]))
+    return cells
+
+
+def write_table(writer, table, sheet_name, index=True, notes=()):
+    """
+    Save an analysis table to its own sheet laid out as by DataFrame.to_excel (e.g. with merged headers of pivoted
+    tables), with notes next to it. Cells are written in row order, as required in constant memory mode.
+    :param writer: pandas ExcelWriter using the xlsxwriter engine
+    :param table: DataFrame or Series
+    :param sheet_name: name of the sheet
+    :param index: whether to save the table's index
+    :param notes: list of (row, column, text) notes
+    """
+    if isinstance(table, pd.Series):
+        table = table.to_frame()
+    cells = get_table_cells(table, index) + [(row, column, text, None, None) for row, column, text in notes]
+
+    workbook = writer.book
+    formats = {'date': workbook.add_format({'num_format': EXCEL_DATE_FORMAT}),
+               'datetime': workbook.add_format({'num_format': EXCEL_DATETIME_FORMAT}),
+               None: None}
+    worksheet = workbook.add_worksheet(sheet_name)
+    for row, column, value, merge_row, merge_column in sorted(cells, key=lambda cell: (cell[0], cell[1])):
+        value, value_format = get_excel_value(value)
+        if merge_row is not None and merge_column is not None:
+            worksheet.merge_range(row, column, merge_row, merge_column, value, formats[value_format])
+        elif value is not None and value != '':
+            worksheet.write(row, column, value, formats[value_format])
+
+
+def get_snapshot_file(file):
+    """
+    :param file: CSV file with processed data (or its snapshot)
+    :return: snapshot file kept next to the CSV file
+    """
+    return re.sub(r'\.(csv|parquet)$', '', file) + SNAPSHOT_EXTENSION
+
+
+def parse_list(value):
+    """
+    :param value: list, string representation of a list (as saved in CSV files) or comma-separated string
+    :return: list, empty if value is missing
+    """
+    if isinstance(value, list):
+        return value
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, str) and value != "":
+        return literal_eval(value) if value.startswith('[') else value.split(',')
+    return []
+
+
+def parse_dict(value):
+    """
+    :param value: dictionary or its string representation (as saved in CSV files)
+    :return: dictionary, empty if value is missing
+    """
+    if isinstance(value, dict):
+        return value
+    if isinstance(value, str) and value != "":
+        return literal_eval(value)
+    return {}
+
+
+def to_typed_processed_data(df):
+    """
+    Convert columns of processed workshop or instructor data that CSV files store as strings (lists, lists of dates,
+    dictionaries and dates) to their types. Columns that already have their types are left as they are.
+    :param df: DataFrame with processed workshops or instructors
+    :return: DataFrame with typed columns
+    """
+    df = df.copy()
+    for column in df.columns.intersection(PROCESSED_LIST_COLUMNS):
+        df[column] = df[column].map(parse_list).astype(object)
+    for column in df.columns.intersection(PROCESSED_DATE_LIST_COLUMNS):
+        dates = df[column].map(parse_list).explode()
+        dates = parse_slug_dates(dates).dt.date
+        dates = dates.groupby(level=0).agg(list).reindex(df.index)
+        df[column] = pd.Series([value if isinstance(value, list) else [] for value in dates], index=df.index,
+                               dtype=object)
+    for column in df.columns.intersection(PROCESSED_DICT_COLUMNS):
+        df[column] = df[column].map(parse_dict).astype(object)
+    for column in df.columns.intersection(PROCESSED_DATE_COLUMNS):
+        df[column] = pd.to_datetime(df[column])
+    return df
+
+
+def save_snapshot(df, file):
+    """
+    Save processed data as a typed columnar snapshot (a Parquet file), so it can be loaded without parsing any strings.
+    :param df: DataFrame with processed workshops or instructors
+    :param file: snapshot file
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    df = to_typed_processed_data(df)
+    columns = {}
+    for column in df.columns:
+        if column in PROCESSED_DATE_LIST_COLUMNS:
+            columns[column] = pa.array(df[column], type=pa.list_(pa.date32()))
+        elif column in PROCESSED_DICT_COLUMNS:
+            columns[column] = pa.array(df[column], type=pa.map_(pa.int64(), pa.int64()))
+        elif column in PROCESSED_LIST_COLUMNS:
+            columns[column] = pa.array(df[column], type=pa.list_(pa.string()))
+        else:
+            columns[column] = pa.Array.from_pandas(df[column])
+    pq.write_table(pa.table(columns), file)
+
+
+def save_processed_data(df, file):
+    """
+    Save processed data as CSV and, if pyarrow is installed, as a typed columnar snapshot next to it.
+    :param df: DataFrame with processed workshops or instructors
+    :param file: CSV file
+    """
+    df.to_csv(file, encoding="utf-8", index=False)
+    try:
+        snapshot_file = get_snapshot_file(file)
+        save_snapshot(df, snapshot_file)
+        print("Saved snapshot of processed data to " + snapshot_file)
+    except ImportError:
+        print("Install pyarrow to also save a snapshot of processed data for faster loading")
+
+
+def load_processed_data(file, history_dir=HISTORY_DIR):
+    """
+    Load processed data with typed columns (see to_typed_processed_data). The data is read from its snapshot (memory
+    mapped) if there is one at least as new as the CSV file and pyarrow is installed, or else parsed from the CSV file
+    (rebuilt from its history if the file was removed once added to it).
+    :param file: CSV file with processed workshops or instructors, or its snapshot
+    :param history_dir: directory with histories
+    :return: DataFrame with typed columns
+    """
+    snapshot_file = get_snapshot_file(file)
+    if os.path.isfile(snapshot_file) and (file == snapshot_file or not os.path.isfile(file) or
+                                          os.path.getmtime(snapshot_file) >= os.path.getmtime(file)):
+        try:
+            import pyarrow.parquet as pq
+            df = pq.read_table(snapshot_file, memory_map=True).to_pandas(maps_as_pydicts="strict")
+            # Lists come back as numpy arrays
+            for column in df.columns.intersection(PROCESSED_LIST_COLUMNS + PROCESSED_DATE_LIST_COLUMNS):
+                df[column] = df[column].map(parse_list).astype(object)
+            return df
+        except ImportError:
+            if file == snapshot_file:
+                raise
+            print("Install pyarrow to load the snapshot of processed data " + snapshot_file)
+    return to_typed_processed_data(read_data_file(file, history_dir))
+
+
+def read_data_file(file, history_dir=HISTORY_DIR, **read_csv_arguments):
+    """
+    Read a CSV data file or, if it was removed once added to its history, rebuild it from the history.
+    :param file: CSV file, e.g. 'data/raw/raw_carpentry_workshops_UK_2021-06-02_redash.csv'
+    :param history_dir: directory with histories
+    :param read_csv_arguments: arguments to pd.read_csv, e.g. usecols
+    :return: DataFrame as read from the file
+    :raises FileNotFoundError: if the file does not exist and its history has no data from the file's date
+    """
+    if os.path.isfile(file):
+        return pd.read_csv(file, encoding="utf-8", **read_csv_arguments)
+    name, date = parse_dated_file_name(file)
+    if name is not None:
+        history = get_history(name, history_dir)
+        if date in history.dates:
+            print("Rebuilding " + file + " from its history in " + history.directory)
+            return history.as_of(date, **read_csv_arguments)
+    raise FileNotFoundError("No such file or history of it: " + file)
+
+
+def parse_dated_file_name(file):
+    """
+    :param file: data file named with the date it was extracted on, e.g.
+    'data/raw/raw_carpentry_workshops_UK_2021-06-02_redash.csv'
+    :return: tuple of name of its history (e.g. 'raw_carpentry_workshops_UK_redash') and the date, or (None, None) if
+    the file is not named with a date
+    """
+    match = DATED_FILE_NAME_PATTERN.match(os.path.basename(file))
+    if match is None:
+        return None, None
+    return match.group("name") + (match.group("source") or ""), match.group("date")
+
+
+def get_history(name, history_dir=HISTORY_DIR):
+    """
+    :param name: name of the history, e.g. 'raw_carpentry_workshops_UK_redash'
+    :param history_dir: directory with histories
+    :return: SnapshotStore with the history of data files
+    """
+    from lib.snapshot_store import SnapshotStore
+
+    key = next((key for pattern, key in HISTORY_KEYS if re.search(pattern, name)), None)
+    return SnapshotStore(os.path.join(history_dir, name), key)
+
+
+def add_to_history(file, history_dir=HISTORY_DIR, remove_file=False):
+    """
+    Add a data file named with the date it was extracted on to its history, as the rows that changed since the
+    previous file.
+    :param file: CSV file
+    :param history_dir: directory with histories
+    :param remove_file: whether to remove the CSV file once added, keeping it in the history only - see
+    read_data_file(). The snapshot of processed data, if any, is kept so it is still loaded without parsing.
+    :return: whether the file was added to its history
+    """
+    name, date = parse_dated_file_name(file)
+    if name is None:
+        print("Not adding " + file + " to history as it is not named with a date")
+        return False
+    try:
+        get_history(name, history_dir).add_file(date, file)
+    except ValueError:
+        print("Not adding " + file + " to history of " + name + " as it has newer data")
+        print(traceback.format_exc())
+        return False
+    if remove_file:
+        os.remove(file)
+        print("Removed " + file + " - it is kept in the history of " + name)
+    return True
+
+
 def insert_normalised_institution(df, non_normalised_institution_column):
     """
     Fix names of UK institutions to be the official names, so we can cross reference them with their geocodes later on.
@@ -550,7 +1159,7 @@ def get_normalised_institution_name(non_normalised_institution_name):
 
     # First look up in normalised names dictionary (for non-academic institutions and odd spellings of
     # academic institutions or sub-departments that need to be mapped to the top-level institution)
-    normalised_institution_name = NORMALISED_INSTITUTIONS_DICT.get(
+    normalised_institution_name = load_normalised_institutions_dict().get(
         non_normalised_institution_name,
         non_normalised_institution_name
     )  # default to the original name if not found
@@ -568,9 +1177,9 @@ def insert_institutional_geocoordinates(df, institution_column_name, latitude_co
               value=None)
     # replace with the institution's latitude and longitude coordinates
     df[latitude_column_name] = df[institution_column_name].str.upper().map(
-        ALL_UK_INSTITUTIONS_DF.set_index("normalised_name")['latitude'])
+        load_all_uk_institutions().set_index("normalised_name")['latitude'])
     df[longitude_column_name] = df[institution_column_name].str.upper().map(
-        ALL_UK_INSTITUTIONS_DF.set_index("normalised_name")['longitude'])
+        load_all_uk_institutions().set_index("normalised_name")['longitude'])
     return df
 
 
@@ -581,40 +1190,104 @@ def insert_institutional_region(df):
               column='region',
               value=np.nan)
     df["region"] = df["normalised_institution"].str.upper().map(
-        ALL_UK_INSTITUTIONS_DF.set_index("normalised_name")['region'])
+        load_all_uk_institutions().set_index("normalised_name")['region'])
     return df
 
 
+def get_uk_regions_index():
+    """
+    :return: RegionIndex of UK regions, built the first time it is needed
+    """
+    global UK_REGIONS_INDEX
+    if UK_REGIONS_INDEX is None:
+        from lib.region_index import RegionIndex
+        UK_REGIONS_INDEX = RegionIndex(load_uk_regions(), grid_cell_size=UK_REGIONS_GRID_CELL_SIZE)
+    return UK_REGIONS_INDEX
+
+
+def get_uk_regions(latitudes, longitudes, use_cache=True):
+    """
+    Lookup UK regions for arrays of (latitude, longitude) coordinates in one go.
+    :param latitudes: array-like (e.g. Series) of latitudes
+    :param longitudes: array-like (e.g. Series) of longitudes
+    :param use_cache: if True, look coordinates up in (and add them to) the on-disk cache of regions of coordinates
+    seen by previous runs
+    :return: numpy array of region names (NaN where coordinates are missing or outside the UK regions)
+    """
+    global UK_REGIONS_CACHE
+    if not use_cache:
+        return get_uk_regions_index().lookup(latitudes, longitudes)
+    if UK_REGIONS_CACHE is None:
+        from lib.region_index import RegionCache
+        UK_REGIONS_CACHE = RegionCache(UK_REGIONS_CACHE_FILE, UK_REGIONS_FILE)
+    hits, misses = UK_REGIONS_CACHE.hits, UK_REGIONS_CACHE.misses
+    regions = UK_REGIONS_CACHE.lookup(latitudes, longitudes, get_uk_regions_index())
+    UK_REGIONS_CACHE.save()
+    print("Looked up UK regions of " + str(UK_REGIONS_CACHE.hits - hits + UK_REGIONS_CACHE.misses - misses) +
+          " distinct coordinates (" + str(UK_REGIONS_CACHE.hits - hits) + " cached)")
+    return regions
+
+
 def get_uk_region(latitude, longitude, institution):
     """
     Lookup UK region given the (latitude, longitude) coordinates.
     """
-    if ~pd.isna(latitude) and ~pd.isna(longitude):
-        # print("Looking up region for geocoordinates: (" + str(latitude) + ", " + str(
-        #     longitude) + ") for institution: '" + str(institution) + "'")
-        point = Point(longitude, latitude)
-        for feature in UK_REGIONS['features']:
-            polygon = shape(feature['geometry'])
-            if polygon.contains(point):
-                return(feature['properties']['NAME'])
-    print("Could not find UK region for " + str(institution) + " (" + str(latitude) + ", " + str(longitude) +
-          ") from polygon data")
-    return np.nan
+    region = get_uk_regions_index().lookup([latitude], [longitude])[0]
+    if pd.isna(region):
+        print("Could not find UK region for " + str(institution) + " (" + str(latitude) + ", " + str(longitude) +
+              ") from polygon data")
+    return region
+
+
+@functools.lru_cache(maxsize=None)
+def get_tld_extractor():
+    """
+    :return: tldextract extractor using the public suffix list snapshot bundled with tldextract, so it never tries
+    to fetch the list over the network
+    """
+    import tldextract
+    return tldextract.TLDExtract(suffix_list_urls=(), cache_dir=None)
+
+
+@functools.lru_cache(maxsize=None)
+def extract_top_level_domain(domain):
+    """
+    Extract top level (registered) domain from host names like 'cmist.manchester.ac.uk' or URLs like
+    'http://www.manchester.ac.uk/' - 'manchester.ac.uk' in both cases. Results are memoised per distinct domain.
+    :param domain: host name or URL
+    :return: top level domain
+    """
+    domain_parts = get_tld_extractor()(domain)
+    return domain_parts.domain + '.' + domain_parts.suffix
+
+
+def map_top_level_domains(domains):
+    """
+    Extract top level domains from a column of host names or URLs, once per distinct value.
+    :param domains: Series of host names or URLs
+    :return: Series of top level domains (NaN where domains are missing)
+    """
+    top_level_domains = {domain: extract_top_level_domain(domain) for domain in domains.dropna().unique()}
+    return domains.map(top_level_domains, na_action="ignore")
+
+
+def map_top_level_domains_from_uris(uris):
+    """
+    Extract hosts' top level domains from a column of AMY organisation URIs like
+    'https://amy.carpentries.org/api/v1/organizations/cmist.manchester.ac.uk/' ('manchester.ac.uk').
+    :param uris: Series of URIs
+    :return: Series of top level domains (NaN where URIs are missing)
+    """
+    return map_top_level_domains(uris.str.extract(r"([^/]+)/*$", expand=False))  # the host is the last path segment
 
 
 def extract_top_level_domain_from_string(domain):
     """
     Extract host's top level domain from strings like 'cmist.manchester.ac.uk' to 'manchester.ac.uk'.
-    top level domain 'manchester.ac.uk'.
-    :param domain
-    :return:
+    :param domain: host name
+    :return: top level domain like 'manchester.ac.uk'
     """
-    domain_parts = list(filter(None, re.split("(.+?)\.", domain)))
-    if len(domain_parts) >= 3:
-        domain_parts = domain_parts[-3:]  # Get the last 3 elements of the list only
-    top_level_domain = ''.join((x + '.') for x in domain_parts)  # join parts with '.' in between
-    top_level_domain = top_level_domain[:-1]  # remove the extra '.' at the end after joining
-    return top_level_domain
+    return extract_top_level_domain(domain)
 
 
 def extract_top_level_domain_from_uri(uri):
@@ -625,14 +1298,7 @@ def extract_top_level_domain_from_uri(uri):
     :param uri: URI like 'https://amy.carpentries.org/api/v1/organizations/earlham.ac.uk/'
     :return: top level domain like 'earlham.ac.uk'
     """
-    host = list(filter(None, re.split("(.+?)/", uri)))[-1]  # Get the host from the URI first
-    # Now just get the top level domain of the host
-    domain_parts = list(filter(None, re.split("(.+?)\.", host)))
-    if len(domain_parts) >= 3:
-        domain_parts = domain_parts[-3:]  # Get the past 3 elements of the list only
-    top_level_domain = ''.join((x + '.') for x in domain_parts)  # join parts with '.' in between
-    top_level_domain = top_level_domain[:-1]  # remove the extra '.' at the end after joining
-    return top_level_domain
+    return map_top_level_domains_from_uris(pd.Series([uri])).iloc[0]
 
 
 def merge_institution_data():
@@ -644,8 +1310,7 @@ def merge_institution_data():
                                            encoding="utf-8",
                                            usecols=['UKPRN','PROVIDER_NAME','VIEW_NAME','WEBSITE_URL',
                                                     'LONGITUDE','LATITUDE', 'STREET_NAME','TOWN','POSTCODE'])
-    uk_academic_institutions['top_level_web_domain'] = uk_academic_institutions['WEBSITE_URL'].apply(
-        lambda x: tldextract.extract(x).domain + '.' + tldextract.extract(x).suffix)
+    uk_academic_institutions['top_level_web_domain'] = map_top_level_domains(uk_academic_institutions['WEBSITE_URL'])
     # Join region info for academic provider from HESA data
     uk_academic_institutions['region'] = uk_academic_institutions['UKPRN'].map(
         hesa_uk_higher_education_providers_region_mapping, na_action="ignore")
@@ -677,9 +1342,10 @@ def get_center(df):
 
 
 def add_uk_regions_layer(map):
+    import folium
     # Load UK region information from a json file
     try:
-        regions = json.load(open(UK_REGIONS_FILE, encoding='utf-8'))
+        regions = load_uk_regions()
 
         # Add to a layer
         folium.GeoJson(regions,
@@ -697,6 +1363,8 @@ def add_uk_regions_layer(map):
 
 
 def generate_heatmap(df):
+    import folium
+    from folium.plugins import HeatMap
     center = get_center(df)
 
     heatmap = folium.Map(
@@ -713,6 +1381,7 @@ def generate_heatmap(df):
 
 
 def generate_map_with_circular_markers(df):
+    import folium
     center = get_center(df)
 
     map_with_markers = folium.Map(
@@ -742,6 +1411,8 @@ def generate_map_with_clustered_markers(df):
     """
     Generates a map with clustered markers of a number of locations given in a dataframe.
     """
+    import folium
+    from folium.plugins import MarkerCluster
     center = get_center(df)
 
     cluster_map = folium.Map(location=center, zoom_start=6,
@@ -762,6 +1433,7 @@ def generate_choropleth_map(df, regions, entity_type="workshops"):
     Generates a choropleth map of the number of entities (instructors or workshops) that can be found
     in each UK region.
     """
+    import folium
     entities_per_region_df = pd.DataFrame({'count': df.groupby(['region']).size()}).reset_index()
 
     center = get_center(df)
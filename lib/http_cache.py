@@ -0,0 +1,151 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+DEFAULT_TTL = 6 * 60 * 60  # seconds a cached response is used without asking the server if it changed
+DEFAULT_MAX_SIZE = 500 * 1024 * 1024  # bytes
+
+
+class HttpCache(object):
+    """
+    On-disk cache of HTTP response bodies. A response younger than the TTL is served locally; an older one is
+    revalidated with a conditional request (If-None-Match/If-Modified-Since using the stored ETag/Last-Modified), so
+    an unchanged response costs a 304 instead of a download. Least recently used responses are evicted once the
+    cache grows beyond its maximum size.
+    """
+
+    def __init__(self, cache_dir, ttl=DEFAULT_TTL, max_size=DEFAULT_MAX_SIZE):
+        """
+        :param cache_dir: directory to keep cached responses in
+        :param ttl: seconds a cached response is used without revalidating it (0 means always revalidate)
+        :param max_size: maximum total size of cached response bodies in bytes
+        """
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        self._size = sum(os.path.getsize(path) for path in self._body_files())
+
+    def _body_files(self):
+        return [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir) if name.endswith(".body")]
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()  # do not keep URLs (and API keys in them) on disk
+        return os.path.join(self.cache_dir, key + ".body"), os.path.join(self.cache_dir, key + ".json")
+
+    def lookup(self, url):
+        """
+        :param url: request URL (including URL parameters)
+        :return: dictionary with the cached response's 'etag', 'last_modified', 'stored_at' and whether it is still
+        'fresh', or None if the URL is not cached
+        """
+        body_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path, "r") as stream:
+                entry = json.load(stream)
+        except (OSError, ValueError):
+            return None
+        if not os.path.isfile(body_path):
+            return None
+        entry["fresh"] = time.time() - entry["stored_at"] < self.ttl
+        return entry
+
+    def open(self, url):
+        """
+        Open the cached body of a response and mark it as recently used. The response may have been evicted by another
+        thread since it was looked up or stored, so this is done under the lock - once open, the body can be read even
+        if it is evicted.
+        :param url: request URL (including URL parameters)
+        :return: binary file object, or None if the response is no longer cached
+        """
+        body_path, meta_path = self._paths(url)
+        with self._lock:
+            try:
+                os.utime(body_path)  # access time used for LRU eviction
+                return open(body_path, "rb")
+            except FileNotFoundError:
+                return None
+
+    def read(self, url):
+        """
+        :param url: request URL (including URL parameters)
+        :return: the cached body of a response as bytes, or None if the response is not cached
+        """
+        stream = self.open(url)
+        if stream is None:
+            return None
+        with stream:
+            return stream.read()
+
+    def revalidated(self, url):
+        """
+        Record that the server confirmed (with 304 Not Modified) that the cached response is still valid.
+        :param url: request URL (including URL parameters)
+        """
+        body_path, meta_path = self._paths(url)
+        entry = self.lookup(url)
+        if entry is not None:
+            entry.pop("fresh")
+            entry["stored_at"] = time.time()
+            self._write_meta(meta_path, entry)
+
+    def store(self, url, body, etag=None, last_modified=None):
+        """
+        Cache the body of a response, evicting the least recently used responses if the cache grows too big.
+        :param url: request URL (including URL parameters)
+        :param body: response body as bytes
+        :param etag: response's ETag header, if any
+        :param last_modified: response's Last-Modified header, if any
+        """
+        self.store_stream(url, [body], etag, last_modified)
+
+    def store_stream(self, url, chunks, etag=None, last_modified=None):
+        """
+        Cache the body of a response written chunk by chunk, so that it never has to be held in memory as a whole.
+        :param url: request URL (including URL parameters)
+        :param chunks: iterable of chunks of the response body as bytes
+        :param etag: response's ETag header, if any
+        :param last_modified: response's Last-Modified header, if any
+        """
+        body_path, meta_path = self._paths(url)
+        temp_path = body_path + "." + str(threading.get_ident()) + ".tmp"
+        size = 0
+        with open(temp_path, "wb") as stream:  # several responses may be downloaded at the same time
+            for chunk in chunks:
+                stream.write(chunk)
+                size += len(chunk)
+        with self._lock:
+            previous_size = os.path.getsize(body_path) if os.path.isfile(body_path) else 0
+            os.replace(temp_path, body_path)
+            self._write_meta(meta_path, {"etag": etag, "last_modified": last_modified, "stored_at": time.time()})
+            self._size += size - previous_size
+            if self._size > self.max_size:
+                self._evict(keep=body_path)
+
+    def _write_meta(self, meta_path, entry):
+        temp_path = meta_path + "." + str(threading.get_ident()) + ".tmp"
+        with open(temp_path, "w") as stream:
+            json.dump(entry, stream)
+        os.replace(temp_path, meta_path)
+
+    def _evict(self, keep):
+        # Delete least recently used responses until the cache is within its maximum size (but never the response
+        # that has just been stored)
+        for body_path in sorted(self._body_files(), key=os.path.getmtime):
+            if self._size <= self.max_size:
+                break
+            if body_path == keep:
+                continue
+            size = os.path.getsize(body_path)
+            try:
+                os.remove(body_path)
+            except OSError:
+                continue  # e.g. open for reading on Windows - evicted later
+            self._size -= size
+            meta_path = body_path[:-len(".body")] + ".json"
+            if os.path.isfile(meta_path):
+                os.remove(meta_path)
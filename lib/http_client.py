@@ -0,0 +1,164 @@
+import json
+import threading
+import contextlib
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+RETRY_STATUS_CODES = [429, 500, 502, 503, 504]  # rate limited or transient server errors
+DEFAULT_RETRIES = 5
+DEFAULT_BACKOFF_FACTOR = 1  # sleep 1s, 2s, 4s, ... between retries
+DEFAULT_MAX_CONNECTIONS_PER_HOST = 8
+DEFAULT_TIMEOUT = 60  # seconds
+CHUNK_SIZE = 64 * 1024  # bytes read at a time when streaming response bodies
+
+
+class HttpClient(object):
+    """
+    HTTP client shared by all calls to an API. It keeps a pool of keep-alive connections per host, retries requests
+    that failed with 429/5XX with exponential backoff (honouring 'Retry-After') and limits the number of concurrent
+    requests to each host.
+    """
+
+    def __init__(self, auth=None, headers=None, retries=DEFAULT_RETRIES, backoff_factor=DEFAULT_BACKOFF_FACTOR,
+                 max_connections_per_host=DEFAULT_MAX_CONNECTIONS_PER_HOST, timeout=DEFAULT_TIMEOUT, checkpoint=None,
+                 cache=None):
+        """
+        :param auth: authentication sent with every request, e.g. (username, password) for basic auth
+        :param headers: dictionary of headers sent with every request
+        :param retries: how many times to retry a request that failed with a connection error or 429/5XX status
+        :param backoff_factor: retries are done after backoff_factor * 2^(retry number - 1) seconds
+        :param max_connections_per_host: maximum number of concurrent requests (and pooled connections) per host
+        :param timeout: connect/read timeout in seconds
+        :param checkpoint: optional CheckpointStore - JSON responses found in it are not fetched again and fetched
+        ones are added to it
+        :param cache: optional HttpCache - responses are served from it while fresh and revalidated with conditional
+        requests once stale
+        """
+        self.timeout = timeout
+        self.checkpoint = checkpoint
+        self.cache = cache
+        self.max_connections_per_host = max_connections_per_host
+        self.session = requests.Session()
+        self.session.auth = auth
+        if headers is not None:
+            self.session.headers.update(headers)
+
+        retry = Retry(total=retries, backoff_factor=backoff_factor, status_forcelist=RETRY_STATUS_CODES,
+                      allowed_methods=frozenset(["GET", "HEAD"]), respect_retry_after_header=True,
+                      raise_on_status=False)  # return the last response so raise_for_status() reports it
+        adapter = HTTPAdapter(pool_maxsize=max_connections_per_host, pool_block=True, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._host_semaphores = {}
+        self._lock = threading.Lock()
+
+    def _host_semaphore(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._host_semaphores:
+                self._host_semaphores[host] = threading.BoundedSemaphore(self.max_connections_per_host)
+            return self._host_semaphores[host]
+
+    def get(self, url, params=None, **kwargs):
+        """
+        Send a GET request.
+        :param url: URL to get
+        :param params: dictionary of URL parameters
+        :return: response (requests.Response) of a successful request
+        :raises requests.exceptions.RequestException: if the request still failed after all retries
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        with self._host_semaphore(url):
+            response = self.session.get(url, params=params, **kwargs)
+        response.raise_for_status()  # check if the request was successful
+        return response
+
+    @contextlib.contextmanager
+    def open_stream(self, url, params=None):
+        """
+        Open the body of a response as a binary file object, so it can be parsed as it is read rather than first being
+        loaded into memory. When caching, the body is streamed into the cache (unless the cache holds a fresh or, after
+        a conditional request, still valid copy of it) and read from there.
+        :param url: URL to get
+        :param params: dictionary of URL parameters
+        :return: context manager giving a binary file object
+        """
+        if self.cache is None:
+            with self._open_response(url, params) as stream:
+                yield stream
+            return
+
+        request_url = self._request_url(url, params)
+        entry = self.cache.lookup(request_url)
+        if entry is None or not entry["fresh"]:
+            headers = {}
+            if entry is not None and entry["etag"] is not None:
+                headers["If-None-Match"] = entry["etag"]
+            if entry is not None and entry["last_modified"] is not None:
+                headers["If-Modified-Since"] = entry["last_modified"]
+            response = self.get(url, params=params, headers=headers, stream=True)
+            try:
+                if response.status_code == 304 and entry is not None:
+                    self.cache.revalidated(request_url)
+                else:
+                    self.cache.store_stream(request_url, response.iter_content(chunk_size=CHUNK_SIZE),
+                                            response.headers.get("ETag"), response.headers.get("Last-Modified"))
+            finally:
+                response.close()
+        stream = self.cache.open(request_url)
+        if stream is None:
+            # Evicted by another thread since it was looked up or stored - downloaded again without caching it
+            with self._open_response(url, params) as stream:
+                yield stream
+            return
+        with stream:
+            yield stream
+
+    @contextlib.contextmanager
+    def _open_response(self, url, params=None):
+        # Body of a response read straight from the connection
+        response = self.get(url, params=params, stream=True)
+        response.raw.decode_content = True  # undo any gzip/deflate transfer encoding
+        try:
+            yield response.raw
+        finally:
+            response.close()
+
+    def get_content(self, url, params=None):
+        """
+        Get the body of a response, from the cache if it holds a fresh or (after a conditional request) still valid
+        copy of it.
+        :param url: URL to get
+        :param params: dictionary of URL parameters
+        :return: response body as bytes
+        """
+        with self.open_stream(url, params=params) as stream:
+            return stream.read()
+
+    def get_json(self, url, params=None):
+        """
+        Get and parse a JSON response, unless the response is already in the checkpoint.
+        :param url: URL to get
+        :param params: dictionary of URL parameters
+        :return: JSON response as Python objects
+        """
+        if self.checkpoint is None:
+            return json.loads(self.get_content(url, params=params))
+
+        request_url = self._request_url(url, params)
+        data = self.checkpoint.get(request_url)
+        if data is None:
+            data = json.loads(self.get_content(url, params=params))
+            self.checkpoint.put(request_url, data)
+        return data
+
+    @staticmethod
+    def _request_url(url, params=None):
+        # Full URL including the URL parameters, used as the key for checkpointed and cached responses
+        return requests.Request("GET", url, params=params).prepare().url
+
+    def close(self):
+        self.session.close()
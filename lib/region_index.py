@@ -0,0 +1,185 @@
+import os
+import json
+import hashlib
+import numpy as np
+import shapely
+from shapely.geometry import shape
+
+
+class RegionIndex(object):
+    """
+    Point-in-region lookup over the features of a GeoJSON feature collection (e.g. UK regions). Region polygons are
+    built and prepared once and kept in an STRtree, so a whole array of points is assigned to regions in one
+    vectorised query instead of testing every point against every polygon. Optionally, a grid is laid over the
+    regions' bounding box: points in grid cells lying wholly inside one region (or outside all regions) are resolved
+    by indexing into the grid, and only points in cells crossed by a region boundary are queried in the STRtree.
+    """
+
+    def __init__(self, feature_collection, name_property="NAME", grid_cell_size=None):
+        """
+        :param feature_collection: GeoJSON feature collection (as Python objects) of region polygons
+        :param name_property: feature property holding the region's name
+        :param grid_cell_size: size of grid cells in degrees, or None not to use a grid
+        """
+        self.names = np.array([feature["properties"][name_property] for feature in feature_collection["features"]],
+                              dtype=object)
+        self.polygons = np.array([shape(feature["geometry"]) for feature in feature_collection["features"]],
+                                 dtype=object)
+        shapely.prepare(self.polygons)
+        self.tree = shapely.STRtree(self.polygons)
+        self.grid_cell_size = grid_cell_size
+        if grid_cell_size is not None:
+            self._build_grid()
+
+    def _build_grid(self):
+        self.grid_bounds = shapely.total_bounds(self.polygons)
+        min_x, min_y, max_x, max_y = self.grid_bounds
+        self.grid_shape = (max(1, int(np.ceil((max_x - min_x) / self.grid_cell_size))),
+                           max(1, int(np.ceil((max_y - min_y) / self.grid_cell_size))))
+        # Edges of cells are computed as in lookup(), so that points are checked against the same cells
+        x, y = np.meshgrid(min_x + np.arange(self.grid_shape[0], dtype=float) * self.grid_cell_size,
+                           min_y + np.arange(self.grid_shape[1], dtype=float) * self.grid_cell_size, indexing="ij")
+        cells = shapely.box(x.ravel(), y.ravel(), x.ravel() + self.grid_cell_size, y.ravel() + self.grid_cell_size)
+
+        # A cell touching no region is outside all of them; a cell touching regions is resolved if it lies in the
+        # interior of the first of those regions (which wins for all its points)
+        self.grid_regions = np.full(cells.shape, np.nan, dtype=object)
+        self.grid_resolved = np.ones(cells.shape, dtype=bool)
+        cell_indices, polygon_indices = self.tree.query(cells, predicate="intersects")
+        order = np.lexsort((polygon_indices, cell_indices))
+        cell_indices, polygon_indices = cell_indices[order], polygon_indices[order]
+        first = np.unique(cell_indices, return_index=True)[1]
+        cell_indices, polygon_indices = cell_indices[first], polygon_indices[first]
+        inside = shapely.contains_properly(self.polygons[polygon_indices], cells[cell_indices])
+        self.grid_resolved[cell_indices] = inside
+        self.grid_regions[cell_indices[inside]] = self.names[polygon_indices[inside]]
+
+    def lookup(self, latitudes, longitudes):
+        """
+        Find regions containing the points. If regions overlap, the first containing feature in the collection wins.
+        :param latitudes: array-like of latitudes
+        :param longitudes: array-like of longitudes
+        :return: numpy array of region names, NaN for points with missing coordinates or outside all regions
+        """
+        latitudes = np.asarray(latitudes, dtype=float)
+        longitudes = np.asarray(longitudes, dtype=float)
+        regions = np.full(latitudes.shape, np.nan, dtype=object)
+        valid = ~(np.isnan(latitudes) | np.isnan(longitudes))
+        if not valid.any():
+            return regions
+
+        if self.grid_cell_size is not None:
+            # Resolve whatever points the grid can and leave the rest to the STRtree
+            min_x, min_y, max_x, max_y = self.grid_bounds
+            cell_x = np.floor((longitudes - min_x) / self.grid_cell_size)
+            cell_y = np.floor((latitudes - min_y) / self.grid_cell_size)
+            in_grid = valid & (cell_x >= 0) & (cell_x < self.grid_shape[0]) & (cell_y >= 0) & \
+                (cell_y < self.grid_shape[1]) & (longitudes <= max_x) & (latitudes <= max_y)
+            valid &= in_grid  # points outside the grid's bounding box are outside all regions
+            cells = (cell_x[in_grid] * self.grid_shape[1] + cell_y[in_grid]).astype(int)
+            # Cells' edges are computed as when the grid was built - points on (or, after rounding, just outside) the
+            # edges of their cells may lie on region boundaries, so they are left to the STRtree
+            cell_min_x = min_x + cell_x[in_grid] * self.grid_cell_size
+            cell_min_y = min_y + cell_y[in_grid] * self.grid_cell_size
+            in_cell = (longitudes[in_grid] > cell_min_x) & (longitudes[in_grid] < cell_min_x + self.grid_cell_size) & \
+                (latitudes[in_grid] > cell_min_y) & (latitudes[in_grid] < cell_min_y + self.grid_cell_size)
+            resolved = np.zeros(latitudes.shape, dtype=bool)
+            resolved[in_grid] = self.grid_resolved[cells] & in_cell
+            regions[in_grid] = self.grid_regions[cells]
+            valid &= ~resolved
+            if not valid.any():
+                return regions
+
+        points = shapely.points(longitudes[valid], latitudes[valid])
+        point_indices, polygon_indices = self.tree.query(points, predicate="within")
+        # Query results are not ordered by polygon - keep the first feature for points in several regions
+        order = np.lexsort((polygon_indices, point_indices))
+        point_indices, polygon_indices = point_indices[order], polygon_indices[order]
+        first = np.unique(point_indices, return_index=True)[1]
+        found = np.full(points.shape, np.nan, dtype=object)
+        found[point_indices[first]] = self.names[polygon_indices[first]]
+        regions[valid] = found
+        return regions
+
+
+class RegionCache(object):
+    """
+    Persistent cache of regions of points, keyed by their coordinates rounded to a few decimal places, so points seen
+    by previous runs (e.g. venues hosting a workshop every year) are not looked up again. The cache is discarded if
+    the regions it was built from change.
+    """
+
+    def __init__(self, file_path, regions_file, precision=4):
+        """
+        :param file_path: JSON file to keep the cache in
+        :param regions_file: file with the regions the cached points were looked up in
+        :param precision: number of decimal places coordinates are rounded to (4 is about 10m)
+        """
+        self.file_path = file_path
+        self.precision = precision
+        with open(regions_file, "rb") as stream:
+            self.regions_hash = hashlib.sha256(stream.read()).hexdigest()
+        self.regions = {}
+        self.hits = 0
+        self.misses = 0
+        self._changed = False
+        if os.path.isfile(file_path):
+            try:
+                with open(file_path, "r", encoding="utf-8") as stream:
+                    cache = json.load(stream)
+                if cache.get("regions_hash") == self.regions_hash and cache.get("precision") == precision:
+                    self.regions = cache["regions"]
+            except (OSError, ValueError):
+                print("Ignoring unreadable region cache " + file_path)
+
+    def _key(self, latitude, longitude):
+        return ("%." + str(self.precision) + "f,%." + str(self.precision) + "f") % (latitude, longitude)
+
+    def lookup(self, latitudes, longitudes, index):
+        """
+        Find regions of points in the cache, looking up points not yet cached in the index (once per rounded
+        coordinates) and adding them to the cache.
+        :param latitudes: array-like of latitudes
+        :param longitudes: array-like of longitudes
+        :param index: RegionIndex to look up points not in the cache
+        :return: numpy array of region names, NaN for points with missing coordinates or outside all regions
+        """
+        latitudes = np.round(np.asarray(latitudes, dtype=float), self.precision)
+        longitudes = np.round(np.asarray(longitudes, dtype=float), self.precision)
+        regions = np.full(latitudes.shape, np.nan, dtype=object)
+        valid = ~(np.isnan(latitudes) | np.isnan(longitudes))
+        if not valid.any():
+            return regions
+
+        coordinates, inverse = np.unique(np.column_stack((latitudes[valid], longitudes[valid])), axis=0,
+                                         return_inverse=True)
+        keys = [self._key(latitude, longitude) for latitude, longitude in coordinates]
+        missing = [i for i, key in enumerate(keys) if key not in self.regions]
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            found = index.lookup(coordinates[missing, 0], coordinates[missing, 1])
+            for i, region in zip(missing, found):
+                self.regions[keys[i]] = region if isinstance(region, str) else None  # null in JSON
+            self._changed = True
+        unique_regions = np.array([np.nan if self.regions[key] is None else self.regions[key] for key in keys],
+                                  dtype=object)
+        regions[valid] = unique_regions[inverse.ravel()]
+        return regions
+
+    def save(self):
+        """
+        Save the cache, if anything was added to it.
+        """
+        if not self._changed:
+            return
+        directory = os.path.dirname(self.file_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        temp_path = self.file_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as stream:
+            json.dump({"regions_hash": self.regions_hash, "precision": self.precision, "regions": self.regions},
+                      stream)
+        os.replace(temp_path, self.file_path)
+        self._changed = False
+
@@ -0,0 +1,297 @@
+import os
+import math
+import html
+import pandas as pd
+import lib.helper as helper
+
+# Colours of series in charts of HTML reports
+CHART_COLOURS = ["#4472c4", "#ed7d31", "#a5a5a5", "#ffc000", "#5b9bd5", "#70ad47", "#264478", "#9e480e", "#636363",
+                 "#997300"]
+
+
+def flatten_table(table, index):
+    """
+    Turn an analysis table into a DataFrame with a column (named by a string) for each column of the table.
+    :param table: DataFrame or Series, e.g. a pivoted table with 2 levels of column names
+    :param index: whether the table's index is part of the table
+    :return: DataFrame with a default index, e.g. with columns 'year', 'number_of_workshops_DC', ...
+    """
+    df = table.to_frame() if isinstance(table, pd.Series) else table.copy()
+    if index:
+        df = df.reset_index()
+    df.columns = ["_".join(str(level) for level in column if str(level) != "") if isinstance(column, tuple)
+                  else str(column) for column in df.columns]
+    return df
+
+
+def chart_data(analysis, table):
+    """
+    Data plotted in an analysis' chart, as in the chart of its Excel sheet.
+    :param analysis: Analysis from lib/analysis_registry.py
+    :param table: table computed by the analysis
+    :return: tuple of the list of categories and the list of (name, values) of series
+    """
+    if analysis.chart.get("stacked", False):
+        # A series for each column of a pivoted table, named by its last level (e.g. the workshop type)
+        return list(table.index), [(column[-1] if isinstance(column, tuple) else column, table[column].tolist())
+                                   for column in table.columns]
+    df = flatten_table(table, analysis.index)
+    return df.iloc[:, 0].tolist(), [(df.columns[1], df.iloc[:, 1].tolist())]
+
+
+def chart_label(value):
+    """
+    :return: label of a value in a chart, e.g. '2019' for a year stored as a float
+    """
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return html.escape(str(value))
+
+
+def svg_column_chart(categories, series, title, x_axis, y_axis, stacked=False):
+    """
+    Draw a column chart as inline SVG, without any plotting library.
+    :param categories: labels of the columns
+    :param series: list of (name, values) of series - stacked on top of each other
+    :param title: title of the chart
+    :param x_axis: name of the x axis
+    :param y_axis: name of the y axis
+    :param stacked: whether to show a legend of the series
+    :return: SVG element as a string
+    """
+    width, height = 760, 380
+    left, top, bottom = 70, 40, 120
+    right = 160 if stacked else 20
+    plot_width, plot_height = width - left - right, height - top - bottom
+
+    values = [[0 if pd.isna(value) else value for value in series_values] for _, series_values in series]
+    totals = [sum(column) for column in zip(*values)] or [0]
+    # Round ticks of the y axis, e.g. every 20 workshops - counts are never split below 1
+    tick = 10 ** max(math.floor(math.log10(max(max(totals), 1) / 5.0)), 0)
+    tick = next(multiple * tick for multiple in [1, 2, 5, 10] if multiple * tick * 5 >= max(totals))
+    maximum = tick * 5
+    step = plot_width / max(len(categories), 1)
+
+    svg = ['<svg xmlns="http://www.w3.org/2000/svg" width="%d" height="%d" font-family="sans-serif" font-size="11">'
+           % (width, height),
+           '<text x="%d" y="20" text-anchor="middle" font-size="14">%s</text>' % (width / 2, html.escape(title)),
+           '<line x1="%d" y1="%d" x2="%d" y2="%d" stroke="#000"/>' % (left, top + plot_height, left + plot_width,
+                                                                    top + plot_height)]
+    for i in range(6):
+        y = top + plot_height - plot_height * i / 5
+        svg.append('<text x="%d" y="%.1f" text-anchor="end">%s</text>' % (left - 5, y + 4, chart_label(tick * i)))
+
+    for i, category in enumerate(categories):
+        x = left + i * step
+        offset = 0
+        for j, (name, _) in enumerate(series):
+            bar_height = plot_height * values[j][i] / maximum
+            offset += bar_height
+            svg.append('<rect x="%.1f" y="%.1f" width="%.1f" height="%.1f" fill="%s"><title>%s</title></rect>'
+                       % (x + step * 0.1, top + plot_height - offset, step * 0.8, bar_height,
+                          CHART_COLOURS[j % len(CHART_COLOURS)],
+                          chart_label(category) + (", " + chart_label(name) if stacked else "") + ": " +
+                          chart_label(values[j][i])))
+        svg.append('<text transform="translate(%.1f,%d) rotate(-45)" text-anchor="end">%s</text>'
+                   % (x + step / 2, top + plot_height + 12, chart_label(category)))
+
+    svg.append('<text x="%d" y="%d" text-anchor="middle">%s</text>' % (left + plot_width / 2, height - 5,
+                                                                      html.escape(x_axis)))
+    svg.append('<text transform="translate(15,%d) rotate(-90)" text-anchor="middle">%s</text>'
+               % (top + plot_height / 2, html.escape(y_axis)))
+    if stacked:
+        for j, (name, _) in enumerate(series):
+            y = top + j * 16
+            svg.append('<rect x="%d" y="%d" width="10" height="10" fill="%s"/>'
+                       % (width - right + 15, y, CHART_COLOURS[j % len(CHART_COLOURS)]))
+            svg.append('<text x="%d" y="%d">%s</text>' % (width - right + 30, y + 9, chart_label(name)))
+    svg.append('</svg>')
+    return "\n".join(svg)
+
+
+class Report(object):
+    """
+    Backend saving the data analysed and the results of analyses (see lib/analysis_registry.py) in some format.
+    """
+
+    # Extension of the report file, or '' if the report is a directory of files
+    EXTENSION = ''
+
+    def __init__(self, output, df, data_name, description):
+        """
+        :param output: report file or directory
+        :param df: DataFrame with the data analysed
+        :param data_name: name of the data, e.g. 'carpentry_workshops'
+        :param description: description of the data and when it was analysed
+        """
+        self.output = output
+        self.df = df
+        self.data_name = data_name
+        self.description = description
+
+    def write_analysis(self, analysis, table, notes):
+        """
+        Save the results of an analysis.
+        :param analysis: Analysis from lib/analysis_registry.py
+        :param table: table computed by the analysis
+        :param notes: list of (row, column, text) notes computed by the analysis
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Finish saving the report.
+        """
+
+
+class ExcelReport(Report):
+    """
+    Excel spreadsheet with the data in its first sheet(s), a README sheet and a sheet with the table and chart of each
+    analysis.
+    """
+
+    EXTENSION = '.xlsx'
+
+    def __init__(self, output, df, data_name, description):
+        super(ExcelReport, self).__init__(output, df, data_name, description)
+        self.writer = helper.create_excel_analyses_spreadsheet(output, df, data_name)
+        helper.create_readme_tab(self.writer, "Data in sheet '" + data_name + "' contains " + description)
+
+    def write_analysis(self, analysis, table, notes):
+        stacked = analysis.chart.get("stacked", False)
+        # Written in row order, notes included, so that spreadsheets can be written in constant memory mode
+        helper.write_table(self.writer, table, analysis.sheet_name, index=stacked or analysis.index, notes=notes)
+
+        sheet_name = analysis.sheet_name
+        workbook = self.writer.book
+        worksheet = self.writer.sheets[sheet_name]
+
+        if stacked:
+            # Pivoted tables have 2 rows of column headers and a row with the index name
+            chart = workbook.add_chart({'type': 'column', 'subtype': 'stacked'})
+            for i in range(1, len(table.columns) + 1):
+                chart.add_series({
+                    'name': [sheet_name, 1, i],
+                    'categories': [sheet_name, 3, 0, len(table.index) + 2, 0],
+                    'values': [sheet_name, 3, i, len(table.index) + 2, i],
+                    'gap': 2,
+                })
+        else:
+            chart = workbook.add_chart({'type': 'column'})
+            chart.add_series({
+                'categories': [sheet_name, 1, 0, len(table.index), 0],
+                'values': [sheet_name, 1, 1, len(table.index), 1],
+                'gap': 2,
+            })
+            chart.set_legend({'position': 'none'})
+
+        chart.set_x_axis({'name': analysis.chart["x_axis"]})
+        chart.set_y_axis({'name': analysis.chart["y_axis"], 'major_gridlines': {'visible': False}})
+        chart.set_title({'name': analysis.chart["title"]})
+        worksheet.insert_chart(analysis.chart["position"], chart)
+
+    def close(self):
+        self.writer.close()
+
+
+class CsvReport(Report):
+    """
+    Directory with a CSV file of the data, a CSV file of each analysis' table and a README.txt file with notes.
+    """
+
+    FILE_EXTENSION = '.csv'
+
+    def __init__(self, output, df, data_name, description):
+        super(CsvReport, self).__init__(output, df, data_name, description)
+        if not os.path.exists(output):
+            os.makedirs(output)
+        self.save_data()
+        self.readme = ["Data in " + data_name + self.FILE_EXTENSION + " contains " + description]
+
+    def save_data(self):
+        self.df.to_csv(os.path.join(self.output, self.data_name + self.FILE_EXTENSION), encoding="utf-8", index=False)
+
+    def save_table(self, table, file):
+        table.to_csv(file, encoding="utf-8", index=False)
+
+    def write_analysis(self, analysis, table, notes):
+        self.save_table(flatten_table(table, analysis.chart.get("stacked", False) or analysis.index),
+                        os.path.join(self.output, analysis.sheet_name + self.FILE_EXTENSION))
+        self.readme.extend(analysis.sheet_name + ": " + text for _, _, text in notes)
+
+    def close(self):
+        with open(os.path.join(self.output, "README.txt"), "w", encoding="utf-8") as stream:
+            stream.write("\n".join(self.readme) + "\n")
+
+
+class ParquetReport(CsvReport):
+    """
+    Directory with a Parquet file of the data (typed as processed data snapshots), a Parquet file of each analysis'
+    table and a README.txt file with notes. Needs pyarrow.
+    """
+
+    FILE_EXTENSION = '.parquet'
+
+    def save_data(self):
+        helper.save_snapshot(self.df, os.path.join(self.output, self.data_name + self.FILE_EXTENSION))
+
+    def save_table(self, table, file):
+        table.to_parquet(file, index=False)
+
+
+class HtmlReport(Report):
+    """
+    Single static HTML page with the table and an inline SVG chart of each analysis - the data itself is left out.
+    """
+
+    EXTENSION = '.html'
+
+    def __init__(self, output, df, data_name, description):
+        super(HtmlReport, self).__init__(output, df, data_name, description)
+        self.sections = []
+
+    def write_analysis(self, analysis, table, notes):
+        stacked = analysis.chart.get("stacked", False)
+        categories, series = chart_data(analysis, table)
+        table_df = table.to_frame() if isinstance(table, pd.Series) else table
+        self.sections.append("\n".join(
+            ['<h2 id="%s">%s</h2>' % (html.escape(analysis.sheet_name), html.escape(analysis.chart["title"])),
+             svg_column_chart(categories, series, analysis.chart["title"], analysis.chart["x_axis"],
+                              analysis.chart["y_axis"], stacked)] +
+            ['<p>%s</p>' % html.escape(text) for _, _, text in notes] +
+            [table_df.to_html(index=stacked or analysis.index, na_rep="")]))
+
+    def close(self):
+        title = html.escape("Analyses of " + self.data_name)
+        with open(self.output, "w", encoding="utf-8") as stream:
+            stream.write("\n".join([
+                '<!DOCTYPE html>',
+                '<html>',
+                '<head>',
+                '<meta charset="utf-8">',
+                '<title>%s</title>' % title,
+                '<style>body {font-family: sans-serif; margin: 2em;} table {border-collapse: collapse;} '
+                'th, td {border: 1px solid #ccc; padding: 2px 8px; text-align: right;}</style>',
+                '</head>',
+                '<body>',
+                '<h1>%s</h1>' % title,
+                '<p>%s</p>' % html.escape(self.description)] +
+                self.sections +
+                ['</body>', '</html>']) + "\n")
+
+
+# Report backends by the format given on the command line
+REPORT_BACKENDS = {
+    'xlsx': ExcelReport,
+    'csv': CsvReport,
+    'parquet': ParquetReport,
+    'html': HtmlReport,
+}
+
+
+def create_report(report_format, output, df, data_name, description):
+    """
+    :param report_format: one of helper.REPORT_FORMATS
+    :return: report backend for the format - see Report for the other arguments
+    """
+    return REPORT_BACKENDS[report_format](output, df, data_name, description)
@@ -0,0 +1,170 @@
+import os
+import io
+import json
+import hashlib
+import difflib
+import pandas as pd
+
+
+class SnapshotStore(object):
+    """
+    History of dated snapshots of a table (e.g. monthly extractions of workshops), kept as one base plus per-snapshot
+    row-level deltas rather than as full copies. Rows are identified by key columns (e.g. workshop 'slug') or, for
+    tables without one (e.g. instructors from Redash), by their content. A delta holds only rows added or changed
+    since the previous snapshot, plus edits to the order of rows (which also record removed rows), so the store grows
+    with changes only. Any snapshot is rebuilt on demand, exactly as it was saved.
+
+    Values are kept as the strings they were saved as in CSV files, so rebuilt snapshots are identical to the
+    original files.
+    """
+
+    MANIFEST_FILE = "manifest.json"
+    KEY_COLUMN = "_key"
+
+    def __init__(self, directory, key=None):
+        """
+        :param directory: directory to keep the store in
+        :param key: list of columns identifying a row, or None to identify rows by their content; ignored if the
+        store already exists
+        """
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, self.MANIFEST_FILE)
+        if os.path.isfile(self.manifest_path):
+            with open(self.manifest_path, "r", encoding="utf-8") as stream:
+                self.manifest = json.load(stream)
+        else:
+            self.manifest = {"key": key, "snapshots": []}
+        self.key = self.manifest["key"]
+        self._deltas = {}  # rows of deltas read so far, by snapshot date
+
+    @property
+    def dates(self):
+        """
+        :return: dates of snapshots in the store, oldest first
+        """
+        return [snapshot["date"] for snapshot in self.manifest["snapshots"]]
+
+    def _row_keys(self, df):
+        if self.key:
+            keys = df[self.key].agg("|".join, axis=1)
+        else:
+            keys = pd.Series([hashlib.sha1("\x1f".join(row).encode("utf-8")).hexdigest()[:16]
+                              for row in df.itertuples(index=False)], index=df.index, dtype=object)
+        # Tell apart rows with the same key (or content)
+        occurrence = keys.groupby(keys).cumcount()
+        return keys.where(occurrence == 0, keys + "#" + occurrence.astype(str)).tolist()
+
+    def _read_delta(self, snapshot):
+        if snapshot["delta"] is None:
+            return {}
+        if snapshot["date"] not in self._deltas:
+            delta = pd.read_csv(os.path.join(self.directory, snapshot["delta"]), dtype=str, keep_default_na=False,
+                                na_filter=False, encoding="utf-8")
+            self._deltas[snapshot["date"]] = dict(zip(delta[self.KEY_COLUMN],
+                                                      delta.drop(columns=self.KEY_COLUMN).values.tolist()))
+        return self._deltas[snapshot["date"]]
+
+    def _replay(self, date):
+        """
+        Apply deltas of snapshots up to date.
+        :return: tuple of columns, keys of rows in order and a dictionary of rows (lists of values) by key
+        """
+        columns, order, rows = [], [], {}
+        for snapshot in self.manifest["snapshots"]:
+            if snapshot["date"] > date:
+                break
+            new_order = []
+            position = 0
+            for start, end, keys in snapshot["order"]:
+                new_order.extend(order[position:start])
+                new_order.extend(keys)
+                position = end
+            new_order.extend(order[position:])
+            columns, order = snapshot["columns"], new_order
+            rows.update(self._read_delta(snapshot))
+        return columns, order, rows
+
+    def _save_manifest(self):
+        temp_path = self.manifest_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as stream:
+            json.dump(self.manifest, stream, indent=1)
+        os.replace(temp_path, self.manifest_path)
+
+    def add(self, date, df):
+        """
+        Add a snapshot to the store, replacing any snapshot with the same date.
+        :param date: date of the snapshot as a 'YYYY-MM-DD' string - must not be older than the latest snapshot
+        :param df: DataFrame of strings, e.g. as read by pd.read_csv(file, dtype=str, keep_default_na=False)
+        """
+        if self.dates and date < self.dates[-1]:
+            raise ValueError("Cannot add a snapshot from " + date + " before the latest one from " + self.dates[-1])
+        if self.dates and date == self.dates[-1]:
+            self._remove_latest()
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+
+        columns = [str(column) for column in df.columns]
+        previous_columns, previous_order, rows = self._replay(date)
+        keys = self._row_keys(df)
+        values = df.values.tolist()
+        changed = [i for i, key in enumerate(keys) if columns != previous_columns or rows.get(key) != values[i]]
+
+        snapshot = {"date": date, "columns": columns, "delta": None, "order": []}
+        if changed:
+            snapshot["delta"] = date + ".csv"
+            delta = pd.DataFrame([values[i] for i in changed], columns=columns)
+            delta.insert(0, self.KEY_COLUMN, [keys[i] for i in changed])
+            delta.to_csv(os.path.join(self.directory, snapshot["delta"]), encoding="utf-8", index=False)
+        matcher = difflib.SequenceMatcher(None, previous_order, keys, autojunk=False)
+        for tag, start, end, new_start, new_end in matcher.get_opcodes():
+            if tag != "equal":
+                snapshot["order"].append([start, end, keys[new_start:new_end]])
+        self.manifest["snapshots"].append(snapshot)
+        self._save_manifest()
+        print("Added snapshot from " + date + " to " + self.directory + " with " + str(len(changed)) +
+              " new or changed rows of " + str(len(keys)))
+
+    def add_file(self, date, file):
+        """
+        Add a snapshot saved in a CSV file to the store.
+        :param date: date of the snapshot as a 'YYYY-MM-DD' string
+        :param file: CSV file
+        """
+        self.add(date, pd.read_csv(file, dtype=str, keep_default_na=False, na_filter=False, encoding="utf-8"))
+
+    def _remove_latest(self):
+        snapshot = self.manifest["snapshots"].pop()
+        self._deltas.pop(snapshot["date"], None)
+        if snapshot["delta"] is not None:
+            os.remove(os.path.join(self.directory, snapshot["delta"]))
+
+    def get(self, date):
+        """
+        Rebuild the latest snapshot taken on or before date.
+        :param date: date as a 'YYYY-MM-DD' string
+        :return: DataFrame of strings, as saved in the snapshot's CSV file
+        """
+        if not self.dates or date < self.dates[0]:
+            raise ValueError("No snapshot in " + self.directory + " as of " + date)
+        columns, order, rows = self._replay(date)
+        return pd.DataFrame([rows[key] for key in order], columns=columns, dtype=object)
+
+    def save_as_of(self, date, file):
+        """
+        Rebuild the latest snapshot taken on or before date and save it as CSV, identical to the original file.
+        :param date: date as a 'YYYY-MM-DD' string
+        :param file: CSV file
+        """
+        self.get(date).to_csv(file, encoding="utf-8", index=False)
+
+    def as_of(self, date, **read_csv_arguments):
+        """
+        Time travel to the data as of date, e.g. workshops as of '2021-06-02'.
+        :param date: date as a 'YYYY-MM-DD' string
+        :param read_csv_arguments: arguments to pd.read_csv, e.g. dtype
+        :return: DataFrame read from the latest snapshot taken on or before date, as if read from its CSV file
+        """
+        stream = io.StringIO()
+        self.get(date).to_csv(stream, index=False)
+        stream.seek(0)
+        return pd.read_csv(stream, **read_csv_arguments)
@@ -52,7 +52,7 @@ def main():
     print("CSV spreadsheet with UK Carpentry instructors to be mapped: " + instructors_file + "\n")
 
     try:
-        instructors_df = pd.read_csv(instructors_file, encoding="utf-8", usecols=["institution", "country_code"])
+        instructors_df = helper.read_data_file(instructors_file, usecols=["institution", "country_code"])
         # Drop rows where we do not have affiliation as there is nothing to map there
         instructors_df.dropna(subset=["institution"], inplace=True)
         # Normalise affiliations
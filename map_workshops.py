@@ -28,9 +28,9 @@ def main():
     print("CSV spreadsheet with Carpentry workshops to be mapped: " + workshops_file + "\n")
 
     try:
-        workshops_df = pd.read_csv(workshops_file, encoding="utf-8", usecols=['organiser', 'venue',
-                                                                              'address', 'latitude',
-                                                                              'longitude', 'region'])
+        workshops_df = helper.read_data_file(workshops_file, usecols=['organiser', 'venue',
+                                                                      'address', 'latitude',
+                                                                      'longitude', 'region'])
         # Rename 'venue' column to 'institution' as some of our methods expect that column name
         workshops_df.rename(columns={"organiser": "institution"}, inplace=True)
 
@@ -14,7 +14,6 @@ import traceback
 import json
 import folium
 import datetime
-from ast import literal_eval
 
 sys.path.append('/lib')
 import lib.helper as helper
@@ -49,25 +48,13 @@ workshops_file = args.processed_workshops_file
 # In[5]:
 
 
-instructors_df = pd.read_csv(instructors_file, encoding = "utf-8")
+# Lists (such as 'taught_workshop_dates' and 'taught_workshops'), dictionaries (such as 'taught_workshops_per_year')
+# and dates come typed - from the snapshot of processed data if there is one, or else parsed from CSV
+instructors_df = helper.load_processed_data(instructors_file)
 # instructors_df = instructors_df.drop(labels=['first_name', 'last_name'], axis=1)
-# load 'taught_workshops_per_year' column as dictionary
-instructors_df.loc[~instructors_df['taught_workshops_per_year'].isnull(),['taught_workshops_per_year']] = instructors_df.loc[~instructors_df['taught_workshops_per_year'].isnull(),'taught_workshops_per_year'].apply(lambda x: literal_eval(x))
-instructors_df.loc[instructors_df['taught_workshops_per_year'].isnull(),['taught_workshops_per_year']] = instructors_df.loc[instructors_df['taught_workshops_per_year'].isnull(),'taught_workshops_per_year'].apply(lambda x: {})
 
-# Let's change type of some columns and do some conversions
-
-# Convert list of strings into list of dates for 'taught_workshop_dates' and 'earliest_badge_awarded' columns (turn NaN into [])
-instructors_df['taught_workshop_dates'] = instructors_df['taught_workshop_dates'].str.split(',')
-instructors_df.loc[instructors_df['taught_workshop_dates'].isnull(), ['taught_workshop_dates']] = instructors_df.loc[instructors_df['taught_workshop_dates'].isnull(), 'taught_workshop_dates'].apply(lambda x: [])
-instructors_df['taught_workshop_dates'] = instructors_df['taught_workshop_dates'].apply(lambda list_str: [datetime.datetime.strptime(date_str, '%Y-%m-%d').date() for date_str in list_str])
-
-# Convert list of strings into list of dates for ' ' column (turn NaN into [])
-instructors_df['taught_workshops'] = instructors_df['taught_workshops'].str.split(',')
-instructors_df.loc[instructors_df['taught_workshops'].isnull(), ['taught_workshops']] = instructors_df.loc[instructors_df['taught_workshops'].isnull(), 'taught_workshop_dates'].apply(lambda x: [])
-
-# Convert 'earliest_badge_awarded' column from strings to datetime
-instructors_df['earliest_badge_awarded'] = pd.to_datetime(instructors_df['earliest_badge_awarded'], format="%Y-%m-%d").apply(lambda x: x.date())
+# Convert 'earliest_badge_awarded' column from datetime to dates
+instructors_df['earliest_badge_awarded'] = instructors_df['earliest_badge_awarded'].apply(lambda x: x.date())
 print(type(instructors_df['earliest_badge_awarded'][0]))
 
 
@@ -314,7 +301,7 @@ instructors_per_year.plot(kind='bar', legend=True, title ="Instructors per year"
 
 
 # Let's look how many workshops are these instructors teaching per year?
-workshops_df = pd.read_csv(workshops_file, encoding = "utf-8")
+workshops_df = helper.load_processed_data(workshops_file)
 
 workshops_per_year = workshops_df['year'].value_counts()
 workshops_per_year.sort_index(ascending = True, inplace=True)
@@ -0,0 +1,55 @@
+import os
+import re
+import sys
+import glob
+import traceback
+
+sys.path.append('/lib')
+import lib.helper as helper
+
+CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
+DATA_DIR = CURRENT_DIR + '/data'
+RAW_DATA_DIR = DATA_DIR + '/raw'
+PROCESSED_DATA_DIR = DATA_DIR + '/processed'
+
+
+def main():
+    """
+    Main function - add dated raw and processed data files to their histories or rebuild a file as of a date.
+    """
+    args = helper.parse_command_line_parameters_history()
+
+    try:
+        if args.import_files is not None:
+            files = args.import_files or glob.glob(RAW_DATA_DIR + '/*.csv') + glob.glob(PROCESSED_DATA_DIR + '/*.csv')
+            # Files must be added to a history oldest first
+            for file in sorted(files, key=lambda file: helper.parse_dated_file_name(file)[1] or ""):
+                helper.add_to_history(file)
+
+        if args.name and args.as_of:
+            history = helper.get_history(args.name)
+            dates = [date for date in history.dates if date <= args.as_of]
+            if not dates:
+                print("No " + args.name + " data in history as of " + args.as_of)
+                return
+            output_file = args.output_file or get_original_file_name(args.name, dates[-1])
+            history.save_as_of(args.as_of, output_file)
+            print("Saved " + args.name + " data as of " + args.as_of + " (extracted on " + dates[-1] + ") to " +
+                  output_file)
+    except Exception:
+        print("An error occurred while updating or rebuilding data from history ...")
+        print(traceback.format_exc())
+
+
+def get_original_file_name(name, date):
+    """
+    :param name: name of the history, e.g. 'raw_carpentry_workshops_UK_redash'
+    :param date: date of the file
+    :return: name of the file as saved by the extraction, e.g. 'raw_carpentry_workshops_UK_2021-06-02_redash.csv'
+    """
+    match = re.match(r'^(.*?)(_redash|_amy)?$', name)
+    return match.group(1) + '_' + date + (match.group(2) or '') + '.csv'
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,268 @@
+import json
+import time
+import random
+import datetime
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, urlencode
+
+# Volumes of (UK) data in AMY and Redash at the time of writing - scale them up to benchmark extractions of more data
+BASE_NUMBER_OF_WORKSHOPS = 500
+BASE_NUMBER_OF_INSTRUCTORS = 370
+NUMBER_OF_AIRPORTS = 40
+DEFAULT_PAGE_SIZE = 50
+
+BADGES = ["swc-instructor", "dc-instructor", "lc-instructor", "trainer"]
+TAGS = ["SWC", "DC", "LC", "TTT"]
+DOMAINS = ["Physics", "Chemistry", "Life Sciences", "Humanities", "Computer science/electrical engineering"]
+
+REDASH_WORKSHOPS_QUERY_PATH = "/api/queries/345/results.csv"
+REDASH_INSTRUCTORS_QUERY_PATH = "/api/queries/243/results.csv"
+
+
+class MockServer(object):
+    """
+    Local stand-in for AMY's API and Carpentries Redash serving synthetic data, so extractions can be benchmarked
+    and regression tested offline. Serves paged '/api/v1/events/', '/api/v1/persons/', '/api/v1/airports/' and
+    '/api/v1/tasks/', persons' awards and tasks, workshops' tasks and Redash CSV query results. Every request can be
+    delayed and a share of requests can be failed with 503 to test retries.
+    """
+
+    def __init__(self, scale=1, page_size=DEFAULT_PAGE_SIZE, latency=0, error_rate=0, seed=0, list_tasks=True):
+        """
+        :param scale: multiple of today's data volume to serve
+        :param page_size: default number of results per page of paged responses
+        :param latency: seconds every response is delayed by
+        :param error_rate: share (0-1) of requests answered with 503 Service Unavailable
+        :param seed: seed of the random generator used for synthetic data and error injection
+        :param list_tasks: whether to serve paged '/api/v1/tasks/' of all workshops (or 404, as an API without it)
+        """
+        self.page_size = page_size
+        self.latency = latency
+        self.error_rate = error_rate
+        self.list_tasks = list_tasks
+        self.requests_served = 0
+        self.errors_injected = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = None
+        self.url = None
+        self.airports = self._generate_airports()
+        self.events = self._generate_events(int(BASE_NUMBER_OF_WORKSHOPS * scale))
+        self.persons = self._generate_persons(int(BASE_NUMBER_OF_INSTRUCTORS * scale))
+
+    @property
+    def api_root(self):
+        return self.url + "/api/v1"
+
+    def start(self):
+        """
+        Start serving on a free local port in a background thread.
+        :return: the server's base URL
+        """
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        self.url = "http://127.0.0.1:" + str(self._httpd.server_address[1])
+        # URIs in the synthetic data point back at this server
+        for event in self.events:
+            event["tasks"] = self.api_root + "/events/" + event["slug"] + "/tasks/"
+        for person in self.persons:
+            person_uri = self.api_root + "/persons/" + str(person["id"]) + "/"
+            person["awards"] = person_uri + "awards/"
+            person["tasks"] = person_uri + "tasks/"
+            person["airport"] = self.api_root + "/airports/" + person["airport_code"] + "/"
+        return self.url
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    ############################ Synthetic data ########################
+
+    def _generate_airports(self):
+        return [{"iata": "A" + str(i).zfill(2), "fullname": "Airport " + str(i), "country": "GB",
+                 "latitude": round(self._random.uniform(50.0, 58.0), 4),
+                 "longitude": round(self._random.uniform(-5.0, 1.5), 4)} for i in range(NUMBER_OF_AIRPORTS)]
+
+    def _generate_events(self, number_of_events):
+        events = []
+        for i in range(number_of_events):
+            start = datetime.date(2012, 1, 1) + datetime.timedelta(days=self._random.randrange(365 * 9))
+            events.append({"slug": start.strftime("%Y-%m-%d") + "-site" + str(i),
+                           "start": start.strftime("%Y-%m-%d"),
+                           "end": (start + datetime.timedelta(days=1)).strftime("%Y-%m-%d"),
+                           "attendance": self._random.randrange(60),
+                           "country": "GB",
+                           "host": "https://amy.carpentries.org/api/v1/organizations/site" + str(i % 100) + ".ac.uk/",
+                           "venue": "Venue " + str(i),
+                           "address": "Street " + str(i),
+                           "latitude": round(self._random.uniform(50.0, 58.0), 4),
+                           "longitude": round(self._random.uniform(-5.0, 1.5), 4),
+                           "tags": [self._random.choice(TAGS)],
+                           "website_url": "https://example.org/" + str(i),
+                           "instructor_ids": []})
+        return events
+
+    def _generate_persons(self, number_of_persons):
+        persons = []
+        for i in range(number_of_persons):
+            badges = sorted(self._random.sample(BADGES, self._random.randint(1, 2)))
+            awarded = [(datetime.date(2012, 1, 1) + datetime.timedelta(days=self._random.randrange(365 * 9))
+                        ).strftime("%Y-%m-%d") for badge in badges]
+            taught = self._random.sample(range(len(self.events)), min(len(self.events), self._random.randrange(6)))
+            for event_index in taught:
+                self.events[event_index]["instructor_ids"].append(i)
+            persons.append({"id": i, "personal": "Personal" + str(i), "middle": None, "family": "Family" + str(i),
+                            "affiliation": "University " + str(i % 100), "country": "GB",
+                            "badges": badges, "domains": [self._random.choice(DOMAINS)],
+                            "lessons": ["swc-git"], "airport_code": self._random.choice(self.airports)["iata"],
+                            "awarded": dict(zip(badges, awarded)), "updated": "2021-01-01 00:00:00",
+                            "taught_slugs": [self.events[event_index]["slug"] for event_index in taught]})
+        return persons
+
+    ############################ Responses ########################
+
+    def handle(self, request):
+        with self._lock:
+            self.requests_served += 1
+            fail = self._random.random() < self.error_rate
+            if fail:
+                self.errors_injected += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            self._send(request, 503, b"", "text/plain")
+            return
+
+        url = urlsplit(request.path)
+        query = {name: values[0] for name, values in parse_qs(url.query).items()}
+        path = [part for part in url.path.split("/") if part]
+
+        if url.path == REDASH_WORKSHOPS_QUERY_PATH:
+            self._send(request, 200, self.redash_workshops_csv().encode("utf-8"), "text/csv")
+        elif url.path == REDASH_INSTRUCTORS_QUERY_PATH:
+            self._send(request, 200, self.redash_instructors_csv().encode("utf-8"), "text/csv")
+        elif path[:2] != ["api", "v1"] or len(path) < 3:
+            self._send(request, 404, b"", "text/plain")
+        elif len(path) == 3:
+            self._send_page(request, url.path, path[2], query)
+        else:
+            self._send_detail(request, path[2:])
+
+    def _send_page(self, request, path, resource, query):
+        if resource == "events":
+            results = [self.event_json(event) for event in self.events]
+        elif resource == "persons":
+            # Persons last updated after a time, as AMY filters them for incremental extractions
+            results = [self.person_json(person) for person in self.persons
+                       if person["updated"] > query.get("updated_after", "")]
+        elif resource == "airports":
+            results = self.airports
+        elif resource == "tasks" and self.list_tasks:
+            results = [{"event": self.api_root + "/events/" + event["slug"] + "/",
+                        "person": self.api_root + "/persons/" + str(person_id) + "/", "role": "instructor"}
+                       for event in self.events for person_id in event["instructor_ids"]]
+        else:
+            self._send(request, 404, b"", "text/plain")
+            return
+        page = int(query.get("page", 1))
+        page_size = int(query.get("page_size", self.page_size))
+        next_page = None
+        if page * page_size < len(results):
+            next_page = self.url + path + "?" + urlencode(dict(query, page=page + 1))
+        body = {"count": len(results), "next": next_page, "previous": None,
+                "results": results[(page - 1) * page_size:page * page_size]}
+        self._send(request, 200, json.dumps(body).encode("utf-8"), "application/json")
+
+    def _send_detail(self, request, path):
+        resource, key = path[0], path[1]
+        body = None
+        if resource == "persons" and key.isdigit() and int(key) < len(self.persons):
+            person = self.persons[int(key)]
+            if len(path) == 2:
+                body = self.person_json(person)
+            elif path[2] == "awards":
+                body = [{"badge": badge, "awarded": awarded} for badge, awarded in person["awarded"].items()]
+            elif path[2] == "tasks":
+                body = [{"event": self.api_root + "/events/" + slug + "/", "role": "instructor"}
+                        for slug in person["taught_slugs"]]
+        elif resource == "events" and len(path) == 3 and path[2] == "tasks":
+            event = next((event for event in self.events if event["slug"] == key), None)
+            if event is not None:
+                body = [{"person": self.api_root + "/persons/" + str(person_id) + "/", "role": "instructor"}
+                        for person_id in event["instructor_ids"]]
+        elif resource == "airports":
+            body = next((airport for airport in self.airports if airport["iata"] == key), None)
+        if body is None:
+            self._send(request, 404, b"", "text/plain")
+        else:
+            self._send(request, 200, json.dumps(body).encode("utf-8"), "application/json")
+
+    @staticmethod
+    def _send(request, status, body, content_type):
+        request.send_response(status)
+        request.send_header("Content-Type", content_type)
+        request.send_header("Content-Length", str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+    @staticmethod
+    def event_json(event):
+        return {key: value for key, value in event.items() if key != "instructor_ids"}
+
+    @staticmethod
+    def person_json(person):
+        return {key: person[key] for key in ["personal", "middle", "family", "affiliation", "country", "awards",
+                                             "badges", "domains", "tasks", "lessons", "airport"]}
+
+    def redash_workshops_csv(self):
+        lines = ["slug,start,end,attendance,country_code,organiser,organiser_web_domain,organiser_country_code,venue,"
+                 "address,longitude,latitude,tags,website_url,workshop_domains"]
+        for event in self.events:
+            domain = event["host"].split("/")[-2]
+            lines.append(",".join([event["slug"], event["start"], event["end"], str(event["attendance"]), "GB",
+                                   "University of " + domain, domain, "GB", event["venue"], event["address"],
+                                   str(event["longitude"]), str(event["latitude"]), ",".join(event["tags"]).join('""'),
+                                   event["website_url"], DOMAINS[0]]))
+        return "\n".join(lines) + "\n"
+
+    def redash_instructors_csv(self):
+        airports = {airport["iata"]: airport for airport in self.airports}
+        lines = ["institution,country_code,taught_workshops,taught_workshop_dates,domains,badges,badges_dates,airport,"
+                 "airport_code,airport_latitude,airport_longitude"]
+        for person in self.persons:
+            airport = airports[person["airport_code"]]
+            lines.append(",".join([person["affiliation"], "GB", ",".join(person["taught_slugs"]).join('""'),
+                                   ",".join(slug[0:10] for slug in person["taught_slugs"]).join('""'),
+                                   ",".join(person["domains"]).join('""'), ",".join(person["badges"]).join('""'),
+                                   ",".join(person["awarded"].values()).join('""'), airport["fullname"],
+                                   airport["iata"], str(airport["latitude"]), str(airport["longitude"])]))
+        return "\n".join(lines) + "\n"
+
+
+if __name__ == "__main__":
+    # Serve 10 times today's data volume until interrupted, e.g. to point a manual extraction at it
+    with MockServer(scale=10) as mock_server:
+        print("Serving AMY at " + mock_server.api_root + " and Redash at " + mock_server.url)
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
@@ -1,9 +1,13 @@
 import pytest
 import os
+import importlib
+import pandas as pd
 
 parentdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 os.sys.path.insert(0, parentdir)
 import analyse_workshops as aw
+from lib.analysis_registry import AnalysisRegistry, content_hash
+from lib.report_backends import ExcelReport, CsvReport, HtmlReport
 
 
 class TestAnalyseWorkshops(object):
@@ -99,5 +103,142 @@ class TestAnalyseWorkshops(object):
     #     print("*** test run reporting finishing")
     #
 
+
+# Processed workshops - one without a host and one without attendance data
+WORKSHOPS = pd.DataFrame({"slug": ["a", "b", "c", "d", "e"],
+                          "year": [2019.0, 2019.0, 2020.0, 2020.0, 2020.0],
+                          "attendance": [20, 15, None, 30, 12],
+                          "workshop_type": ["SWC", "DC", "SWC", "SWC", "LC"],
+                          "organiser_top_level_web_domain": ["ucl.ac.uk", "ucl.ac.uk", None, "ed.ac.uk", "ed.ac.uk"],
+                          "region": ["London", "London", None, "Scotland", "Scotland"],
+                          "tags": [["SWC"], ["DC"], ["SWC", "online"], ["SWC"], ["LC", "online"]]})
+
+
+class TestWorkshopsCube(object):
+
+    ## Assert analyses served from the cube give the same numbers as grouping the workshops
+    def test_roll_up(self):
+        cube = aw.build_workshops_cube(WORKSHOPS)
+        assert cube["number_of_workshops"].sum() == 5
+        assert aw.roll_up(cube, "year").equals(WORKSHOPS.groupby("year").size())
+        assert aw.roll_up(cube, ["organiser_top_level_web_domain", "year"]).equals(
+            WORKSHOPS.groupby(["organiser_top_level_web_domain", "year"]).size())
+        assert aw.roll_up(cube, ["year", "workshop_type"], "number_with_attendance").equals(
+            WORKSHOPS.groupby(["year", "workshop_type"])["attendance"].count())
+
+    ## Assert the registered analyses are computed from the cube and saved to their sheets in order
+    def test_analyses(self, tmp_path):
+        report = ExcelReport(str(tmp_path / "analyses.xlsx"), WORKSHOPS, "carpentry_workshops", "Test workshops.")
+        cube = aw.build_workshops_cube(WORKSHOPS)
+        tables = aw.ANALYSES.run({"df": WORKSHOPS, "cube": cube}, report, workers=4)
+        assert list(report.writer.sheets) == ["carpentry_workshops", "README"] + \
+            [analysis.sheet_name for analysis in aw.ANALYSES.analyses]
+        assert list(tables["online_vs_inperson"]) == [2, 3]
+        assert list(tables["workshops_per_host"]["workshops_per_host"]) == [2, 2]
+        assert list(tables["attendance_per_year"]["number_of_attendees"]) == [40, 60]
+        report.close()
+
+
+class TestAnalysisRegistry(object):
+
+    ## Assert new analyses are added by registering them, with their notes written next to the table
+    def test_register(self, tmp_path):
+        registry = AnalysisRegistry()
+
+        @registry.register("workshops_per_region", ["df"],
+                           {"title": "Workshops per region", "x_axis": "Region", "y_axis": "Workshops",
+                            "position": "D2"},
+                           notes=lambda table, df: [(0, 3, "Workshops: " + str(len(df.index)))])
+        def workshops_per_region(df):
+            return df.groupby("region").size().rename("number_of_workshops").reset_index()
+
+        report = ExcelReport(str(tmp_path / "analyses.xlsx"), WORKSHOPS, "carpentry_workshops", "Test workshops.")
+        tables = registry.run({"df": WORKSHOPS}, report)
+        assert list(report.writer.sheets) == ["carpentry_workshops", "README", "workshops_per_region"]
+        report.close()
+        assert list(tables) == ["workshops_per_region"]
+        assert list(tables["workshops_per_region"]["number_of_workshops"]) == [2, 2]
+        table, notes = registry["workshops_per_region"].run({"df": WORKSHOPS, "cube": None})
+        assert registry["workshops_per_region"].compute is workshops_per_region
+        assert notes == [(0, 3, "Workshops: 5")]
+
+    ## Assert only analyses whose inputs changed are recomputed when results are cached
+    def test_cache(self, tmp_path):
+        registry = AnalysisRegistry()
+        computed = []
+        chart = {"title": "Workshops", "x_axis": "Year", "y_axis": "Workshops", "position": "D2"}
+
+        @registry.register("workshops_per_year", ["cube"], chart)
+        def workshops_per_year(cube):
+            computed.append("workshops_per_year")
+            return aw.roll_up(cube, "year").rename("number_of_workshops").reset_index()
+
+        @registry.register("attendance_per_year", ["df"], chart)
+        def attendance_per_year(df):
+            computed.append("attendance_per_year")
+            return df.groupby("year")["attendance"].sum().reset_index()
+
+        changed = WORKSHOPS.assign(attendance=[20, 15, None, 30, 14])
+        for df in [WORKSHOPS, WORKSHOPS, changed]:
+            report = CsvReport(str(tmp_path / "analyses"), df, "carpentry_workshops", "Test workshops.")
+            tables = registry.run({"df": df, "cube": aw.build_workshops_cube(df)}, report,
+                                  cache_dir=str(tmp_path / "cache"))
+            report.close()
+        assert sorted(computed) == ["attendance_per_year", "attendance_per_year", "workshops_per_year"]
+        assert list(tables["attendance_per_year"]["attendance"]) == [35, 44]
+        assert len(os.listdir(str(tmp_path / "cache"))) == 2
+
+    ## Assert tables are recomputed when a constant of the module defining an analysis changes
+    def test_cache_module_changed(self, tmp_path):
+        module_file = tmp_path / "estimated_attendance.py"
+        source = "\n".join(["from lib.analysis_registry import AnalysisRegistry, content_hash",
+                             "ANALYSES = AnalysisRegistry()",
+                             "ATTENDEES_PER_WORKSHOP = 20",
+                             "@ANALYSES.register('estimated_attendance', ['df'], {})",
+                             "def estimated_attendance(df):",
+                             "    return (df.groupby('year').size() * ATTENDEES_PER_WORKSHOP).reset_index()", ""])
+        module_file.write_text(source)
+        os.sys.path.insert(0, str(tmp_path))
+        try:
+            import estimated_attendance
+            tables = []
+            for attendees in ["20", "20", "150"]:
+                module_file.write_text(source.replace("= 20", "= " + attendees))
+                estimated_attendance = importlib.reload(estimated_attendance)
+                served = estimated_attendance.ANALYSES["estimated_attendance"].run_cached(
+                    {"df": WORKSHOPS}, str(tmp_path), {"df": content_hash(WORKSHOPS)})
+                tables.append((list(served[0][0]), served[2]))
+        finally:
+            os.sys.path.remove(str(tmp_path))
+            os.sys.modules.pop("estimated_attendance", None)
+        assert tables == [([40, 60], False), ([40, 60], True), ([300, 450], False)]
+
+
+class TestReportBackends(object):
+
+    ## Assert tables are saved to a CSV file each, with notes in README.txt
+    def test_csv_report(self, tmp_path):
+        report = CsvReport(str(tmp_path / "analyses"), WORKSHOPS, "carpentry_workshops", "Test workshops.")
+        aw.ANALYSES.run({"df": WORKSHOPS, "cube": aw.build_workshops_cube(WORKSHOPS)}, report)
+        report.close()
+        workshops_per_type_per_year = pd.read_csv(str(tmp_path / "analyses" / "workshops_per_type_per_year.csv"))
+        assert list(workshops_per_type_per_year.columns) == \
+            ["year", "number_of_workshops_DC", "number_of_workshops_LC", "number_of_workshops_SWC"]
+        online_vs_inperson = pd.read_csv(str(tmp_path / "analyses" / "online_vs_inperson.csv"))
+        assert online_vs_inperson.values.tolist() == [["Online", 2], ["In-person", 3]]
+        with open(str(tmp_path / "analyses" / "README.txt"), encoding="utf-8") as stream:
+            assert "workshops_per_year: Total workshops: 5" in stream.read()
+
+    ## Assert the HTML page has a section with an inline chart and the table of each analysis
+    def test_html_report(self, tmp_path):
+        report = HtmlReport(str(tmp_path / "analyses.html"), WORKSHOPS, "carpentry_workshops", "Test workshops.")
+        aw.ANALYSES.run({"df": WORKSHOPS, "cube": aw.build_workshops_cube(WORKSHOPS)}, report)
+        report.close()
+        with open(str(tmp_path / "analyses.html"), encoding="utf-8") as stream:
+            page = stream.read()
+        assert page.count("<svg") == page.count("<table") == len(aw.ANALYSES.analyses)
+        assert '<h2 id="workshops_per_region">' in page
+
+
 if __name__ == "__main__":
     pytest.main("-s")
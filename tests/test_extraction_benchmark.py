@@ -0,0 +1,102 @@
+import pytest
+import os
+import time
+
+parentdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.sys.path.insert(0, parentdir)
+import extract_and_process_amy as amy
+import extract_and_process_redash as redash
+from lib.http_client import HttpClient
+from mock_server import MockServer
+
+# Multiple of today's data volume to extract, e.g. BENCHMARK_SCALE=100 python -m pytest -s tests/test_extraction_benchmark.py
+SCALE = float(os.environ.get("BENCHMARK_SCALE", 1))
+WORKERS = 8
+USERNAME = "user"
+PASSWORD = "password"
+
+
+@pytest.fixture
+def mock_server(request, monkeypatch, tmp_path):
+    options = getattr(request, "param", {})
+    server = MockServer(scale=SCALE, **options)
+    server.start()
+    # Point the extractions at the mock server and keep whatever they write out of the data directory
+    monkeypatch.setattr(amy, "AMY_EVENTS_API_URL", server.api_root + "/events/")
+    monkeypatch.setattr(amy, "AMY_PERSONS_API_URL", server.api_root + "/persons/")
+    monkeypatch.setattr(amy, "AMY_AIRPORTS_API_URL", server.api_root + "/airports/")
+    monkeypatch.setattr(amy, "AMY_TASKS_API_URL", server.api_root + "/tasks/")
+    monkeypatch.setattr(amy, "EXTRACT_DIR", str(tmp_path))
+    monkeypatch.setattr(amy, "AIRPORTS_FILE", str(tmp_path / "airports.csv"))
+    monkeypatch.setattr(amy, "AMY_CLIENTS", {(USERNAME, PASSWORD): HttpClient(auth=(USERNAME, PASSWORD),
+                                                                                 backoff_factor=0)})
+    monkeypatch.setattr(redash, "REDASH_CLIENT", HttpClient(backoff_factor=0))
+    yield server
+    server.stop()
+
+
+def report(description, count, server, started):
+    elapsed = time.time() - started
+    print("\n" + description + ": " + str(count) + " records, " + str(server.requests_served) + " requests (" +
+          str(server.errors_injected) + " failed) in " + "%.2f" % elapsed + "s")
+
+
+class TestExtractionBenchmark(object):
+
+    ## Assert all workshops and their instructors are extracted from AMY, with instructor tasks of all workshops
+    ## listed in one paged pass or, if the API does not list them, one request per workshop
+    @pytest.mark.parametrize("mock_server", [{"list_tasks": True}, {"list_tasks": False}], indirect=True)
+    def test_amy_workshops(self, mock_server):
+        started = time.time()
+        workshops_df = amy.get_workshops_amy({"country": "GB"}, USERNAME, PASSWORD, WORKERS, with_instructors=True)
+        report("AMY workshops", workshops_df.index.size, mock_server, started)
+        assert workshops_df.index.size == len(mock_server.events)
+        assert list(workshops_df["slug"]) == [event["slug"] for event in mock_server.events]
+        expected = [["Personal" + str(i) + " Family" + str(i) for i in event["instructor_ids"]]
+                    for event in mock_server.events]
+        assert list(workshops_df["instructors"]) == expected
+        assert (mock_server.requests_served < len(mock_server.events)) == mock_server.list_tasks
+
+    ## Assert incremental extractions get badges and taught workshops of unchanged instructors again
+    def test_amy_instructors_incremental(self, mock_server):
+        previous_df = amy.get_instructors_amy({"country": "GB"}, USERNAME, PASSWORD, WORKERS)
+        # A new task and badge do not change when the instructor was last updated
+        mock_server.persons[0]["taught_slugs"].append(mock_server.events[-1]["slug"])
+        mock_server.persons[1]["awarded"]["trainer"] = "2021-06-01"
+        instructors_df = amy.update_instructors_amy(previous_df, {"country": "GB",
+                                                                  "updated_after": "2021-02-01 00:00:00"},
+                                                    USERNAME, PASSWORD, WORKERS)
+        full_df = amy.get_instructors_amy({"country": "GB"}, USERNAME, PASSWORD, WORKERS)
+        assert list(instructors_df.columns) == list(full_df.columns)
+        assert instructors_df.astype(str).values.tolist() == full_df.astype(str).values.tolist()
+        assert instructors_df["taught_workshops"][0].endswith(mock_server.events[-1]["slug"])
+        assert instructors_df["trainer"][1] == "2021-06-01"
+
+    ## Assert all instructors, their badges and taught workshops are extracted from AMY despite transient errors
+    @pytest.mark.parametrize("mock_server", [{"error_rate": 0.05}], indirect=True)
+    def test_amy_instructors(self, mock_server):
+        started = time.time()
+        instructors_df = amy.get_instructors_amy({"country": "GB"}, USERNAME, PASSWORD, WORKERS)
+        report("AMY instructors", instructors_df.index.size, mock_server, started)
+        assert mock_server.errors_injected > 0
+        assert instructors_df.index.size == len(mock_server.persons)
+        assert list(instructors_df["swc-instructor"].fillna("")) == [person["awarded"].get("swc-instructor", "")
+                                                                     for person in mock_server.persons]
+        assert list(instructors_df["taught_workshops"]) == [",".join(person["taught_slugs"])
+                                                            for person in mock_server.persons]
+
+    ## Assert both Redash queries are extracted
+    def test_redash(self, mock_server):
+        started = time.time()
+        workshops_df = redash.get_csv_data_redash(mock_server.url + "/api/queries/345/results.csv", "key",
+                                                  redash.REDASH_WORKSHOPS_DTYPES)
+        instructors_df = redash.get_csv_data_redash(mock_server.url + "/api/queries/243/results.csv", "key",
+                                                    redash.REDASH_INSTRUCTORS_DTYPES)
+        report("Redash", workshops_df.index.size + instructors_df.index.size, mock_server, started)
+        assert workshops_df.index.size == len(mock_server.events)
+        assert instructors_df.index.size == len(mock_server.persons)
+        assert list(instructors_df["badges"]) == [",".join(person["badges"]) for person in mock_server.persons]
+
+
+if __name__ == "__main__":
+    pytest.main("-s")
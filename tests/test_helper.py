@@ -0,0 +1,179 @@
+import pytest
+import os
+import datetime
+import numpy as np
+import pandas as pd
+
+parentdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.sys.path.insert(0, parentdir)
+import lib.helper as helper
+
+
+class TestWorkshopTags(object):
+
+    ## Assert tags in all formats are classified in one go
+    def test_classify_workshop_tags(self):
+        tags = pd.Series([["SWC", "online"], "DC,Pilot,cancelled", "['LC', 'Circuits', 'stalled']", None, []],
+                         index=[10, 11, 12, 13, 14])
+        classification = helper.classify_workshop_tags(tags)
+        assert list(classification.index) == [10, 11, 12, 13, 14]
+        assert list(classification["workshop_type"].fillna("NaN")) == ["SWC", "DC", "LC", "NaN", ""]
+        assert list(classification["workshop_subtype"].fillna("NaN")) == ["", "Pilot", "Circuits", "NaN", ""]
+        assert list(classification["workshop_status"].fillna("NaN")) == ["", "cancelled", "stalled", "NaN", ""]
+        assert list(classification["is_online"]) == [True, False, False, False, False]
+
+    ## Assert the single workshop helpers agree with the classifier
+    def test_extract_workshop_type(self):
+        assert helper.extract_workshop_type(["online", "TTT"]) == "TTT"
+        assert helper.extract_workshop_subtype("SWC,Circuits") == "Circuits"
+        assert helper.extract_workshop_status(["SWC"]) == ""
+        tags = pd.Series([["SWC", "online"], "DC,Pilot,cancelled", "['LC', 'Circuits', 'stalled']", [],
+                          ["TTT", "SWC", "unresponsive", "stalled"]])
+        classification = helper.classify_workshop_tags(tags)
+        assert list(tags.map(helper.extract_workshop_type)) == list(classification["workshop_type"])
+        assert list(tags.map(helper.extract_workshop_subtype)) == list(classification["workshop_subtype"])
+        assert list(tags.map(helper.extract_workshop_status)) == list(classification["workshop_status"])
+
+
+class TestCountries(object):
+
+    ## Assert country codes are mapped to common names, falling back to country_codes.csv
+    def test_map_country_names(self):
+        names = helper.map_country_names(pd.Series(["GB", "NA", "BQ", "XX", None]))
+        assert list(names[:3]) == ["United Kingdom", "Namibia", "Bonaire, Sint Eustatius and Saba"]
+        assert names[3:].isna().all()
+        assert helper.get_country("CZ") == "Czechia"
+
+
+class TestTopLevelDomains(object):
+
+    ## Assert host names, URLs and AMY organisation URIs all give the registered domain
+    def test_top_level_domains(self):
+        domains = pd.Series(["cmist.manchester.ac.uk", "http://www.manchester.ac.uk/", None, "earlham.ac.uk"])
+        assert list(helper.map_top_level_domains(domains).fillna("NaN")) == \
+            ["manchester.ac.uk", "manchester.ac.uk", "NaN", "earlham.ac.uk"]
+        assert helper.extract_top_level_domain_from_uri(
+            "https://amy.carpentries.org/api/v1/organizations/cmist.manchester.ac.uk/") == "manchester.ac.uk"
+        assert helper.extract_top_level_domain_from_string("www.ed.ac.uk") == "ed.ac.uk"
+
+    ## Assert the public suffix list is never fetched over the network
+    def test_offline(self):
+        assert helper.get_tld_extractor().suffix_list_urls == ()
+
+
+class TestBadgeDates(object):
+
+    ## Assert badge award dates are pivoted into a column per badge
+    def test_get_badge_dates(self):
+        badges = pd.Series([["swc-instructor", "trainer", "dc-instructor"], "lc-instructor", None, []],
+                           index=[5, 6, 7, 8])
+        dates = pd.Series([["2018-03-01", "2019-05-02", "2017-01-20"], "2020-11-30", None, []], index=[5, 6, 7, 8])
+        badge_dates = helper.get_badge_dates(badges, dates)
+        assert list(badge_dates.columns) == helper.INSTRUCTOR_BADGES + ["earliest_badge_awarded"]
+        assert list(badge_dates.index) == [5, 6, 7, 8]
+        assert badge_dates.loc[5, "trainer"] == pd.Timestamp("2019-05-02")
+        assert badge_dates.loc[5, "earliest_badge_awarded"] == pd.Timestamp("2017-01-20")
+        assert badge_dates.loc[6, "lc-instructor"] == pd.Timestamp("2020-11-30")
+        assert pd.isna(badge_dates.loc[6, "swc-instructor"])
+        assert badge_dates.loc[[7, 8]].isna().all().all()
+
+
+class TestTaughtWorkshopsPerYear(object):
+
+    ## Assert taught workshops are counted per instructor and year, including slugs with US dates
+    def test_taught_workshops_per_year_matrix(self):
+        dates = pd.Series(["2018-03-01,2018-05-02,2019-01-20", "2020-30-11", None, ""], index=[5, 6, 7, 8])
+        matrix = helper.taught_workshops_per_year_matrix(dates)
+        assert list(matrix.columns) == [2018, 2019, 2020]
+        assert matrix.values.tolist() == [[2, 1, 0], [0, 0, 1], [0, 0, 0], [0, 0, 0]]
+
+    ## Assert the counts are also available as dictionaries, as saved in processed data
+    def test_taught_workshops_per_year(self):
+        dates = pd.Series(["2019-01-20,2018-03-01,2018-05-02", "2020-30-11", None, ""])
+        assert list(helper.taught_workshops_per_year(dates)) == [{2019: 1, 2018: 2}, {2020: 1}, None, None]
+        assert helper.workshops_per_year_dict("2019-01-20,2018-03-01,2018-05-02") == {2019: 1, 2018: 2}
+
+
+# Processed instructors as saved by extract_and_process_redash.py
+PROCESSED_INSTRUCTORS = pd.DataFrame({
+    "institution": ["University College London", "Earlham Institute"],
+    "taught_workshops": ["2016-02-17-UCL,2017-30-10-UCL", None],
+    "taught_workshop_dates": ["2016-02-17,2017-30-10", None],
+    "taught_workshops_per_year": [{2016: 1, 2017: 1}, None],
+    "badges": [["swc-instructor"], None],
+    "badges_dates": [["2015-12-08"], None],
+    "swc-instructor": pd.to_datetime(["2015-12-08", None]),
+    "year_earliest_badge_awarded": [2015, 0]})
+
+
+class TestProcessedData(object):
+
+    ## Assert lists, dictionaries and dates are parsed from CSV
+    def test_load_csv(self, tmp_path):
+        csv_file = str(tmp_path / "instructors.csv")
+        PROCESSED_INSTRUCTORS.to_csv(csv_file, index=False)
+        df = helper.load_processed_data(csv_file)
+        assert list(df.columns) == list(PROCESSED_INSTRUCTORS.columns)
+        assert list(df["taught_workshops"]) == [["2016-02-17-UCL", "2017-30-10-UCL"], []]
+        assert list(df["taught_workshop_dates"]) == [[datetime.date(2016, 2, 17), datetime.date(2017, 10, 30)], []]
+        assert list(df["taught_workshops_per_year"]) == [{2016: 1, 2017: 1}, {}]
+        assert list(df["badges"]) == [["swc-instructor"], []]
+        assert list(df["badges_dates"]) == [[datetime.date(2015, 12, 8)], []]
+        assert df["swc-instructor"][0] == pd.Timestamp("2015-12-08") and pd.isna(df["swc-instructor"][1])
+
+    ## Assert the snapshot is loaded with the same types as parsed from CSV
+    def test_snapshot(self, tmp_path):
+        pytest.importorskip("pyarrow")
+        csv_file = str(tmp_path / "instructors.csv")
+        helper.save_processed_data(PROCESSED_INSTRUCTORS, csv_file)
+        assert os.path.isfile(str(tmp_path / "instructors.parquet"))
+        from_snapshot = helper.load_processed_data(str(tmp_path / "instructors.parquet"))
+        from_csv = helper.to_typed_processed_data(pd.read_csv(csv_file))
+        for column in from_csv.columns:
+            assert list(from_snapshot[column].astype(object)) == list(from_csv[column].astype(object)), column
+
+    ## Assert a snapshot older than its CSV file is not used
+    def test_outdated_snapshot(self, tmp_path):
+        pytest.importorskip("pyarrow")
+        csv_file = str(tmp_path / "instructors.csv")
+        helper.save_processed_data(PROCESSED_INSTRUCTORS, csv_file)
+        PROCESSED_INSTRUCTORS.head(1).to_csv(csv_file, index=False)
+        os.utime(str(tmp_path / "instructors.parquet"), (0, 0))
+        assert helper.load_processed_data(csv_file).index.size == 1
+
+
+
+class TestExcelSpreadsheet(object):
+
+    ## Assert data is written row by row with typed values and split across sheets past the row limit
+    def test_write_data_sheet(self, tmp_path):
+        writer = pd.ExcelWriter(str(tmp_path / "analyses.xlsx"), engine="xlsxwriter",
+                                engine_kwargs={"options": {"constant_memory": True}})
+        sheet_names = helper.write_data_sheet(writer, PROCESSED_INSTRUCTORS, "carpentry_instructors", max_rows=2)
+        assert sheet_names == ["carpentry_instructors", "carpentry_instructors_2"]
+        assert list(writer.sheets) == sheet_names
+        writer.close()
+
+    ## Assert values are converted as by DataFrame.to_excel
+    def test_get_excel_value(self):
+        assert helper.get_excel_value(np.int64(2015)) == (2015, None)
+        assert helper.get_excel_value(np.nan) == (None, None)
+        assert helper.get_excel_value(pd.NaT) == (None, None)
+        assert helper.get_excel_value(pd.Timestamp("2015-12-08")) == (pd.Timestamp("2015-12-08"), "datetime")
+        assert helper.get_excel_value(datetime.date(2015, 12, 8)) == (datetime.date(2015, 12, 8), "date")
+        assert helper.get_excel_value(["swc-instructor"]) == ("['swc-instructor']", None)
+        assert helper.get_excel_value(np.True_) == (True, None)
+
+    ## Assert pivoted tables are laid out as by DataFrame.to_excel, with runs of the same column label merged
+    def test_get_table_cells(self):
+        table = pd.DataFrame({"year": [2019, 2019, 2020], "workshop_type": ["DC", "SWC", "SWC"], "count": [1, 2, 3]})
+        table = table.pivot_table(index="year", columns="workshop_type", values=["count"], aggfunc="sum")
+        cells = [cell for cell in helper.get_table_cells(table) if helper.get_excel_value(cell[2])[0] is not None]
+        assert sorted(cells, key=lambda cell: (cell[0], cell[1])) == [
+            (0, 1, "count", 0, 2), (1, 0, "workshop_type", None, None), (1, 1, "DC", None, None),
+            (1, 2, "SWC", None, None), (2, 0, "year", None, None), (3, 0, 2019, None, None), (3, 1, 1.0, None, None),
+            (3, 2, 2.0, None, None), (4, 0, 2020, None, None), (4, 2, 3.0, None, None)]
+
+
+if __name__ == "__main__":
+    pytest.main("-s")
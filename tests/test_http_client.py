@@ -0,0 +1,162 @@
+import pytest
+import os
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+parentdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.sys.path.insert(0, parentdir)
+from lib.http_client import HttpClient
+from lib.http_cache import HttpCache
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """
+    Fails the first `failures` requests with 503, then returns a small JSON document.
+    """
+    failures = 0
+    requests_seen = 0
+
+    def do_GET(self):
+        FlakyHandler.requests_seen += 1
+        if FlakyHandler.requests_seen <= FlakyHandler.failures:
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = json.dumps({"path": self.path}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ETagHandler(BaseHTTPRequestHandler):
+    """
+    Returns a fixed CSV document with an ETag and answers conditional requests with 304 Not Modified.
+    """
+    etag = '"v1"'
+    statuses = []
+
+    def do_GET(self):
+        if self.headers.get("If-None-Match") == ETagHandler.etag:
+            ETagHandler.statuses.append(304)
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = ("slug,version\n2021-01-01-test," + ETagHandler.etag.strip('"') + "\n").encode("utf-8")
+        ETagHandler.statuses.append(200)
+        self.send_response(200)
+        self.send_header("ETag", ETagHandler.etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(handler):
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+
+@pytest.fixture
+def etag_server():
+    httpd = start_server(ETagHandler)
+    ETagHandler.etag = '"v1"'
+    ETagHandler.statuses = []
+    yield "http://127.0.0.1:" + str(httpd.server_address[1])
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def server():
+    httpd = start_server(FlakyHandler)
+    FlakyHandler.requests_seen = 0
+    yield "http://127.0.0.1:" + str(httpd.server_address[1])
+    httpd.shutdown()
+    httpd.server_close()
+
+
+class TestHttpClient(object):
+
+    ## Assert transient 5XX responses are retried until the request succeeds
+    def test_retries_transient_errors(self, server):
+        FlakyHandler.failures = 2
+        client = HttpClient(retries=3, backoff_factor=0)
+        assert client.get_json(server + "/events/", params={"country": "GB"}) == {"path": "/events/?country=GB"}
+        assert FlakyHandler.requests_seen == 3
+
+    ## Assert the error is raised once all retries are used up
+    def test_gives_up_after_retries(self, server):
+        FlakyHandler.failures = 10
+        client = HttpClient(retries=1, backoff_factor=0)
+        with pytest.raises(Exception):
+            client.get(server + "/events/")
+        assert FlakyHandler.requests_seen == 2
+
+    ## Assert a response body can be read as a stream, with and without a cache
+    def test_open_stream(self, etag_server, tmp_path):
+        for client in [HttpClient(), HttpClient(cache=HttpCache(str(tmp_path)))]:
+            with client.open_stream(etag_server + "/results.csv") as stream:
+                assert stream.read() == b"slug,version\n2021-01-01-test,v1\n"
+
+
+class TestHttpCache(object):
+
+    ## Assert fresh responses are served from the cache without a request
+    def test_fresh_response_served_locally(self, etag_server, tmp_path):
+        client = HttpClient(cache=HttpCache(str(tmp_path)))
+        first = client.get_content(etag_server + "/results.csv", params={"api_key": "secret"})
+        assert client.get_content(etag_server + "/results.csv", params={"api_key": "secret"}) == first
+        assert ETagHandler.statuses == [200]
+
+    ## Assert stale responses are revalidated and only downloaded again once they change
+    def test_stale_response_revalidated(self, etag_server, tmp_path):
+        client = HttpClient(cache=HttpCache(str(tmp_path), ttl=0))
+        first = client.get_content(etag_server + "/results.csv")
+        assert client.get_content(etag_server + "/results.csv") == first
+        ETagHandler.etag = '"v2"'
+        assert b"v2" in client.get_content(etag_server + "/results.csv")
+        assert ETagHandler.statuses == [200, 304, 200]
+
+    ## Assert the least recently used responses are evicted once the cache is full
+    def test_eviction(self, tmp_path):
+        cache = HttpCache(str(tmp_path), max_size=25)
+        cache.store("http://example.org/a", b"0123456789")
+        cache.store("http://example.org/b", b"0123456789")
+        cache.store("http://example.org/c", b"0123456789")
+        assert cache.lookup("http://example.org/a") is None
+        assert cache.lookup("http://example.org/c") is not None
+
+    ## Assert responses evicted by another thread between being cached and being read are downloaded again
+    def test_eviction_by_another_thread(self, server, tmp_path):
+        FlakyHandler.failures = 0
+        client = HttpClient(backoff_factor=0, cache=HttpCache(str(tmp_path), max_size=30))  # about 1 response
+        errors = []
+
+        def get_responses():
+            try:
+                for i in range(500):
+                    path = "/events/" + str(i % 7) + "/"
+                    assert client.get_json(server + path) == {"path": path}
+            except Exception as ex:
+                errors.append(ex)
+
+        threads = [threading.Thread(target=get_responses) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert errors == []
+
+
+if __name__ == "__main__":
+    pytest.main("-s")
@@ -0,0 +1,89 @@
+import pytest
+import os
+import json
+import numpy as np
+
+parentdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.sys.path.insert(0, parentdir)
+from lib.region_index import RegionIndex, RegionCache
+
+
+def box(name, min_x, min_y, max_x, max_y):
+    return {"type": "Feature", "properties": {"NAME": name},
+            "geometry": {"type": "Polygon", "coordinates": [[[min_x, min_y], [max_x, min_y], [max_x, max_y],
+                                                             [min_x, max_y], [min_x, min_y]]]}}
+
+
+# 'Inner' lies within 'Outer' to check which of overlapping regions is returned
+REGIONS = {"type": "FeatureCollection", "features": [box("Inner", 0, 0, 1, 1), box("Outer", -2, -2, 2, 2),
+                                                     box("East", 5, 0, 6, 1)]}
+
+
+class TestRegionIndex(object):
+
+    ## Assert points are assigned to the first region containing them
+    def test_lookup(self):
+        index = RegionIndex(REGIONS)
+        regions = index.lookup([0.5, 1.5, 0.5, 10], [0.5, 1.5, 5.5, 10])
+        assert list(regions[:3]) == ["Inner", "Outer", "East"]
+        assert np.isnan(regions[3])
+
+    ## Assert points with missing coordinates get no region
+    def test_missing_coordinates(self):
+        index = RegionIndex(REGIONS)
+        regions = index.lookup([np.nan, 0.5, None], [0.5, np.nan, 0.5])
+        assert all(np.isnan(region) for region in regions)
+        assert len(index.lookup([], [])) == 0
+
+    ## Assert the grid gives the same regions as the STRtree alone
+    def test_grid(self):
+        random = np.random.default_rng(0)
+        latitudes, longitudes = random.uniform(-3, 3, 10000), random.uniform(-3, 7, 10000)
+        regions = RegionIndex(REGIONS).lookup(latitudes, longitudes)
+        grid_regions = RegionIndex(REGIONS, grid_cell_size=0.3).lookup(latitudes, longitudes)
+        assert [str(region) for region in grid_regions] == [str(region) for region in regions]
+
+    ## Assert points on region boundaries that are also grid lines are left to the exact test, as without the grid
+    def test_grid_boundary_point(self):
+        # The grid starts at (-8, 49.9), so London's west edge at -0.6 is a grid line for 0.05 degree cells
+        regions = {"type": "FeatureCollection", "features": [box("London", -0.6, 51.3, 0.3, 51.7),
+                                                             box("Cornwall", -8, 49.9, -7.9, 50)]}
+        assert np.isnan(RegionIndex(regions).lookup([51.6], [-0.6])[0])
+        assert np.isnan(RegionIndex(regions, grid_cell_size=0.05).lookup([51.6], [-0.6])[0])
+        assert RegionIndex(regions, grid_cell_size=0.05).lookup([51.6], [-0.59])[0] == "London"
+
+
+class TestRegionCache(object):
+
+    ## Assert cached coordinates are not looked up again, including by a later run
+    def test_cache(self, tmp_path):
+        regions_file = str(tmp_path / "regions.json")
+        with open(regions_file, "w") as stream:
+            json.dump(REGIONS, stream)
+        cache_file = str(tmp_path / "cache.json")
+        cache = RegionCache(cache_file, regions_file)
+        regions = cache.lookup([0.5, 0.50001, 10, np.nan], [0.5, 0.5, 10, 0], RegionIndex(REGIONS))
+        assert list(regions[:2]) == ["Inner", "Inner"] and np.isnan(regions[2]) and np.isnan(regions[3])
+        assert (cache.hits, cache.misses) == (0, 2)
+        cache.save()
+
+        cache = RegionCache(cache_file, regions_file)
+        regions = cache.lookup([0.5, 10], [0.5, 10], None)  # everything must come from the cache
+        assert regions[0] == "Inner" and np.isnan(regions[1])
+        assert (cache.hits, cache.misses) == (2, 0)
+
+    ## Assert the cache is discarded once the regions change
+    def test_regions_changed(self, tmp_path):
+        regions_file = str(tmp_path / "regions.json")
+        with open(regions_file, "w") as stream:
+            json.dump(REGIONS, stream)
+        cache = RegionCache(str(tmp_path / "cache.json"), regions_file)
+        cache.lookup([0.5], [0.5], RegionIndex(REGIONS))
+        cache.save()
+        with open(regions_file, "a") as stream:
+            stream.write(" ")
+        assert RegionCache(str(tmp_path / "cache.json"), regions_file).regions == {}
+
+
+if __name__ == "__main__":
+    pytest.main("-s")
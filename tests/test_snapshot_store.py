@@ -0,0 +1,111 @@
+import pytest
+import os
+import filecmp
+import pandas as pd
+
+parentdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.sys.path.insert(0, parentdir)
+from lib.snapshot_store import SnapshotStore
+import lib.helper as helper
+
+JANUARY = pd.DataFrame({"slug": ["2021-01-10-a", "2021-01-05-b", "2020-12-01-c"],
+                        "attendance": ["10", "", "25"],
+                        "tags": ["SWC,online", "DC", "LC"]})
+# 'a' changed, 'c' was removed and 'd' was added
+FEBRUARY = pd.DataFrame({"slug": ["2021-02-01-d", "2021-01-10-a", "2021-01-05-b"],
+                         "attendance": ["", "12", ""],
+                         "tags": ["SWC", "SWC,online", "DC"]})
+
+
+def read_delta(store, date):
+    return pd.read_csv(os.path.join(store.directory, date + ".csv"), dtype=str, keep_default_na=False)
+
+
+class TestSnapshotStore(object):
+
+    ## Assert snapshots are rebuilt as they were added while deltas only hold new and changed rows
+    def test_add(self, tmp_path):
+        store = SnapshotStore(str(tmp_path / "workshops"), ["slug"])
+        store.add("2021-01-02", JANUARY)
+        store.add("2021-02-02", FEBRUARY)
+        assert list(read_delta(store, "2021-02-02")["slug"]) == ["2021-02-01-d", "2021-01-10-a"]
+
+        store = SnapshotStore(str(tmp_path / "workshops"))  # read back from disk
+        assert store.dates == ["2021-01-02", "2021-02-02"]
+        assert store.get("2021-01-02").equals(JANUARY.astype(object))
+        assert store.get("2021-02-02").equals(FEBRUARY.astype(object))
+
+    ## Assert the latest snapshot on or before a date is returned, read as from its CSV file
+    def test_as_of(self, tmp_path):
+        store = SnapshotStore(str(tmp_path / "workshops"), ["slug"])
+        store.add("2021-01-02", JANUARY)
+        store.add("2021-02-02", FEBRUARY)
+        workshops_df = store.as_of("2021-01-31")
+        assert list(workshops_df["slug"]) == list(JANUARY["slug"])
+        assert workshops_df["attendance"].isna().sum() == 1
+        assert list(store.as_of("2030-01-01")["slug"]) == list(FEBRUARY["slug"])
+        with pytest.raises(ValueError):
+            store.as_of("2020-01-01")
+
+    ## Assert rows without a key are identified by their content, including duplicate rows
+    def test_content_identity(self, tmp_path):
+        store = SnapshotStore(str(tmp_path / "instructors"))
+        instructors = pd.DataFrame({"institution": ["UCL", "UCL", "Earlham"], "badges": ["swc", "swc", "dc"]})
+        store.add("2021-01-02", instructors)
+        changed = pd.DataFrame({"institution": ["UCL", "Earlham", "UCL"], "badges": ["swc", "dc", "swc,dc"]})
+        store.add("2021-02-02", changed)
+        assert read_delta(store, "2021-02-02")["badges"].tolist() == ["swc,dc"]
+        assert store.get("2021-01-02").equals(instructors.astype(object))
+        assert store.get("2021-02-02").equals(changed.astype(object))
+
+    ## Assert a snapshot replaces one from the same date and cannot be older than the latest one
+    def test_add_same_date(self, tmp_path):
+        store = SnapshotStore(str(tmp_path / "workshops"), ["slug"])
+        store.add("2021-01-02", JANUARY)
+        store.add("2021-02-02", JANUARY)
+        store.add("2021-02-02", FEBRUARY)
+        assert store.dates == ["2021-01-02", "2021-02-02"]
+        assert store.get("2021-02-02").equals(FEBRUARY.astype(object))
+        with pytest.raises(ValueError):
+            store.add("2021-01-01", JANUARY)
+
+    ## Assert dated data files are added to their histories and rebuilt identically
+    def test_add_to_history(self, tmp_path):
+        for date, df in [("2021-01-02", JANUARY), ("2021-02-02", FEBRUARY)]:
+            df.to_csv(str(tmp_path / ("raw_carpentry_workshops_UK_" + date + "_redash.csv")), index=False)
+            helper.add_to_history(str(tmp_path / ("raw_carpentry_workshops_UK_" + date + "_redash.csv")),
+                                  str(tmp_path / "history"))
+        history = helper.get_history("raw_carpentry_workshops_UK_redash", str(tmp_path / "history"))
+        assert history.key == ["slug"]
+        history.save_as_of("2021-01-15", str(tmp_path / "rebuilt.csv"))
+        assert filecmp.cmp(str(tmp_path / "raw_carpentry_workshops_UK_2021-01-02_redash.csv"),
+                           str(tmp_path / "rebuilt.csv"), shallow=False)
+
+    ## Assert data files removed once added to their histories are read from the histories
+    def test_read_data_file_from_history(self, tmp_path):
+        file = str(tmp_path / "processed_carpentry_workshops_UK_2021-01-02_redash.csv")
+        JANUARY.to_csv(file, index=False)
+        expected = pd.read_csv(file)
+        assert helper.add_to_history(file, str(tmp_path / "history"), remove_file=True)
+        assert not os.path.isfile(file)
+        pd.testing.assert_frame_equal(helper.read_data_file(file, str(tmp_path / "history")), expected)
+        workshops = helper.load_processed_data(file, str(tmp_path / "history"))
+        assert list(workshops["tags"]) == [["SWC", "online"], ["DC"], ["LC"]]
+        with pytest.raises(FileNotFoundError):
+            helper.read_data_file(file.replace("2021-01-02", "2021-01-03"), str(tmp_path / "history"))
+
+    ## Assert snapshots of processed data are kept when their CSV files are removed once added to their histories
+    def test_snapshot_kept_in_history_only_mode(self, tmp_path):
+        pytest.importorskip("pyarrow")
+        file = str(tmp_path / "processed_carpentry_workshops_UK_2021-01-02_redash.csv")
+        helper.save_processed_data(JANUARY.assign(tags=JANUARY["tags"].str.split(",")), file)
+        assert helper.add_to_history(file, str(tmp_path / "history"), remove_file=True)
+        assert not os.path.isfile(file)
+        assert os.path.isfile(helper.get_snapshot_file(file))
+        # Loaded from the snapshot, not the history - which is not even looked at
+        workshops = helper.load_processed_data(file, str(tmp_path / "no_history"))
+        assert list(workshops["tags"]) == [["SWC", "online"], ["DC"], ["LC"]]
+
+
+if __name__ == "__main__":
+    pytest.main("-s")
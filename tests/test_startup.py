@@ -0,0 +1,46 @@
+import pytest
+import os
+import sys
+import time
+import subprocess
+
+parentdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Generous enough for a slow machine - loading the reference data and map libraries on import took about 3 times as long
+# as importing pandas alone does
+MAX_STARTUP_TIME = 3  # seconds
+
+
+class TestStartup(object):
+
+    ## Assert importing lib.helper neither loads reference data nor imports the heavy libraries
+    def test_lazy_import(self):
+        code = ("import sys, lib.helper; "
+                "print(sorted(name for name in ['folium', 'shapely', 'tldextract'] if name in sys.modules)); "
+                "print(lib.helper.load_all_uk_institutions.cache_info().currsize)")
+        output = subprocess.run([sys.executable, "-c", code], cwd=parentdir, capture_output=True, text=True,
+                                check=True).stdout.split("\n")
+        assert output[0] == "[]"
+        assert output[1] == "0"
+
+    ## Assert the reference data is still available under its old names once needed
+    def test_lazy_reference_data(self):
+        os.sys.path.insert(0, parentdir)
+        import lib.helper as helper
+        assert helper.ALL_UK_INSTITUTIONS_DF is helper.load_all_uk_institutions()
+        assert "top_level_web_domain" in helper.ALL_UK_INSTITUTIONS_DF.columns
+        with pytest.raises(AttributeError):
+            helper.NO_SUCH_DATA
+
+    ## Benchmark how long the analysis scripts take to start
+    @pytest.mark.parametrize("script", ["analyse_workshops.py", "analyse_instructors.py"])
+    def test_startup_time(self, script):
+        started = time.time()
+        subprocess.run([sys.executable, script, "--help"], cwd=parentdir, capture_output=True, check=True)
+        elapsed = time.time() - started
+        print("\n" + script + " --help: " + "%.2f" % elapsed + "s")
+        assert elapsed < MAX_STARTUP_TIME
+
+
+if __name__ == "__main__":
+    pytest.main("-s")